@@ -0,0 +1,399 @@
+import time
+import json
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Rows processed per block when assigning vectors to their nearest centroids
+ASSIGN_BLOCK_ROWS = 16384
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize rows, so dot products are cosine similarities"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+def _assign(data: np.ndarray, centroids: np.ndarray, spherical: bool) -> np.ndarray:
+    """Index of the nearest centroid of every row (by dot product or L2 distance)"""
+    labels = np.empty(len(data), dtype=np.int64)
+    centroid_norms = (centroids ** 2).sum(axis=1)
+    for start in range(0, len(data), ASSIGN_BLOCK_ROWS):
+        scores = np.asarray(data[start:start + ASSIGN_BLOCK_ROWS], dtype=np.float32) @ centroids.T
+        if not spherical:
+            # argmin ||x - c||^2 == argmax 2 x.c - ||c||^2
+            scores = 2 * scores - centroid_norms
+        labels[start:start + len(scores)] = scores.argmax(axis=1)
+    return labels
+
+
+def _kmeans(data: np.ndarray, k: int, n_iter: int, rng: np.random.RandomState,
+            spherical: bool) -> np.ndarray:
+    """Lloyd's k-means in NumPy
+
+    Args:
+        data: (n, d) training rows
+        k: Number of centroids (at most n)
+        n_iter: Number of assignment/update rounds
+        rng: Random state for the initial centroids and empty-cluster reseeding
+        spherical: Keep centroids unit-length (cosine k-means) instead of
+            plain Euclidean k-means
+
+    Returns:
+        (k, d) float32 centroids
+    """
+    centroids = data[rng.choice(len(data), k, replace=False)].astype(np.float32)
+    for _ in range(n_iter):
+        labels = _assign(data, centroids, spherical)
+        counts = np.bincount(labels, minlength=k)
+        # Per-cluster sums: rows grouped by cluster, then summed segment by segment
+        order = np.argsort(labels, kind='stable')
+        starts = np.cumsum(counts) - counts
+        filled = counts > 0
+        sums = np.zeros((k, data.shape[1]), dtype=np.float32)
+        sums[filled] = np.add.reduceat(data[order], starts[filled], axis=0)
+
+        empty = counts == 0
+        counts[empty] = 1
+        centroids = sums / counts[:, None]
+        # Restart empty clusters from random rows
+        if empty.any():
+            centroids[empty] = data[rng.choice(len(data), int(empty.sum()), replace=False)]
+        if spherical:
+            centroids = _normalize(centroids)
+    return centroids
+
+
+class _InvertedList:
+    """Growable (ids, payload) arrays of one IVF list"""
+
+    __slots__ = ("ids", "data", "size")
+
+    def __init__(self, width: int, dtype):
+        self.ids = np.empty(0, dtype=np.int64)
+        self.data = np.empty((0, width), dtype=dtype)
+        self.size = 0
+
+    def append(self, ids: np.ndarray, data: np.ndarray):
+        """Add rows, doubling the capacity when full"""
+        needed = self.size + len(ids)
+        if needed > len(self.ids):
+            capacity = max(needed, 2 * len(self.ids), 16)
+            new_ids = np.empty(capacity, dtype=np.int64)
+            new_data = np.empty((capacity, self.data.shape[1]), dtype=self.data.dtype)
+            new_ids[:self.size] = self.ids[:self.size]
+            new_data[:self.size] = self.data[:self.size]
+            self.ids, self.data = new_ids, new_data
+        self.ids[self.size:needed] = ids
+        self.data[self.size:needed] = data
+        self.size = needed
+
+
+class IVFIndex:
+    """Inverted-file (IVF) index for approximate cosine search, in NumPy
+
+    Vectors are clustered by k-means into n_lists lists. A query only scans
+    the nprobe lists whose centroids are closest to it, so with n_lists
+    growing like sqrt(N) the work per query grows sublinearly with the
+    number of vectors. nprobe trades recall for latency and can be changed
+    per search.
+
+    Lists hold either the full normalized vectors (exact scores for the
+    scanned candidates) or, with pq_m > 0, product-quantized residuals of
+    pq_m bytes per vector (IVF-PQ), scored with per-query lookup tables.
+    Vectors can be added at any time after training; ids are caller-defined
+    integers such as VectorStore row numbers.
+    """
+
+    def __init__(self, dim: int, n_lists: int = 0, nprobe: int = 8, pq_m: int = 0, seed: int = 0):
+        """Create an untrained index
+
+        Args:
+            dim: Vector dimension
+            n_lists: Number of k-means lists (0 picks 4 * sqrt(training rows))
+            nprobe: Number of lists scanned per query by default
+            pq_m: Product-quantization sub-vectors per vector (0 stores full
+                vectors); must divide dim
+            seed: Random seed of the k-means initialization
+        """
+        if pq_m and dim % pq_m:
+            raise ValueError(f"pq_m ({pq_m}) must divide the dimension ({dim})")
+        self.dim = dim
+        self.n_lists = n_lists
+        self.nprobe = nprobe
+        self.pq_m = pq_m
+        self.seed = seed
+
+        self.centroids = None
+        self.codebooks = None  # (pq_m, 256, dim / pq_m) with PQ
+        self.lists = []
+        self.ntotal = 0
+        self.store_rows = 0  # Leading VectorStore rows added by add_from_store
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def train(self, vectors: np.ndarray, n_iter: int = 20, max_training_rows: int = 100000):
+        """Learn the list centroids (and PQ codebooks) from sample vectors
+
+        Args:
+            vectors: Training vectors, e.g. the store's rows or a sample
+            n_iter: k-means iterations
+            max_training_rows: Random sample size the training is limited to
+        """
+        rng = np.random.RandomState(self.seed)
+        if len(vectors) > max_training_rows:
+            rows = np.sort(rng.choice(len(vectors), max_training_rows, replace=False))
+            vectors = vectors[rows]
+        vectors = _normalize(vectors)
+        if len(vectors) == 0:
+            raise ValueError("Cannot train an IVF index without vectors")
+
+        n_lists = self.n_lists or int(4 * np.sqrt(len(vectors)))
+        self.n_lists = max(1, min(n_lists, len(vectors)))
+        self.centroids = _kmeans(vectors, self.n_lists, n_iter, rng, spherical=True)
+
+        if self.pq_m:
+            residuals = vectors - self.centroids[_assign(vectors, self.centroids, True)]
+            sub_dim = self.dim // self.pq_m
+            n_codes = min(256, len(vectors))
+            self.codebooks = np.stack([
+                _kmeans(np.ascontiguousarray(residuals[:, j * sub_dim:(j + 1) * sub_dim]),
+                        n_codes, n_iter, rng, spherical=False)
+                for j in range(self.pq_m)
+            ])
+
+        width, dtype = (self.pq_m, np.uint8) if self.pq_m else (self.dim, np.float32)
+        self.lists = [_InvertedList(width, dtype) for _ in range(self.n_lists)]
+        self.ntotal = 0
+        self.store_rows = 0
+
+    def _encode(self, residuals: np.ndarray) -> np.ndarray:
+        """PQ codes (one byte per sub-vector) of residual vectors"""
+        sub_dim = self.dim // self.pq_m
+        codes = np.empty((len(residuals), self.pq_m), dtype=np.uint8)
+        for j in range(self.pq_m):
+            codes[:, j] = _assign(residuals[:, j * sub_dim:(j + 1) * sub_dim], self.codebooks[j], False)
+        return codes
+
+    def add(self, vectors: np.ndarray, ids: Optional[Iterable[int]] = None):
+        """Add vectors to the trained index
+
+        Args:
+            vectors: (n, dim) vectors; they are normalized
+            ids: Integer id of every vector (defaults to consecutive ids
+                following the vectors added so far)
+        """
+        if not self.is_trained:
+            raise RuntimeError("Train the index before adding vectors")
+        ids = (np.arange(self.ntotal, self.ntotal + len(vectors)) if ids is None
+               else np.fromiter(ids, dtype=np.int64, count=len(vectors)))
+
+        for start in range(0, len(vectors), ASSIGN_BLOCK_ROWS):
+            block = _normalize(vectors[start:start + ASSIGN_BLOCK_ROWS])
+            block_ids = ids[start:start + len(block)]
+            labels = _assign(block, self.centroids, True)
+            payload = self._encode(block - self.centroids[labels]) if self.pq_m else block
+
+            order = np.argsort(labels, kind='stable')
+            bounds = np.searchsorted(labels[order], np.arange(self.n_lists + 1))
+            for list_no in np.flatnonzero(np.diff(bounds)):
+                rows = order[bounds[list_no]:bounds[list_no + 1]]
+                self.lists[list_no].append(block_ids[rows], payload[rows])
+        self.ntotal += len(vectors)
+
+    def add_from_store(self, store, block_rows: int = 65536) -> int:
+        """Add the VectorStore rows appended since the last call, by row number
+
+        The number of store rows indexed so far is kept in store_rows (and
+        saved with the index), so the next call resumes after them. Store
+        row numbers are the ids, so an index that also holds vectors added
+        with add() cannot follow a store.
+
+        Returns:
+            Number of rows added
+
+        Raises:
+            ValueError: If the index holds vectors not added from a store, or
+                the store has fewer rows than were indexed from it
+        """
+        if self.ntotal != self.store_rows:
+            raise ValueError(f"Index holds {self.ntotal - self.store_rows} vectors added with add(); "
+                             "build a separate index to follow a store")
+        vectors = store.vectors
+        start = self.store_rows
+        if len(vectors) < start:
+            raise ValueError(f"Store has {len(vectors)} rows but {start} were indexed from it; "
+                             "the index belongs to a different store")
+        for block_start in range(start, len(vectors), block_rows):
+            block = np.asarray(vectors[block_start:block_start + block_rows])
+            self.add(block, ids=range(block_start, block_start + len(block)))
+            self.store_rows += len(block)
+        return len(vectors) - start
+
+    def search(self, queries: np.ndarray, top_k: int = 10, nprobe: Optional[int] = None,
+               rerank_vectors: Optional[np.ndarray] = None,
+               rerank_factor: int = 4) -> Tuple[np.ndarray, np.ndarray]:
+        """Approximate top-k cosine search
+
+        Args:
+            queries: (n, dim) query vectors (or a single vector)
+            top_k: Number of results per query
+            nprobe: Lists scanned per query (defaults to self.nprobe)
+            rerank_vectors: Optional full vectors indexed by id (e.g. the
+                VectorStore's memory-mapped rows); with PQ, the best
+                top_k * rerank_factor candidates are re-scored exactly
+            rerank_factor: Candidates re-scored per result
+
+        Returns:
+            (scores, ids) arrays of shape (n, top_k), best first; missing
+            results are padded with -inf scores and -1 ids
+        """
+        queries = _normalize(np.asarray(queries, dtype=np.float32).reshape(-1, self.dim))
+        nprobe = max(1, min(nprobe or self.nprobe, self.n_lists))
+        scores_out = np.full((len(queries), top_k), -np.inf, dtype=np.float32)
+        ids_out = np.full((len(queries), top_k), -1, dtype=np.int64)
+        if not self.is_trained or self.ntotal == 0 or top_k <= 0:
+            return scores_out, ids_out
+
+        centroid_scores = queries @ self.centroids.T
+        if nprobe < self.n_lists:
+            probes = np.argpartition(-centroid_scores, nprobe - 1, axis=1)[:, :nprobe]
+        else:
+            probes = np.broadcast_to(np.arange(self.n_lists), (len(queries), self.n_lists))
+
+        for q, query in enumerate(queries):
+            if self.pq_m:
+                # q.x ~= q.centroid + sum over sub-vectors of q_j.codeword_j,
+                # read from one lookup table per sub-vector
+                tables = np.einsum('md,mkd->mk', query.reshape(self.pq_m, -1), self.codebooks)
+                sub_vectors = np.arange(self.pq_m)
+
+            ids, scores = [], []
+            for list_no in probes[q]:
+                inv = self.lists[list_no]
+                if not inv.size:
+                    continue
+                ids.append(inv.ids[:inv.size])
+                if self.pq_m:
+                    scores.append(centroid_scores[q, list_no]
+                                  + tables[sub_vectors, inv.data[:inv.size]].sum(axis=1))
+                else:
+                    scores.append(inv.data[:inv.size] @ query)
+            if not ids:
+                continue
+            ids, scores = np.concatenate(ids), np.concatenate(scores)
+
+            if self.pq_m and rerank_vectors is not None and len(scores) > top_k:
+                candidates = min(len(scores), top_k * rerank_factor)
+                keep = np.argpartition(-scores, candidates - 1)[:candidates]
+                ids = ids[keep]
+                # Sorted ids keep reads from a memory-mapped matrix sequential
+                ids.sort()
+                scores = _normalize(np.asarray(rerank_vectors[ids])) @ query
+
+            k = min(top_k, len(scores))
+            best = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(k)
+            best = best[np.argsort(-scores[best])]
+            scores_out[q, :k] = scores[best]
+            ids_out[q, :k] = ids[best]
+        return scores_out, ids_out
+
+    def save(self, path: str):
+        """Write the index to a single .npz file"""
+        if not self.is_trained:
+            raise RuntimeError("Cannot save an untrained index")
+        sizes = np.array([inv.size for inv in self.lists], dtype=np.int64)
+        width = self.pq_m or self.dim
+        arrays = {
+            "params": np.frombuffer(json.dumps({
+                "dim": self.dim, "n_lists": self.n_lists, "nprobe": self.nprobe,
+                "pq_m": self.pq_m, "seed": self.seed, "ntotal": self.ntotal,
+                "store_rows": self.store_rows
+            }).encode('utf-8'), dtype=np.uint8),
+            "centroids": self.centroids,
+            "list_sizes": sizes,
+            "ids": (np.concatenate([inv.ids[:inv.size] for inv in self.lists])
+                    if self.ntotal else np.empty(0, dtype=np.int64)),
+            "data": (np.concatenate([inv.data[:inv.size] for inv in self.lists])
+                     if self.ntotal else np.empty((0, width), dtype=np.uint8 if self.pq_m else np.float32))
+        }
+        if self.pq_m:
+            arrays["codebooks"] = self.codebooks
+        with open(path, 'wb') as f:
+            np.savez(f, **arrays)
+
+    @classmethod
+    def load(cls, path: str) -> "IVFIndex":
+        """Read an index written by save()"""
+        with np.load(path) as arrays:
+            params = json.loads(arrays["params"].tobytes().decode('utf-8'))
+            index = cls(params["dim"], n_lists=params["n_lists"], nprobe=params["nprobe"],
+                        pq_m=params["pq_m"], seed=params["seed"])
+            index.centroids = arrays["centroids"]
+            if index.pq_m:
+                index.codebooks = arrays["codebooks"]
+            ids, data = arrays["ids"], arrays["data"]
+            offsets = np.concatenate([[0], np.cumsum(arrays["list_sizes"])])
+
+        width, dtype = (index.pq_m, np.uint8) if index.pq_m else (index.dim, np.float32)
+        index.lists = []
+        for list_no in range(index.n_lists):
+            inv = _InvertedList(width, dtype)
+            start, end = offsets[list_no], offsets[list_no + 1]
+            inv.ids, inv.data, inv.size = ids[start:end].copy(), data[start:end].copy(), int(end - start)
+            index.lists.append(inv)
+        index.ntotal = params["ntotal"]
+        # Files saved before store_rows was recorded used ntotal as the offset
+        index.store_rows = params.get("store_rows", index.ntotal)
+        return index
+
+
+def benchmark_recall(index: IVFIndex, vectors: np.ndarray, queries: np.ndarray, top_k: int = 10,
+                     nprobes: Iterable[int] = (1, 2, 4, 8, 16, 32),
+                     ids: Optional[np.ndarray] = None, rerank: bool = False) -> List[Dict]:
+    """Recall@k and latency of an index against exact search
+
+    Args:
+        index: Index holding vectors
+        vectors: The indexed vectors, for exact search
+        queries: Query vectors
+        top_k: Number of results compared
+        nprobes: nprobe values to measure
+        ids: Id of every row of vectors in the index (defaults to row numbers)
+        rerank: Re-score PQ candidates exactly with vectors (requires ids
+            to be row numbers)
+
+    Returns:
+        One dictionary per nprobe with the recall, the mean query latency in
+        milliseconds, and the exact-search latency for comparison
+    """
+    queries = _normalize(np.asarray(queries, dtype=np.float32).reshape(-1, index.dim))
+    ids = np.arange(len(vectors)) if ids is None else np.asarray(ids)
+    top_k = min(top_k, len(vectors))
+
+    # Exact search, one query at a time like the index
+    start = time.perf_counter()
+    exact = []
+    for query in queries:
+        scores = np.concatenate([_normalize(vectors[i:i + ASSIGN_BLOCK_ROWS]) @ query
+                                 for i in range(0, len(vectors), ASSIGN_BLOCK_ROWS)])
+        exact.append(set(ids[np.argpartition(-scores, top_k - 1)[:top_k]].tolist()))
+    exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    report = []
+    for nprobe in nprobes:
+        start = time.perf_counter()
+        _, found = index.search(queries, top_k=top_k, nprobe=nprobe,
+                                rerank_vectors=vectors if rerank else None)
+        elapsed_ms = (time.perf_counter() - start) * 1000 / len(queries)
+        recall = np.mean([len(expected & set(row.tolist())) / top_k
+                          for expected, row in zip(exact, found)])
+        report.append({
+            "nprobe": nprobe,
+            "recall": float(recall),
+            "ms_per_query": elapsed_ms,
+            "exact_ms_per_query": exact_ms
+        })
+    return report
@@ -0,0 +1,284 @@
+import os
+import glob
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Iterator, List, Optional
+
+from smart_pdf_insights import SmartPDFInsights
+from ocr_engine import OCREngine, OCRCache
+from document_cache import DocumentCache, ArtifactCache
+
+# Per-process SmartPDFInsights, created once by the pool initializer so every
+# document handled by a worker reuses the loaded (and quantized) models
+_worker_system = None
+_worker_load_seconds = None
+
+
+def find_pdfs(pattern: str) -> List[str]:
+    """List the PDFs selected by a directory or glob pattern
+
+    Args:
+        pattern: Directory (searched recursively) or glob pattern
+
+    Returns:
+        Sorted list of PDF paths
+    """
+    if os.path.isdir(pattern):
+        pattern = os.path.join(pattern, "**", "*.pdf")
+    paths = glob.glob(pattern, recursive=True)
+    return sorted(path for path in paths if path.lower().endswith(".pdf") and os.path.isfile(path))
+
+
+def create_system(model_path: Optional[str] = None, cache_dir: Optional[str] = None,
+                  ocr_batch_size: int = 1, workers: int = 1) -> SmartPDFInsights:
+    """Create a SmartPDFInsights instance for processing one document at a time
+
+    By default page extraction and OCR stay in-process: in batch mode the
+    parallelism comes from running several documents at once, one per worker.
+
+    Args:
+        model_path: Optional path to custom models
+        cache_dir: Optional directory for document, OCR and artifact caches
+        ocr_batch_size: Scanned pages recognised per tesseract process
+        workers: Processes for page extraction and OCR within a document
+    """
+    ocr_cache = document_cache = artifact_cache = None
+    if cache_dir:
+        ocr_cache = OCRCache(os.path.join(cache_dir, "ocr"))
+        document_cache = DocumentCache(os.path.join(cache_dir, "documents"))
+        artifact_cache = ArtifactCache(os.path.join(cache_dir, "artifacts"))
+
+    ocr_engine = OCREngine(max_workers=workers, batch_size=ocr_batch_size, cache=ocr_cache)
+    return SmartPDFInsights(model_path=model_path, workers=workers, ocr_engine=ocr_engine,
+                            document_cache=document_cache, artifact_cache=artifact_cache)
+
+
+def _init_worker(system_options: Dict, torch_threads: int):
+    """Pool initializer: load the models once for the lifetime of the worker"""
+    global _worker_system, _worker_load_seconds
+
+    # Workers share the CPUs, so keep each one's intra-op thread pool small
+    import torch
+    torch.set_num_threads(torch_threads)
+
+    start = time.perf_counter()
+    _worker_system = create_system(**system_options)
+    _worker_load_seconds = time.perf_counter() - start
+
+
+def _process_in_worker(pdf_path: str, persona: str, top_k: int, include_content: bool) -> Dict:
+    """Pool task: analyze one document with the worker's resident models"""
+    return process_document(_worker_system, pdf_path, persona, top_k, include_content,
+                            load_seconds=_worker_load_seconds)
+
+
+def process_document(system: SmartPDFInsights, pdf_path: str, persona: str, top_k: int = 5,
+                     include_content: bool = True, load_seconds: Optional[float] = None) -> Dict:
+    """Analyze a single document, reporting failures instead of raising them
+
+    Returns:
+        Dictionary with the pdf path, its output (or error), page count,
+        processing time and the worker's process id and model load time
+    """
+    start = time.perf_counter()
+    record = {"pdf": pdf_path, "worker": os.getpid(), "load_seconds": load_seconds}
+    try:
+        with system.parse_pdf(pdf_path) as document:
+            record["output"] = system.analyze(document, persona, top_k=top_k,
+                                              include_content=include_content)
+            record["pages"] = document.page_count
+    except Exception as e:
+        record["error"] = str(e)
+    record["seconds"] = time.perf_counter() - start
+    return record
+
+
+class BatchRunner:
+    """Run the full pipeline over many PDFs with models loaded once per worker
+
+    Documents are fanned out to a fixed pool of worker processes. Each worker
+    builds its SmartPDFInsights (SentenceTransformer, BART, quantization) once
+    in the pool initializer and then processes documents until the batch is
+    done, so model start-up is paid per worker instead of per document.
+    Results are yielded as soon as each document finishes.
+    """
+
+    def __init__(self, workers: int = 1, persona: str = "general reader", top_k: int = 5,
+                 include_content: bool = True, model_path: Optional[str] = None,
+                 cache_dir: Optional[str] = None, ocr_batch_size: int = 1):
+        """Initialize the batch runner
+
+        Args:
+            workers: Number of worker processes, each holding its own models
+                (0 or None uses every CPU; 1 runs in-process)
+            persona: Target persona for insights
+            top_k: Number of sections matched to the persona
+            include_content: Whether outputs include the full document text
+            model_path: Optional path to custom models
+            cache_dir: Optional directory for caches shared by all workers
+            ocr_batch_size: Scanned pages recognised per tesseract process
+        """
+        self.workers = workers if workers and workers > 0 else (os.cpu_count() or 1)
+        self.persona = persona
+        self.top_k = top_k
+        self.include_content = include_content
+        self.system_options = {
+            "model_path": model_path,
+            "cache_dir": cache_dir,
+            "ocr_batch_size": ocr_batch_size
+        }
+
+    def run(self, pdf_paths: List[str]) -> Iterator[Dict]:
+        """Process documents and yield their records in completion order
+
+        Args:
+            pdf_paths: PDF files to process
+
+        Yields:
+            Records from process_document, one per PDF
+        """
+        if self.workers == 1 or len(pdf_paths) <= 1:
+            start = time.perf_counter()
+            system = create_system(**self.system_options)
+            load_seconds = time.perf_counter() - start
+            for pdf_path in pdf_paths:
+                yield process_document(system, pdf_path, self.persona, self.top_k,
+                                       self.include_content, load_seconds=load_seconds)
+            return
+
+        workers = min(self.workers, len(pdf_paths))
+        torch_threads = max(1, (os.cpu_count() or 1) // workers)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(self.system_options, torch_threads)) as pool:
+            futures = [pool.submit(_process_in_worker, pdf_path, self.persona, self.top_k,
+                                   self.include_content)
+                       for pdf_path in pdf_paths]
+            for future in as_completed(futures):
+                yield future.result()
+
+    def run_to_directory(self, pdf_paths: List[str], output_dir: str) -> Dict:
+        """Process documents, writing each result file as soon as it is ready
+
+        Args:
+            pdf_paths: PDF files to process
+            output_dir: Directory for the per-document JSON files and the
+                batch report (batch_report.json)
+
+        Returns:
+            Throughput report (see throughput_report)
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        output_names = self._output_names(pdf_paths)
+
+        start = time.perf_counter()
+        records = []
+        for record in self.run(pdf_paths):
+            if "error" in record:
+                print(f"Failed to process {record['pdf']}: {record['error']}")
+            else:
+                output_file = os.path.join(output_dir, output_names[record["pdf"]])
+                with open(output_file, 'w') as f:
+                    json.dump(record.pop("output"), f, indent=2)
+                record["output_file"] = output_file
+                print(f"Processed {record['pdf']} ({record['pages']} pages, {record['seconds']:.2f}s)")
+            records.append(record)
+
+        report = self.throughput_report(records, time.perf_counter() - start)
+        with open(os.path.join(output_dir, "batch_report.json"), 'w') as f:
+            json.dump(report, f, indent=2)
+        return report
+
+    @staticmethod
+    def _output_names(pdf_paths: List[str]) -> Dict[str, str]:
+        """Unique output file name for every PDF, based on its file name"""
+        names = {}
+        used = set()
+        for pdf_path in pdf_paths:
+            stem = os.path.splitext(os.path.basename(pdf_path))[0]
+            name, suffix = f"{stem}.json", 1
+            while name in used:
+                name, suffix = f"{stem}_{suffix}.json", suffix + 1
+            used.add(name)
+            names[pdf_path] = name
+        return names
+
+    def throughput_report(self, records: List[Dict], wall_seconds: float) -> Dict:
+        """Aggregate throughput of a batch
+
+        Args:
+            records: Records yielded by run
+            wall_seconds: Elapsed time of the whole batch
+
+        Returns:
+            Dictionary with document, page and failure counts, wall-clock and
+            model load times, throughput, and the per-document records
+        """
+        succeeded = [record for record in records if "error" not in record]
+        pages = sum(record["pages"] for record in succeeded)
+
+        # Every worker reports its own one-off model load time
+        load_seconds = {}
+        for record in records:
+            if record.get("load_seconds") is not None:
+                load_seconds[record["worker"]] = record["load_seconds"]
+
+        return {
+            "workers": self.workers,
+            "documents": len(succeeded),
+            "failed": len(records) - len(succeeded),
+            "pages": pages,
+            "wall_seconds": wall_seconds,
+            "model_load_seconds": sum(load_seconds.values()),
+            "documents_per_second": len(succeeded) / wall_seconds if wall_seconds > 0 else 0.0,
+            "pages_per_second": pages / wall_seconds if wall_seconds > 0 else 0.0,
+            "records": records
+        }
+
+
+def main():
+    """Run SmartPDFInsights over a directory or glob of PDFs"""
+    parser = argparse.ArgumentParser(description="SmartPDFInsights batch mode")
+    parser.add_argument("--input", type=str, required=True,
+                        help="Directory (searched recursively) or glob pattern of PDF files")
+    parser.add_argument("--output_dir", type=str, default="batch_results",
+                        help="Directory for per-document results and the batch report")
+    parser.add_argument("--persona", type=str, default="general reader",
+                        help="Target persona for insights")
+    parser.add_argument("--top_k", type=int, default=5, help="Sections matched to the persona")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Worker processes, each loading the models once (0 = all CPUs)")
+    parser.add_argument("--model_path", type=str, help="Path to custom models")
+    parser.add_argument("--ocr_batch_size", type=int, default=1,
+                        help="Scanned pages recognised per tesseract process")
+    parser.add_argument("--cache_dir", type=str,
+                        help="Directory for caching results across runs, shared by all workers")
+    parser.add_argument("--no_content", action="store_true",
+                        help="Leave the full document text out of the outputs")
+
+    args = parser.parse_args()
+
+    pdf_paths = find_pdfs(args.input)
+    if not pdf_paths:
+        print(f"Error: no PDF files found for '{args.input}'")
+        return
+
+    print(f"Processing {len(pdf_paths)} PDFs with {args.workers} worker(s)")
+    runner = BatchRunner(workers=args.workers, persona=args.persona, top_k=args.top_k,
+                         include_content=not args.no_content, model_path=args.model_path,
+                         cache_dir=args.cache_dir, ocr_batch_size=args.ocr_batch_size)
+    report = runner.run_to_directory(pdf_paths, args.output_dir)
+
+    print("\nBatch Results:")
+    print(f"  Documents: {report['documents']} ({report['failed']} failed)")
+    print(f"  Pages: {report['pages']}")
+    print(f"  Wall time: {report['wall_seconds']:.2f}s "
+          f"(model loading: {report['model_load_seconds']:.2f}s across workers)")
+    print(f"  Throughput: {report['documents_per_second']:.2f} documents/s, "
+          f"{report['pages_per_second']:.2f} pages/s")
+    print(f"Results saved to {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
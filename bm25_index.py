@@ -0,0 +1,250 @@
+import re
+import json
+from array import array
+from typing import Dict, FrozenSet, Iterable, List, Tuple
+
+import numpy as np
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+
+# Tokens of two or more word characters, as in scikit-learn's vectorizers
+TOKEN_PATTERN = re.compile(r"(?u)\b\w\w+\b")
+
+
+def tokenize(text: str, ngram_range: Tuple[int, int] = (1, 1),
+             stop_words: FrozenSet[str] = ENGLISH_STOP_WORDS) -> List[str]:
+    """Lower-cased word n-grams of a text, with stop words removed first
+
+    Args:
+        text: Text to tokenize
+        ngram_range: Smallest and largest n-gram size
+        stop_words: Words dropped before n-grams are formed
+
+    Returns:
+        List of terms, with repetitions
+    """
+    words = [word for word in TOKEN_PATTERN.findall(text.lower()) if word not in stop_words]
+    min_n, max_n = ngram_range
+    terms = list(words) if min_n <= 1 else []
+    for n in range(max(2, min_n), max_n + 1):
+        terms.extend(" ".join(words[i:i + n]) for i in range(len(words) - n + 1))
+    return terms
+
+
+class BM25Index:
+    """Inverted index with BM25 scoring and incremental adds and deletes
+
+    Each term has a postings list of document ids and term frequencies held
+    in compact typed arrays, so adding documents only appends to the lists
+    of their terms. Scoring a query reads only the postings of the query
+    terms: its cost depends on how many documents contain those terms, not
+    on the size of the corpus.
+
+    Deleted documents are tombstoned and skipped (and left out of document
+    frequencies and the average length) until compact() rewrites the
+    postings without them. Document ids are assigned consecutively by add()
+    and never reused.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, ngram_range: Tuple[int, int] = (1, 1)):
+        """Create an empty index
+
+        Args:
+            k1: Term-frequency saturation
+            b: Document-length normalization (0 = none, 1 = full)
+            ngram_range: Smallest and largest n-gram size indexed
+        """
+        self.k1 = k1
+        self.b = b
+        self.ngram_range = tuple(ngram_range)
+
+        self.vocabulary = {}  # term -> term id
+        self.postings_docs = []  # term id -> array('i') of document ids
+        self.postings_tfs = []   # term id -> array('f') of term frequencies
+        self.doc_lengths = array('f')
+        self.deleted = bytearray()
+        self.live_docs = 0
+        self.live_length = 0.0
+
+    def __len__(self):
+        """Number of documents that are not deleted"""
+        return self.live_docs
+
+    @property
+    def n_docs(self) -> int:
+        """Number of document ids assigned, including deleted documents"""
+        return len(self.doc_lengths)
+
+    def add(self, texts: Iterable[str]) -> range:
+        """Index documents
+
+        Args:
+            texts: Document texts
+
+        Returns:
+            Ids of the added documents
+        """
+        start = self.n_docs
+        for text in texts:
+            doc_id = self.n_docs
+            terms = tokenize(text, self.ngram_range)
+            counts = {}
+            for term in terms:
+                counts[term] = counts.get(term, 0) + 1
+
+            for term, count in counts.items():
+                term_id = self.vocabulary.get(term)
+                if term_id is None:
+                    term_id = self.vocabulary[term] = len(self.postings_docs)
+                    self.postings_docs.append(array('i'))
+                    self.postings_tfs.append(array('f'))
+                self.postings_docs[term_id].append(doc_id)
+                self.postings_tfs[term_id].append(count)
+
+            length = sum(1 for term in terms if " " not in term) or len(terms)
+            self.doc_lengths.append(length)
+            self.deleted.append(0)
+            self.live_docs += 1
+            self.live_length += length
+        return range(start, self.n_docs)
+
+    def delete(self, doc_ids: Iterable[int]):
+        """Tombstone documents so they are no longer matched"""
+        for doc_id in doc_ids:
+            if 0 <= doc_id < self.n_docs and not self.deleted[doc_id]:
+                self.deleted[doc_id] = 1
+                self.live_docs -= 1
+                self.live_length -= self.doc_lengths[doc_id]
+
+    def compact(self):
+        """Drop the postings of deleted documents (their ids stay retired)"""
+        deleted = np.frombuffer(self.deleted, dtype=np.uint8).astype(bool)
+        if not deleted.any():
+            return
+        for term_id in range(len(self.postings_docs)):
+            docs = np.frombuffer(self.postings_docs[term_id], dtype=np.int32)
+            keep = ~deleted[docs]
+            if not keep.all():
+                tfs = np.frombuffer(self.postings_tfs[term_id], dtype=np.float32)
+                self.postings_docs[term_id] = array('i', docs[keep].tobytes())
+                self.postings_tfs[term_id] = array('f', tfs[keep].tobytes())
+
+    def _query_terms(self, query: str) -> Dict[int, int]:
+        """Term ids of a query with their counts, ignoring unknown terms"""
+        counts = {}
+        for term in tokenize(query, self.ngram_range):
+            term_id = self.vocabulary.get(term)
+            if term_id is not None:
+                counts[term_id] = counts.get(term_id, 0) + 1
+        return counts
+
+    def _postings_scores(self, query: str) -> Tuple[np.ndarray, np.ndarray]:
+        """BM25 contribution of every (query term, matching document) pair
+
+        Returns:
+            (document ids, contributions), with repeated ids for documents
+            matching several query terms
+        """
+        if self.live_docs == 0:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+
+        deleted = np.frombuffer(self.deleted, dtype=np.uint8)
+        lengths = np.frombuffer(self.doc_lengths, dtype=np.float32)
+        avg_length = max(self.live_length / self.live_docs, 1e-9)
+
+        all_docs, all_scores = [], []
+        for term_id, query_count in self._query_terms(query).items():
+            docs = np.frombuffer(self.postings_docs[term_id], dtype=np.int32)
+            tfs = np.frombuffer(self.postings_tfs[term_id], dtype=np.float32)
+            live = deleted[docs] == 0
+            if not live.all():
+                docs, tfs = docs[live], tfs[live]
+            if not len(docs):
+                continue
+
+            df = len(docs)
+            idf = np.log(1.0 + (self.live_docs - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1.0 - self.b + self.b * lengths[docs] / avg_length)
+            all_docs.append(docs)
+            all_scores.append(query_count * idf * tfs * (self.k1 + 1.0) / (tfs + norm))
+
+        if not all_docs:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+        return np.concatenate(all_docs), np.concatenate(all_scores)
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every document id (0 for non-matching or deleted ones)"""
+        docs, contributions = self._postings_scores(query)
+        return np.bincount(docs, weights=contributions, minlength=self.n_docs)
+
+    def score_batch(self, queries: List[str]) -> np.ndarray:
+        """(len(queries), n_docs) matrix of BM25 scores"""
+        result = np.zeros((len(queries), self.n_docs))
+        for q, query in enumerate(queries):
+            docs, contributions = self._postings_scores(query)
+            if len(docs):
+                result[q] = np.bincount(docs, weights=contributions, minlength=self.n_docs)
+        return result
+
+    def search(self, query: str, top_k: int = 10) -> List[Tuple[int, float]]:
+        """Best-scoring documents, touching only the query terms' postings
+
+        Returns:
+            (document id, score) pairs, best first
+        """
+        docs, contributions = self._postings_scores(query)
+        if not len(docs):
+            return []
+        doc_ids, inverse = np.unique(docs, return_inverse=True)
+        totals = np.bincount(inverse, weights=contributions)
+
+        k = min(top_k, len(totals))
+        best = np.argpartition(-totals, k - 1)[:k] if k < len(totals) else np.arange(k)
+        best = best[np.argsort(-totals[best], kind='stable')]
+        return [(int(doc_ids[i]), float(totals[i])) for i in best]
+
+    def save(self, path: str):
+        """Write the index to a single .npz file"""
+        terms = [None] * len(self.vocabulary)
+        for term, term_id in self.vocabulary.items():
+            terms[term_id] = term
+        sizes = np.array([len(docs) for docs in self.postings_docs], dtype=np.int64)
+
+        with open(path, 'wb') as f:
+            np.savez(
+                f,
+                params=np.frombuffer(json.dumps({
+                    "k1": self.k1, "b": self.b, "ngram_range": list(self.ngram_range)
+                }).encode('utf-8'), dtype=np.uint8),
+                terms=np.frombuffer(json.dumps(terms).encode('utf-8'), dtype=np.uint8),
+                postings_sizes=sizes,
+                postings_docs=np.frombuffer(b"".join(docs.tobytes() for docs in self.postings_docs),
+                                            dtype=np.int32),
+                postings_tfs=np.frombuffer(b"".join(tfs.tobytes() for tfs in self.postings_tfs),
+                                           dtype=np.float32),
+                doc_lengths=np.frombuffer(self.doc_lengths, dtype=np.float32),
+                deleted=np.frombuffer(self.deleted, dtype=np.uint8)
+            )
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        """Read an index written by save()"""
+        with np.load(path) as arrays:
+            params = json.loads(arrays["params"].tobytes().decode('utf-8'))
+            index = cls(k1=params["k1"], b=params["b"], ngram_range=tuple(params["ngram_range"]))
+            terms = json.loads(arrays["terms"].tobytes().decode('utf-8'))
+            offsets = np.concatenate([[0], np.cumsum(arrays["postings_sizes"])])
+            docs, tfs = arrays["postings_docs"], arrays["postings_tfs"]
+
+            index.vocabulary = {term: term_id for term_id, term in enumerate(terms)}
+            index.postings_docs = [array('i', docs[offsets[i]:offsets[i + 1]].tobytes())
+                                   for i in range(len(terms))]
+            index.postings_tfs = [array('f', tfs[offsets[i]:offsets[i + 1]].tobytes())
+                                  for i in range(len(terms))]
+            index.doc_lengths = array('f', arrays["doc_lengths"].tobytes())
+            index.deleted = bytearray(arrays["deleted"].tobytes())
+
+        lengths = np.frombuffer(index.doc_lengths, dtype=np.float32)
+        live = np.frombuffer(index.deleted, dtype=np.uint8) == 0
+        index.live_docs = int(live.sum())
+        index.live_length = float(lengths[live].sum())
+        return index
@@ -1,3 +1,6 @@
+import time
+import threading
+from concurrent.futures import Future
 import torch
 from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
 import numpy as np
@@ -12,6 +15,7 @@ class ContextAwareSummarizer:
         Args:
             model_name: Name of the model to use (facebook/bart-base recommended for CPU)
         """
+        self.model_name = model_name
         self.tokenizer = AutoTokenizer.from_pretrained(model_name)
         self.model = AutoModelForSeq2SeqLM.from_pretrained(model_name)
         
@@ -59,6 +63,44 @@ class ContextAwareSummarizer:
         
         return summary
     
+    def generate_summary_batch(self, texts: List[str], personas: List[str], max_length: int = 150,
+                               min_length: int = 40, num_beams: int = 4) -> List[str]:
+        """Generate summaries for several (text, persona) pairs in one padded generate call
+        
+        Args:
+            texts: Texts to summarize
+            personas: Target persona of each text
+            max_length: Maximum summary length
+            min_length: Minimum summary length
+            num_beams: Number of beams for beam search
+            
+        Returns:
+            Generated summaries, in input order
+        """
+        if not texts:
+            return []
+        
+        prompts = [self._create_prompt(text, persona) for text, persona in zip(texts, personas)]
+        
+        # Pad to the longest prompt; the attention mask keeps padding out of the encoder
+        inputs = self.tokenizer(prompts, return_tensors="pt", max_length=1024, truncation=True,
+                                padding=True)
+        
+        summary_ids = self.model.generate(
+            inputs["input_ids"],
+            attention_mask=inputs["attention_mask"],
+            max_length=max_length,
+            min_length=min_length,
+            num_beams=num_beams,
+            early_stopping=True,
+            no_repeat_ngram_size=2,
+            length_penalty=2.0
+        )
+        
+        summaries = self.tokenizer.batch_decode(summary_ids, skip_special_tokens=True)
+        return [self._post_process_summary(summary, persona)
+                for summary, persona in zip(summaries, personas)]
+    
     def _create_prompt(self, text: str, persona: str) -> str:
         """Create a context-aware prompt for the model
         
@@ -113,6 +155,41 @@ class ContextAwareSummarizer:
             Generated summary
         """
         # Stage 1: Extract key points (extractive summary)
+        extractive_summary = self._extract_key_sentences(text, persona)
+        
+        # Stage 2: Generate abstractive summary from the extractive summary
+        final_summary = self.generate_summary(
+            extractive_summary, persona, max_length=max_length
+        )
+        
+        return final_summary
+    
+    def generate_two_stage_summary_batch(self, texts: List[str], personas: List[str],
+                                         max_length: int = 150) -> List[str]:
+        """Two-stage summaries for several (text, persona) pairs, generated as one batch
+        
+        Args:
+            texts: Texts to summarize
+            personas: Target persona of each text
+            max_length: Maximum summary length
+            
+        Returns:
+            Generated summaries, in input order
+        """
+        extractive_summaries = [self._extract_key_sentences(text, persona)
+                                for text, persona in zip(texts, personas)]
+        return self.generate_summary_batch(extractive_summaries, personas, max_length=max_length)
+    
+    def _extract_key_sentences(self, text: str, persona: str) -> str:
+        """Extractive first stage: keep the sentences that best match the persona
+        
+        Args:
+            text: Text to summarize
+            persona: Description of the target persona
+            
+        Returns:
+            Up to a third of the sentences, in their original order
+        """
         # For simplicity, we'll use sentence scoring based on keyword matching
         sentences = text.split(". ")
         
@@ -130,14 +207,7 @@ class ContextAwareSummarizer:
         top_indices = sorted(top_indices)  # Sort by position to maintain flow
         
         # Create extractive summary
-        extractive_summary = ". ".join([sentences[i] for i in top_indices])
-        
-        # Stage 2: Generate abstractive summary from the extractive summary
-        final_summary = self.generate_summary(
-            extractive_summary, persona, max_length=max_length
-        )
-        
-        return final_summary
+        return ". ".join([sentences[i] for i in top_indices])
     
     def _get_persona_keywords(self, persona: str) -> List[str]:
         """Get keywords relevant to a specific persona
@@ -174,6 +244,207 @@ class ContextAwareSummarizer:
         return keyword_map[best_match]
 
 
+class _SummaryRequest:
+    """One queued summary request"""
+    
+    __slots__ = ("text", "persona", "max_length", "deadline", "future")
+    
+    def __init__(self, text: str, persona: str, max_length: int, deadline: float):
+        self.text = text
+        self.persona = persona
+        self.max_length = max_length
+        self.deadline = deadline
+        self.future = Future()
+
+
+class SummaryBatcher:
+    """Micro-batching scheduler for summaries requested by concurrent callers
+    
+    Callers submit single (text, persona) requests from any thread. A
+    scheduler thread collects them for a short window, or until
+    max_batch_size requests are waiting, and runs them as one padded
+    generate call; each caller gets its own summary back through a Future.
+    
+    Every request also has a latency cap. A batch is started early when
+    waiting longer would break the cap of a queued request, and it is kept
+    small enough that its estimated generation time (learnt from earlier
+    batches) still fits the tightest cap, so batching does not hurt tail
+    latency.
+    """
+    
+    def __init__(self, summarizer: ContextAwareSummarizer, max_batch_size: int = 8,
+                 batch_window: float = 0.01, max_latency: Optional[float] = None,
+                 two_stage: bool = True):
+        """Initialize the scheduler and start its thread
+        
+        Args:
+            summarizer: Summarizer whose model generates the batches
+            max_batch_size: Largest number of summaries per generate call
+            batch_window: Seconds to wait for more requests after the first
+                one of a batch arrives
+            max_latency: Default per-request latency cap in seconds (None
+                for no cap)
+            two_stage: Use generate_two_stage_summary_batch instead of
+                generate_summary_batch
+        """
+        self.summarizer = summarizer
+        self.max_batch_size = max(1, max_batch_size)
+        self.batch_window = batch_window
+        self.max_latency = max_latency
+        self.two_stage = two_stage
+        
+        self.queue = []
+        self.condition = threading.Condition()
+        self.closed = False
+        
+        # Running estimate of the generation time per summary in a batch
+        self.seconds_per_item = None
+        self.batches = 0
+        self.items = 0
+        
+        self.thread = threading.Thread(target=self._run, name="summary-batcher", daemon=True)
+        self.thread.start()
+    
+    def submit(self, text: str, persona: str, max_length: int = 150,
+               max_latency: Optional[float] = None) -> Future:
+        """Queue a summary request
+        
+        Args:
+            text: Text to summarize
+            persona: Description of the target persona
+            max_length: Maximum summary length; only requests with the same
+                max_length are batched together
+            max_latency: Latency cap of this request in seconds (defaults to
+                the scheduler's max_latency)
+            
+        Returns:
+            Future resolving to the summary
+        """
+        latency = self.max_latency if max_latency is None else max_latency
+        deadline = time.monotonic() + latency if latency is not None else float("inf")
+        request = _SummaryRequest(text, persona, max_length, deadline)
+        with self.condition:
+            if self.closed:
+                raise RuntimeError("SummaryBatcher is closed")
+            self.queue.append(request)
+            self.condition.notify()
+        return request.future
+    
+    def summarize(self, text: str, persona: str, max_length: int = 150,
+                  max_latency: Optional[float] = None) -> str:
+        """Queue a summary request and wait for its summary"""
+        return self.submit(text, persona, max_length, max_latency).result()
+    
+    def close(self):
+        """Finish the queued requests and stop the scheduler thread"""
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        self.thread.join()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+    
+    def stats(self) -> Dict:
+        """Number of batches and summaries generated, and the mean batch size"""
+        return {
+            "batches": self.batches,
+            "summaries": self.items,
+            "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+            "seconds_per_summary": self.seconds_per_item
+        }
+    
+    def _run(self):
+        """Scheduler loop: form batches and generate them"""
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            
+            texts = [request.text for request in batch]
+            personas = [request.persona for request in batch]
+            start = time.monotonic()
+            try:
+                if self.two_stage:
+                    summaries = self.summarizer.generate_two_stage_summary_batch(
+                        texts, personas, max_length=batch[0].max_length
+                    )
+                else:
+                    summaries = self.summarizer.generate_summary_batch(
+                        texts, personas, max_length=batch[0].max_length
+                    )
+            except Exception as e:
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+            
+            per_item = (time.monotonic() - start) / len(batch)
+            if self.seconds_per_item is None:
+                self.seconds_per_item = per_item
+            else:
+                self.seconds_per_item = 0.8 * self.seconds_per_item + 0.2 * per_item
+            self.batches += 1
+            self.items += len(batch)
+            
+            for request, summary in zip(batch, summaries):
+                request.future.set_result(summary)
+    
+    def _next_batch(self) -> Optional[List[_SummaryRequest]]:
+        """Wait for the next batch to be due and take it off the queue
+        
+        Returns:
+            Requests sharing the oldest request's max_length, or None once
+            the scheduler is closed and the queue is empty
+        """
+        with self.condition:
+            while not self.queue:
+                if self.closed:
+                    return None
+                self.condition.wait()
+            
+            # Collect more requests until the window ends, the batch is full
+            # or the tightest latency cap leaves no time to wait
+            window_end = time.monotonic() + self.batch_window
+            while not self.closed:
+                compatible = self._compatible()
+                if len(compatible) >= self.max_batch_size:
+                    break
+                due = min(window_end, self._latest_start(compatible))
+                remaining = due - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+            
+            # Requests closest to their cap go first
+            compatible = sorted(self._compatible(), key=lambda request: request.deadline)
+            batch = compatible[:self._batch_limit(compatible)]
+            taken = set(map(id, batch))
+            self.queue = [request for request in self.queue if id(request) not in taken]
+            return batch
+    
+    def _compatible(self) -> List[_SummaryRequest]:
+        """Queued requests that can share a generate call with the oldest one"""
+        max_length = self.queue[0].max_length
+        return [request for request in self.queue if request.max_length == max_length]
+    
+    def _latest_start(self, requests: List[_SummaryRequest]) -> float:
+        """Latest time a batch of requests can start and still meet every cap"""
+        duration = (self.seconds_per_item or 0.0) * len(requests)
+        return min(request.deadline for request in requests) - duration
+    
+    def _batch_limit(self, requests: List[_SummaryRequest]) -> int:
+        """Largest batch whose estimated generation time fits the tightest cap"""
+        if self.seconds_per_item is None:
+            return self.max_batch_size
+        budget = min(request.deadline for request in requests) - time.monotonic()
+        if budget == float("inf") or self.seconds_per_item <= 0:
+            return self.max_batch_size
+        return max(1, min(self.max_batch_size, int(budget / self.seconds_per_item)))
+
+
 class EvaluationMetrics:
     """Evaluation metrics for heading extraction and relevance ranking"""
     
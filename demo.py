@@ -13,23 +13,27 @@ import os
 import argparse
 import json
 from smart_pdf_insights import SmartPDFInsights
+from document_cache import DocumentCache, ArtifactCache
 
-def run_demo(pdf_path):
+def run_demo(pdf_path, cache_dir=None):
     """Run a complete demonstration of the SmartPDFInsights system
     
     Args:
         pdf_path: Path to the PDF file
+        cache_dir: Optional directory for parse results reused across runs
     """
     print("\n===== SmartPDFInsights Demo =====\n")
     print(f"Processing PDF: {pdf_path}\n")
     
     # Initialize system
-    system = SmartPDFInsights()
+    document_cache = DocumentCache(os.path.join(cache_dir, "documents")) if cache_dir else None
+    artifact_cache = ArtifactCache(os.path.join(cache_dir, "artifacts")) if cache_dir else None
+    system = SmartPDFInsights(document_cache=document_cache, artifact_cache=artifact_cache)
     
     # Step 1: Extract headings
     print("Step 1: Extracting headings and document structure...")
-    result = system.process_pdf(pdf_path)
-    headings = result["headings"]
+    document = system.parse_pdf(pdf_path)
+    headings = document.headings
     
     print(f"  Extracted {len(headings)} headings")
     print("  Sample headings:")
@@ -41,7 +45,7 @@ def run_demo(pdf_path):
     
     # Step 2: Extract sections
     print("Step 2: Extracting sections...")
-    sections = system.extract_sections(pdf_path)
+    sections = system.extract_sections(document)
     
     print(f"  Extracted {len(sections)} sections")
     print("  Sample sections:")
@@ -106,6 +110,7 @@ def main():
     """Main function to run the demo"""
     parser = argparse.ArgumentParser(description="SmartPDFInsights Demo")
     parser.add_argument("--pdf", type=str, required=True, help="Path to PDF file")
+    parser.add_argument("--cache_dir", type=str, help="Directory for caching parsed documents across runs")
     
     args = parser.parse_args()
     
@@ -115,7 +120,7 @@ def main():
         return
     
     # Run the demo
-    run_demo(args.pdf)
+    run_demo(args.pdf, cache_dir=args.cache_dir)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
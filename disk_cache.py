@@ -0,0 +1,124 @@
+import os
+import tempfile
+import threading
+from typing import Optional
+
+
+class DiskCache:
+    """Content-addressed on-disk cache with size-bounded LRU eviction
+
+    Every entry is a single file named after its key, spread over 256
+    sub-directories. Writes go to a temporary file that is renamed into place,
+    so concurrent processes sharing a cache directory never see partial
+    entries. Reads refresh the file's modification time, and once the total
+    size exceeds max_bytes the least recently used entries are removed.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 1 << 30):
+        """Open (or create) a cache directory
+
+        Args:
+            cache_dir: Directory holding the cache entries
+            max_bytes: Total size the cache is trimmed back to on eviction
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._total_bytes = sum(size for _, size, _ in self._entries())
+
+    def _path(self, key: str) -> str:
+        """File path of the entry stored under key"""
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def _entries(self):
+        """Yield (path, size, mtime) for every entry in the cache"""
+        for sub_dir in os.scandir(self.cache_dir):
+            if not sub_dir.is_dir():
+                continue
+            for entry in os.scandir(sub_dir.path):
+                if entry.name.startswith('.'):
+                    continue  # Temporary file of an in-progress write
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue  # Evicted by another process
+                yield entry.path, stat.st_size, stat.st_mtime
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return the bytes stored under key, or None on a cache miss"""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+
+        # Mark the entry as recently used for LRU eviction
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return data
+
+    def set(self, key: str, data: bytes):
+        """Store bytes under key, evicting old entries if the cache is full"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp_')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            # An entry rewritten under the same key no longer counts
+            replaced = self._size(path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        with self._lock:
+            self._total_bytes += len(data) - replaced
+            over_limit = self._total_bytes > self.max_bytes
+        if over_limit:
+            self.evict()
+
+    def delete(self, key: str):
+        """Remove the entry stored under key, if any"""
+        path = self._path(key)
+        size = self._size(path)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return
+        with self._lock:
+            self._total_bytes -= size
+
+    @staticmethod
+    def _size(path: str) -> int:
+        """Size of the entry file at path, or 0 if there is none"""
+        try:
+            return os.path.getsize(path)
+        except FileNotFoundError:
+            return 0
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits max_bytes"""
+        with self._lock:
+            entries = sorted(self._entries(), key=lambda entry: entry[2])
+            total = sum(size for _, size, _ in entries)
+
+            # Trim a little below the limit so eviction is not re-run on every write
+            target = self.max_bytes * 0.9
+            for path, size, _ in entries:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+            self._total_bytes = total
@@ -0,0 +1,207 @@
+import json
+import zlib
+import struct
+import hashlib
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from disk_cache import DiskCache
+from pdf_processor import EXTRACTOR_VERSION, SPAN_DTYPE, SpanFeatures
+
+# Entry layout: fixed header followed by a zlib-compressed body holding the
+# JSON fields, the UTF-8 document text, the int64 page offsets and the raw
+# span feature rows
+CACHE_MAGIC = b"SPDC"
+CACHE_FORMAT_VERSION = 2
+HEADER = struct.Struct("<4sHQQQQ32s")  # magic, format, json/text/offsets/spans lengths, body digest
+
+
+class DocumentCache:
+    """Persistent cache of parsed documents keyed by file content
+
+    Each entry stores everything a ParsedDocument needs to skip parsing:
+    headings, document structure, properties, the full-text buffer with its
+    page offsets, section spans, per-page fingerprints and (when heading
+    heuristics ran) span features. Entries are keyed by a hash of the PDF
+    bytes and the extractor version, so edited files or extraction changes
+    never reuse stale results. The entry last saved for a file path is also
+    reachable through previous(), so a new version of a file can reuse the
+    pages it shares with the old one. Every entry carries a digest of its body and
+    is discarded if it fails validation; the total cache size is bounded by
+    least-recently-used eviction.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 2 * 1024 * 1024 * 1024):
+        """Open (or create) the document cache
+
+        Args:
+            cache_dir: Directory holding the cached documents
+            max_bytes: Size limit enforced by least-recently-used eviction
+        """
+        self.store = DiskCache(cache_dir, max_bytes=max_bytes)
+
+    @staticmethod
+    def key(source) -> str:
+        """Cache key for a PDF: hash of its bytes plus the extractor version
+
+        Args:
+            source: Path to the PDF file, or its contents as a bytes-like object
+        """
+        digest = hashlib.sha256()
+        digest.update(f"{EXTRACTOR_VERSION}:".encode('utf-8'))
+        if isinstance(source, str):
+            with open(source, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(chunk)
+        else:
+            digest.update(source)
+        return digest.hexdigest()
+
+    @staticmethod
+    def _path_key(pdf_path: str) -> str:
+        """Key of the entry pointing at the latest cached version of a file"""
+        return hashlib.sha256(f"path:{os.path.abspath(pdf_path)}".encode('utf-8')).hexdigest()
+
+    def load(self, key: str) -> Optional[Dict]:
+        """Load a cached parse result
+
+        Returns:
+            Dictionary with headings, structure, properties, sections, content,
+            page_offsets, fingerprints and span_features, or None on a miss or
+            an invalid entry
+        """
+        data = self.store.get(key)
+        if data is None:
+            return None
+
+        state = self._decode(data)
+        if state is None:
+            print(f"Discarding invalid document cache entry {key}")
+            self.store.delete(key)
+        return state
+
+    def save(self, key: str, state: Dict, pdf_path: Optional[str] = None):
+        """Store a parse result (see load for the expected fields)
+
+        Args:
+            key: Cache key from key()
+            state: Parse result to store
+            pdf_path: Optional path of the file, recorded so that the next
+                version saved at the same path can find this one
+        """
+        self.store.set(key, self._encode(state))
+        if pdf_path is not None:
+            self.store.set(self._path_key(pdf_path), key.encode('ascii'))
+
+    def previous(self, pdf_path: str) -> Optional[Dict]:
+        """Load the parse result last saved for a file path, whatever its content"""
+        key = self.store.get(self._path_key(pdf_path))
+        if key is None:
+            return None
+        return self.load(key.decode('ascii', errors='replace'))
+
+    @staticmethod
+    def _encode(state: Dict) -> bytes:
+        """Serialize a parse result into the binary entry format"""
+        fields = {name: state.get(name)
+                  for name in ("headings", "structure", "properties", "sections", "fingerprints")}
+        features = state.get("span_features")
+        fields["line_texts"] = features.line_texts if features is not None else None
+        json_bytes = json.dumps(fields, separators=(',', ':')).encode('utf-8')
+        text_bytes = state["content"].encode('utf-8')
+        offsets_bytes = np.asarray(state["page_offsets"], dtype='<i8').tobytes()
+        spans_bytes = features.spans.astype(SPAN_DTYPE.newbyteorder('<')).tobytes() if features is not None else b""
+
+        body = zlib.compress(json_bytes + text_bytes + offsets_bytes + spans_bytes, 6)
+        header = HEADER.pack(CACHE_MAGIC, CACHE_FORMAT_VERSION, len(json_bytes), len(text_bytes),
+                             len(offsets_bytes), len(spans_bytes), hashlib.sha256(body).digest())
+        return header + body
+
+    @staticmethod
+    def _decode(data: bytes) -> Optional[Dict]:
+        """Validate and deserialize an entry, returning None if it is unusable"""
+        if len(data) < HEADER.size:
+            return None
+        magic, version, json_len, text_len, offsets_len, spans_len, body_digest = HEADER.unpack_from(data)
+        body = data[HEADER.size:]
+        if (magic != CACHE_MAGIC or version != CACHE_FORMAT_VERSION or
+                hashlib.sha256(body).digest() != body_digest):
+            return None
+
+        try:
+            raw = zlib.decompress(body)
+        except zlib.error:
+            return None
+        if (len(raw) != json_len + text_len + offsets_len + spans_len or
+                spans_len % SPAN_DTYPE.itemsize):
+            return None
+
+        state = json.loads(raw[:json_len])
+        state["content"] = raw[json_len:json_len + text_len].decode('utf-8')
+        offsets_end = json_len + text_len + offsets_len
+        state["page_offsets"] = np.frombuffer(raw[json_len + text_len:offsets_end], dtype='<i8').astype(np.int64)
+
+        line_texts = state.pop("line_texts", None)
+        state["span_features"] = None
+        if line_texts is not None:
+            spans = np.frombuffer(raw[offsets_end:], dtype=SPAN_DTYPE.newbyteorder('<')).astype(SPAN_DTYPE)
+            state["span_features"] = SpanFeatures(spans, line_texts)
+        return state
+
+
+class ArtifactCache:
+    """On-disk cache of model outputs keyed by section content
+
+    Embeddings and summaries are stored under a hash of the section text
+    together with the model and settings that produced them. Sections that
+    did not change between two versions of a document (or that repeat across
+    documents) therefore reuse their embeddings and summaries, and only new
+    or edited sections reach the models.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 1024 * 1024 * 1024):
+        """Open (or create) the artifact cache
+
+        Args:
+            cache_dir: Directory holding the cached artifacts
+            max_bytes: Size limit enforced by least-recently-used eviction
+        """
+        self.store = DiskCache(cache_dir, max_bytes=max_bytes)
+
+    @staticmethod
+    def key(*parts) -> str:
+        """Hash of an artifact kind, its model settings and the input text"""
+        digest = hashlib.sha256()
+        for part in parts:
+            data = str(part).encode('utf-8')
+            digest.update(struct.pack("<Q", len(data)))
+            digest.update(data)
+        return digest.hexdigest()
+
+    def get_embeddings(self, model_name: str, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Cached float32 embedding of every text, or None where missing"""
+        embeddings = []
+        for text in texts:
+            data = self.store.get(self.key("embedding", model_name, text))
+            if data is not None and len(data) % 4 == 0 and data:
+                embeddings.append(np.frombuffer(data, dtype='<f4').astype(np.float32))
+            else:
+                embeddings.append(None)
+        return embeddings
+
+    def set_embeddings(self, model_name: str, texts: List[str], embeddings: np.ndarray):
+        """Store the embedding of every text"""
+        for text, embedding in zip(texts, embeddings):
+            self.store.set(self.key("embedding", model_name, text),
+                           np.asarray(embedding, dtype='<f4').tobytes())
+
+    def get_summary(self, model_name: str, text: str, persona: str, max_length: int) -> Optional[str]:
+        """Cached two-stage summary of a text for a persona, or None"""
+        data = self.store.get(self.key("summary", model_name, max_length, persona, text))
+        return data.decode('utf-8', errors='replace') if data is not None else None
+
+    def set_summary(self, model_name: str, text: str, persona: str, max_length: int, summary: str):
+        """Store the two-stage summary of a text for a persona"""
+        self.store.set(self.key("summary", model_name, max_length, persona, text), summary.encode('utf-8'))
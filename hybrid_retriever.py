@@ -1,29 +1,137 @@
+import json
+import hashlib
+import threading
+from collections import OrderedDict
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 from sentence_transformers import SentenceTransformer
 import torch
 from typing import List, Dict, Tuple, Optional
 
+from bm25_index import BM25Index
+
+class CorpusIndex:
+    """Sparse and dense representations of one indexed corpus
+    
+    An index is self-contained (it carries its own BM25 inverted index), so
+    several corpora can be indexed and searched concurrently with the same
+    HybridRetriever. Everything that does not depend on the query is
+    computed once here: unit-length embeddings (cosine similarity becomes a
+    matrix product) and the static score priors of every document.
+    """
+    
+    def __init__(self, corpus: List[str], metadata: List[Dict], sparse_index: BM25Index,
+                 embeddings: torch.Tensor):
+        self.corpus = corpus
+        self.metadata = metadata
+        self.sparse_index = sparse_index
+        self.embeddings = embeddings
+        
+        dense = embeddings.cpu().numpy().astype(np.float32)
+        norms = np.linalg.norm(dense, axis=1, keepdims=True)
+        self.normalized_embeddings = dense / np.where(norms == 0, 1.0, norms)
+        
+        # Position bias (assuming earlier sections might be more important)
+        self.position_boost = np.linspace(0.1, 0, len(corpus))
+        # Length normalization (avoid bias towards longer sections)
+        lengths = np.array([len(doc.split()) for doc in corpus], dtype=np.float64)
+        self.length_penalty = 1.0 / np.log(2.0 + lengths / 100.0)  # Penalize very long documents
+    
+    def __len__(self):
+        return len(self.corpus)
+
+
+class EmbeddingCache:
+    """In-memory LRU of embeddings keyed by model and text content hash
+    
+    Optionally backed by an on-disk ArtifactCache: embeddings missing from
+    memory are looked up on disk, and new ones are written to both, so each
+    unique text is encoded once per process and, with a disk store, once
+    across runs.
+    """
+    
+    def __init__(self, max_entries: int = 20000, store=None):
+        """Initialize the cache
+        
+        Args:
+            max_entries: Number of embeddings kept in memory
+            store: Optional ArtifactCache persisting embeddings across runs
+        """
+        self.max_entries = max_entries
+        self.store = store
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+    
+    @staticmethod
+    def key(model_name: str, text: str) -> bytes:
+        """Content hash of a text for a model"""
+        return hashlib.sha256(f"{model_name}\0{text}".encode('utf-8')).digest()
+    
+    def get(self, model_name: str, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Cached embedding of every text, or None where missing"""
+        keys = [self.key(model_name, text) for text in texts]
+        with self.lock:
+            embeddings = []
+            for key in keys:
+                embedding = self.entries.get(key)
+                if embedding is not None:
+                    self.entries.move_to_end(key)
+                embeddings.append(embedding)
+        
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing and self.store is not None:
+            stored = self.store.get_embeddings(model_name, [texts[i] for i in missing])
+            found = [(i, embedding) for i, embedding in zip(missing, stored) if embedding is not None]
+            for i, embedding in found:
+                embeddings[i] = embedding
+            self._remember([keys[i] for i, _ in found], [embedding for _, embedding in found])
+        return embeddings
+    
+    def set(self, model_name: str, texts: List[str], embeddings: np.ndarray):
+        """Store the embedding of every text in memory and on disk"""
+        self._remember([self.key(model_name, text) for text in texts], list(embeddings))
+        if self.store is not None:
+            self.store.set_embeddings(model_name, texts, embeddings)
+    
+    def _remember(self, keys: List[bytes], embeddings: List[np.ndarray]):
+        """Add embeddings to the in-memory LRU"""
+        with self.lock:
+            for key, embedding in zip(keys, embeddings):
+                self.entries[key] = embedding
+                self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+
 class HybridRetriever:
-    """Hybrid retrieval system combining sparse (TF-IDF) and dense (transformer embeddings) retrieval"""
+    """Hybrid retrieval system combining sparse (BM25) and dense (transformer embeddings) retrieval"""
     
-    def __init__(self, model_name: str = 'all-MiniLM-L6-v2', sparse_weight: float = 0.3):
+    def __init__(self, model_name: str = 'all-MiniLM-L6-v2', sparse_weight: float = 0.3,
+                 embedding_cache=None, index_cache_size: int = 8,
+                 bm25_k1: float = 1.2, bm25_b: float = 0.75):
         """Initialize the hybrid retriever with both sparse and dense components
         
         Args:
             model_name: Name of the SentenceTransformer model to use
             sparse_weight: Weight for sparse retrieval scores (0-1)
+            embedding_cache: Optional ArtifactCache persisting embeddings across
+                runs; within a process, texts are never encoded twice anyway
+            index_cache_size: Number of recently built corpus indexes kept for
+                reuse when the same corpus is indexed again
+            bm25_k1: BM25 term-frequency saturation
+            bm25_b: BM25 document-length normalization
         """
+        self.model_name = model_name
+        self.embedding_cache = EmbeddingCache(store=embedding_cache)
+        self.index_cache_size = index_cache_size
+        self.index_cache = OrderedDict()
+        self.index_lock = threading.Lock()
         self.sparse_weight = sparse_weight
         self.dense_weight = 1.0 - sparse_weight
         
-        # Initialize sparse retriever (TF-IDF)
-        self.tfidf_vectorizer = TfidfVectorizer(
-            min_df=2, max_df=0.85,
-            stop_words='english',
-            ngram_range=(1, 2)
-        )
+        # Sparse retriever settings (BM25 over unigrams and bigrams)
+        self.bm25_k1 = bm25_k1
+        self.bm25_b = bm25_b
+        self.ngram_range = (1, 2)
         
         # Initialize dense retriever (SentenceTransformer)
         self.model = SentenceTransformer(model_name)
@@ -35,25 +143,110 @@ class HybridRetriever:
             )
         
         self.corpus_embeddings = None
-        self.corpus_sparse_vectors = None
+        self.corpus_sparse_index = None
         self.corpus = None
         self.corpus_metadata = None
+        self.corpus_index = None
     
     def index_corpus(self, corpus: List[str], metadata: Optional[List[Dict]] = None):
         """Index the corpus with both sparse and dense representations
         
+        The index becomes the retriever's current corpus, searched by
+        retrieve() when no other index is given.
+        
         Args:
             corpus: List of text documents to index
             metadata: Optional list of metadata dictionaries for each document
         """
-        self.corpus = corpus
-        self.corpus_metadata = metadata if metadata else [{} for _ in corpus]
+        index = self.build_index(corpus, metadata)
+        
+        self.corpus_index = index
+        self.corpus = index.corpus
+        self.corpus_metadata = index.metadata
+        self.corpus_sparse_index = index.sparse_index
+        self.corpus_embeddings = index.embeddings
+    
+    def build_index(self, corpus: List[str], metadata: Optional[List[Dict]] = None) -> CorpusIndex:
+        """Index a corpus without making it the retriever's current corpus
+        
+        Indexing the same corpus again (e.g. to match it to another persona)
+        returns the index built the first time, without re-indexing or
+        encoding anything.
+        
+        Args:
+            corpus: List of text documents to index
+            metadata: Optional list of metadata dictionaries for each document
+            
+        Returns:
+            CorpusIndex to pass to retrieve() or retrieve_batch()
+        """
+        metadata = metadata if metadata else [{} for _ in corpus]
+        
+        key = self._corpus_key(corpus, metadata)
+        with self.index_lock:
+            index = self.index_cache.get(key)
+            if index is not None:
+                self.index_cache.move_to_end(key)
+                return index
         
-        # Create sparse representations
-        self.corpus_sparse_vectors = self.tfidf_vectorizer.fit_transform(corpus)
+        # Create the sparse representation: an inverted index of the corpus
+        sparse_index = BM25Index(k1=self.bm25_k1, b=self.bm25_b, ngram_range=self.ngram_range)
+        sparse_index.add(corpus)
         
-        # Create dense representations
-        self.corpus_embeddings = self.model.encode(corpus, convert_to_tensor=True, show_progress_bar=False)
+        # Create dense representations; an empty corpus gets a (0, dim) matrix
+        embeddings = torch.from_numpy(self.encode(corpus))
+        
+        index = CorpusIndex(corpus, metadata, sparse_index, embeddings)
+        with self.index_lock:
+            self.index_cache[key] = index
+            while len(self.index_cache) > self.index_cache_size:
+                self.index_cache.popitem(last=False)
+        return index
+    
+    def _corpus_key(self, corpus: List[str], metadata: List[Dict]) -> str:
+        """Hash identifying a corpus, its metadata and the retriever model"""
+        digest = hashlib.sha256(self.model_name.encode('utf-8'))
+        for text in corpus:
+            digest.update(hashlib.sha256(text.encode('utf-8')).digest())
+        digest.update(json.dumps(metadata, sort_keys=True, default=str).encode('utf-8'))
+        return digest.hexdigest()
+    
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Float32 embeddings of texts, encoding only those not seen before
+        
+        Args:
+            texts: Texts to encode
+            
+        Returns:
+            Embedding matrix with one row per text
+        """
+        if not texts:
+            return np.zeros((0, self.model.get_sentence_embedding_dimension()), dtype=np.float32)
+        return self._encode_cached(texts)
+    
+    def _encode_cached(self, texts: List[str]) -> np.ndarray:
+        """Encode texts, reusing cached embeddings and encoding only the rest
+        
+        Args:
+            texts: Texts to encode
+            
+        Returns:
+            Float32 embedding matrix with one row per text
+        """
+        embeddings = self.embedding_cache.get(self.model_name, texts)
+        
+        # Encode each distinct missing text once
+        missing = list(dict.fromkeys(texts[i] for i, embedding in enumerate(embeddings)
+                                     if embedding is None))
+        if missing:
+            encoded = self.model.encode(missing, convert_to_numpy=True,
+                                        show_progress_bar=False).astype(np.float32)
+            self.embedding_cache.set(self.model_name, missing, encoded)
+            encoded = dict(zip(missing, encoded))
+            embeddings = [encoded[text] if embedding is None else embedding
+                          for text, embedding in zip(texts, embeddings)]
+        
+        return np.stack(embeddings)
     
     def expand_query(self, query: str) -> str:
         """Expand the query with relevant terms to improve retrieval
@@ -82,61 +275,138 @@ class HybridRetriever:
         
         return query
     
-    def retrieve(self, query: str, top_k: int = 5, expand: bool = True) -> List[Dict]:
+    def retrieve(self, query: str, top_k: int = 5, expand: bool = True,
+                 index: Optional[CorpusIndex] = None) -> List[Dict]:
         """Retrieve the most relevant documents using hybrid scoring
         
         Args:
             query: Query string
             top_k: Number of top results to return
             expand: Whether to apply query expansion
+            index: Index to search (defaults to the corpus from index_corpus)
             
         Returns:
             List of dictionaries with retrieved documents and scores
         """
-        if self.corpus is None or len(self.corpus) == 0:
-            return []
+        return self.retrieve_batch([query], top_k=top_k, expand=expand, index=index)[0]
+    
+    def retrieve_batch(self, queries: List[str], top_k: int = 5, expand: bool = True,
+                       index: Optional[CorpusIndex] = None) -> List[List[Dict]]:
+        """Retrieve the most relevant documents for several queries at once
+        
+        All queries are encoded in a single forward pass and scored against
+        the corpus with one matrix product per side; only the top_k scores
+        of each query are sorted.
+        
+        Args:
+            queries: Query strings
+            top_k: Number of top results to return per query
+            expand: Whether to apply query expansion
+            index: Index to search (defaults to the corpus from index_corpus)
+            
+        Returns:
+            One list of retrieved documents and scores per query, as in retrieve
+        """
+        if index is None:
+            index = self.corpus_index
+        if index is None or len(index) == 0:
+            return [[] for _ in queries]
         
         # Apply query expansion if enabled
         if expand:
-            query = self.expand_query(query)
+            queries = [self.expand_query(query) for query in queries]
         
-        # Get sparse scores
-        query_sparse = self.tfidf_vectorizer.transform([query])
-        sparse_scores = cosine_similarity(query_sparse, self.corpus_sparse_vectors).flatten()
+        # Get sparse scores from the postings of the query terms only; BM25 is
+        # unbounded, so scale each query's scores by its best one to keep them
+        # in [0, 1] like the dense cosine scores
+        sparse_scores = index.sparse_index.score_batch(queries)
+        max_scores = sparse_scores.max(axis=1, keepdims=True)
+        sparse_scores /= np.where(max_scores > 0, max_scores, 1.0)
         
-        # Get dense scores
-        query_embedding = self.model.encode(query, convert_to_tensor=True)
-        dense_scores = cosine_similarity(
-            query_embedding.cpu().numpy().reshape(1, -1),
-            self.corpus_embeddings.cpu().numpy()
-        ).flatten()
+        # Get dense scores against the pre-normalized corpus embeddings
+        query_embeddings = self.model.encode(queries, convert_to_numpy=True,
+                                             show_progress_bar=False).astype(np.float32)
+        norms = np.linalg.norm(query_embeddings, axis=1, keepdims=True)
+        query_embeddings /= np.where(norms == 0, 1.0, norms)
+        dense_scores = query_embeddings @ index.normalized_embeddings.T
         
-        # Combine scores
+        # Combine scores and apply the index's static priors
         combined_scores = (self.sparse_weight * sparse_scores) + (self.dense_weight * dense_scores)
+        combined_scores += index.position_boost
+        combined_scores *= index.length_penalty
+        
+        # Partial sort: only the top_k candidates of each query are ordered
+        k = min(top_k, combined_scores.shape[1])
+        if k <= 0:
+            return [[] for _ in queries]
+        if k < combined_scores.shape[1]:
+            candidates = np.argpartition(-combined_scores, k - 1, axis=1)[:, :k]
+        else:
+            candidates = np.broadcast_to(np.arange(k), combined_scores.shape)
+        order = np.argsort(-np.take_along_axis(combined_scores, candidates, axis=1), axis=1, kind='stable')
+        top_indices_batch = np.take_along_axis(candidates, order, axis=1)
+        
+        batch_results = []
+        for q in range(len(queries)):
+            top_indices = top_indices_batch[q]
+            
+            results = []
+            for idx in top_indices:
+                results.append({
+                    'content': index.corpus[idx],
+                    'metadata': index.metadata[idx],
+                    'score': float(combined_scores[q, idx]),
+                    'sparse_score': float(sparse_scores[q, idx]),
+                    'dense_score': float(dense_scores[q, idx])
+                })
+            batch_results.append(results)
+        
+        return batch_results
+
+
+    def search_store(self, queries: List[str], store, top_k: int = 5, expand: bool = True,
+                     ann_index=None, nprobe: Optional[int] = None) -> List[List[Dict]]:
+        """Dense retrieval over a persistent VectorStore, e.g. a whole library
+        
+        Args:
+            queries: Query strings
+            store: VectorStore holding embeddings from this retriever's model
+            top_k: Number of top results to return per query
+            expand: Whether to apply query expansion
+            ann_index: Optional IVFIndex over the store's rows (by row number)
+                searched instead of scanning every row
+            nprobe: Lists scanned per query by ann_index (defaults to its own)
+            
+        Returns:
+            One list of results per query, each with the row's id, metadata
+            and score
+        """
+        if store.model_name not in (None, self.model_name):
+            raise ValueError(f"Vector store holds embeddings of {store.model_name}, "
+                             f"not {self.model_name}")
+        if expand:
+            queries = [self.expand_query(query) for query in queries]
+        
+        query_embeddings = self.model.encode(queries, convert_to_numpy=True, show_progress_bar=False)
+        if ann_index is not None:
+            # PQ candidates are re-scored exactly against the stored rows; the
+            # index may still hold deleted rows, so enough extra are fetched
+            deleted = store.deleted
+            scores, rows = ann_index.search(query_embeddings, top_k=top_k + len(deleted), nprobe=nprobe,
+                                            rerank_vectors=store.vectors)
+            batch_results = [[(int(row), float(score)) for row, score in zip(query_rows, query_scores)
+                              if row >= 0 and row not in deleted][:top_k]
+                             for query_rows, query_scores in zip(rows, scores)]
+        else:
+            batch_results = store.search(query_embeddings, top_k=top_k)
         
-        # Apply position bias (assuming earlier sections might be more important)
-        position_boost = np.linspace(0.1, 0, len(combined_scores))
-        combined_scores += position_boost
-        
-        # Apply length normalization (avoid bias towards longer sections)
-        lengths = np.array([len(doc.split()) for doc in self.corpus])
-        length_penalty = 1.0 / np.log(2.0 + lengths / 100.0)  # Penalize very long documents
-        combined_scores *= length_penalty
-        
-        # Get top-k results
-        top_indices = combined_scores.argsort()[-top_k:][::-1]
-        
-        results = []
-        for idx in top_indices:
-            results.append({
-                'content': self.corpus[idx],
-                'metadata': self.corpus_metadata[idx],
-                'score': float(combined_scores[idx]),
-                'sparse_score': float(sparse_scores[idx]),
-                'dense_score': float(dense_scores[idx])
-            })
-        
-        return results
+        records = store.records
+        return [[{
+            'id': records[row]['id'],
+            'metadata': records[row]['metadata'],
+            'score': score,
+            'dense_score': score
+        } for row, score in results] for results in batch_results]
 
 
 class AdapterFineTuner:
@@ -0,0 +1,481 @@
+import os
+import json
+import time
+import base64
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit, parse_qs
+
+from smart_pdf_insights import SmartPDFInsights, Section
+from context_aware_summarizer import SummaryBatcher
+from pdf_processor import ParsedDocument
+from batch_runner import create_system
+
+# Largest request head (request line and headers) accepted, in bytes
+MAX_HEADER_BYTES = 64 * 1024
+
+REASONS = {
+    200: "OK",
+    204: "No Content",
+    400: "Bad Request",
+    403: "Forbidden",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error"
+}
+
+
+class RequestError(Exception):
+    """A request the service cannot answer, reported with an HTTP status"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class InsightsService:
+    """Asyncio HTTP service answering SmartPDFInsights queries
+
+    The models are loaded once, with the SmartPDFInsights instance given to
+    the service, and stay resident for its lifetime. The event loop only
+    parses requests and writes responses; PDF parsing runs on a dedicated
+    single-thread executor (PyMuPDF is not thread-safe) and retrieval and
+    summarization on a model executor, so one request's model work overlaps
+    the next request's parsing and the loop keeps answering /health.
+
+    Endpoints (all POST apart from /health):
+        GET  /health     Liveness, uptime and request counters
+        POST /headings   Headings and structure (process_pdf)
+        POST /sections   Sections split at the headings
+        POST /match      Sections matched to ?persona=...&top_k=...
+        POST /insights   Matched sections and their persona summaries
+
+    The PDF is sent either as the raw request body (Content-Type
+    application/pdf) with options in the query string, or as a JSON object
+    with "pdf_base64" (or "pdf", a path under the configured PDF root, when
+    path access is enabled), plus the options.
+
+    Browsers may only call the service from the configured origins: requests
+    carrying any other Origin header are refused, and CORS headers are only
+    sent back to allowed origins.
+    """
+
+    def __init__(self, system: SmartPDFInsights, model_workers: int = 1,
+                 max_upload_bytes: int = 100 * 1024 * 1024, pdf_root: Optional[str] = None,
+                 allowed_origins: Iterable[str] = ()):
+        """Initialize the service
+
+        Args:
+            system: SmartPDFInsights instance whose models serve every request
+            model_workers: Threads running retrieval and summarization
+            max_upload_bytes: Largest request body accepted
+            pdf_root: Directory whose PDFs JSON requests may name by path
+                instead of uploading them (None disables paths)
+            allowed_origins: Browser origins (e.g. "http://localhost:3000")
+                allowed to call the service
+        """
+        self.system = system
+        self.max_upload_bytes = max_upload_bytes
+        self.pdf_root = os.path.realpath(pdf_root) if pdf_root else None
+        self.allowed_origins = {origin.rstrip("/") for origin in allowed_origins}
+        self.pdf_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pdf")
+        self.model_executor = ThreadPoolExecutor(max_workers=max(1, model_workers),
+                                                 thread_name_prefix="model")
+        self.started = time.time()
+        self.requests = 0
+        self.failed = 0
+        self.in_flight = 0
+
+        self.routes = {
+            "/health": ("GET", self.health),
+            "/headings": ("POST", self.headings),
+            "/sections": ("POST", self.sections),
+            "/match": ("POST", self.match),
+            "/insights": ("POST", self.insights)
+        }
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8000) -> asyncio.AbstractServer:
+        """Listen on a TCP port"""
+        return await asyncio.start_server(self._serve_connection, host, port)
+
+    async def start_unix(self, path: str) -> asyncio.AbstractServer:
+        """Listen on a Unix domain socket"""
+        if os.path.exists(path):
+            os.unlink(path)
+        return await asyncio.start_unix_server(self._serve_connection, path)
+
+    def close(self):
+        """Shut the executors (and page-extraction workers) down once the server has stopped"""
+        self.pdf_executor.shutdown(wait=True)
+        self.model_executor.shutdown(wait=True)
+        self.system.close()
+
+    async def _serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Answer the requests of one (keep-alive) connection"""
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except RequestError as e:
+                    await self._write_response(writer, e.status, {"error": str(e)}, keep_alive=False)
+                    break
+                if request is None:
+                    break
+
+                method, target, headers, body = request
+                keep_alive = headers.get("connection", "").lower() != "close"
+                status, payload = await self.handle(method, target, headers, body)
+                await self._write_response(writer, status, payload, keep_alive,
+                                           origin=headers.get("origin"))
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader: asyncio.StreamReader
+                            ) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+        """Read one HTTP/1.1 request, or None once the client is done"""
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError as e:
+            if not e.partial.strip():
+                return None
+            raise RequestError(400, "Incomplete request")
+        except asyncio.LimitOverrunError:
+            raise RequestError(400, "Request head too large")
+        if len(head) > MAX_HEADER_BYTES:
+            raise RequestError(400, "Request head too large")
+
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            raise RequestError(400, "Malformed request line")
+
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            raise RequestError(400, "Chunked request bodies are not supported")
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            raise RequestError(400, "Invalid Content-Length")
+        if length > self.max_upload_bytes:
+            raise RequestError(413, f"Request body exceeds {self.max_upload_bytes} bytes")
+
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), target, headers, body
+
+    async def _write_response(self, writer: asyncio.StreamWriter, status: int,
+                              payload: Optional[Dict], keep_alive: bool,
+                              origin: Optional[str] = None):
+        """Write a JSON response"""
+        body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+        head = [
+            f"HTTP/1.1 {status} {REASONS.get(status, 'Unknown')}",
+            "Content-Type: application/json",
+            f"Content-Length: {len(body)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}"
+        ]
+        if self._origin_allowed(origin):
+            # Let the browser frontend call the service from its own origin
+            head += [
+                f"Access-Control-Allow-Origin: {origin}",
+                "Access-Control-Allow-Methods: GET, POST, OPTIONS",
+                "Access-Control-Allow-Headers: Content-Type",
+                "Vary: Origin"
+            ]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+    def _origin_allowed(self, origin: Optional[str]) -> bool:
+        """Whether a browser origin is on the allow-list"""
+        return origin is not None and origin.rstrip("/") in self.allowed_origins
+
+    async def handle(self, method: str, target: str, headers: Dict[str, str],
+                     body: bytes) -> Tuple[int, Optional[Dict]]:
+        """Route a request to its endpoint
+
+        Independent of the transport, so it can also be called directly.
+
+        Args:
+            method: HTTP method
+            target: Request target (path and query string)
+            headers: Request headers with lower-case names
+            body: Request body
+
+        Returns:
+            (HTTP status, JSON payload) pair
+        """
+        url = urlsplit(target)
+        if url.path not in self.routes:
+            return 404, {"error": f"Unknown endpoint: {url.path}"}
+        # Pages from other origins must not drive the service through a
+        # visitor's browser, whether or not the browser sends a preflight
+        if "origin" in headers and not self._origin_allowed(headers["origin"]):
+            return 403, {"error": f"Origin not allowed: {headers['origin']}"}
+        if method == "OPTIONS":
+            return 204, None
+        route_method, endpoint = self.routes[url.path]
+        if method != route_method:
+            return 405, {"error": f"{url.path} expects {route_method}"}
+
+        self.requests += 1
+        self.in_flight += 1
+        try:
+            if route_method == "GET":
+                return 200, await endpoint()
+            params = self._params(url.query, headers, body)
+            return 200, await endpoint(params)
+        except RequestError as e:
+            self.failed += 1
+            return e.status, {"error": str(e)}
+        except Exception as e:
+            self.failed += 1
+            print(f"Failed to answer {url.path}: {e}")
+            return 500, {"error": str(e)}
+        finally:
+            self.in_flight -= 1
+
+    def _params(self, query: str, headers: Dict[str, str], body: bytes) -> Dict:
+        """Request options and the PDF source, from the query string and body"""
+        params = {key: values[-1] for key, values in parse_qs(query).items()}
+
+        content_type = headers.get("content-type", "").split(";")[0].strip().lower()
+        if content_type == "application/json":
+            try:
+                data = json.loads(body or b"{}")
+            except ValueError as e:
+                raise RequestError(400, f"Invalid JSON: {e}")
+            if not isinstance(data, dict):
+                raise RequestError(400, "JSON body must be an object")
+            params.update(data)
+
+            if params.get("pdf_base64"):
+                try:
+                    params["source"] = base64.b64decode(params.pop("pdf_base64"), validate=True)
+                except ValueError:
+                    raise RequestError(400, "Invalid pdf_base64")
+            elif params.get("pdf"):
+                params["source"] = self._resolve_path(params["pdf"])
+        elif body:
+            # Raw upload, opened from memory without a temporary file
+            params["source"] = body
+
+        if "source" not in params:
+            raise RequestError(400, "No PDF given: send it as the body or as JSON 'pdf'/'pdf_base64'")
+        if isinstance(params["source"], bytes) and b"%PDF-" not in params["source"][:1024]:
+            raise RequestError(400, "Uploaded data is not a PDF")
+
+        params.setdefault("persona", "general reader")
+        if not isinstance(params["persona"], str) or not params["persona"].strip():
+            raise RequestError(400, "persona must be a non-empty string")
+
+        top_k = params.get("top_k", 5)
+        try:
+            if isinstance(top_k, bool):
+                raise TypeError
+            params["top_k"] = int(top_k)
+        except (TypeError, ValueError):
+            raise RequestError(400, "top_k must be an integer")
+        if params["top_k"] < 1:
+            raise RequestError(400, "top_k must be a positive integer")
+        params["content"] = str(params.get("content", "")).lower() in ("1", "true", "yes")
+        return params
+
+    def _resolve_path(self, path) -> str:
+        """Real path of a requested PDF, which must lie under the PDF root"""
+        if self.pdf_root is None:
+            raise RequestError(403, "PDF paths are disabled; upload the PDF instead")
+        if not isinstance(path, str):
+            raise RequestError(400, "'pdf' must be a path")
+        # Relative paths are taken from the root; symlinks are resolved first
+        resolved = os.path.realpath(os.path.join(self.pdf_root, path))
+        if os.path.commonpath([self.pdf_root, resolved]) != self.pdf_root:
+            raise RequestError(403, f"PDF path is outside the served directory: {path}")
+        if not os.path.isfile(resolved):
+            raise RequestError(400, f"No such PDF: {path}")
+        return resolved
+
+    async def _run_pdf(self, func, *args):
+        """Run PDF work on the PDF executor"""
+        return await asyncio.get_running_loop().run_in_executor(self.pdf_executor, func, *args)
+
+    async def _run_model(self, func, *args):
+        """Run retrieval or summarization on the model executor"""
+        return await asyncio.get_running_loop().run_in_executor(self.model_executor, func, *args)
+
+    def _parse_sections(self, params: Dict) -> Tuple[ParsedDocument, List[Dict]]:
+        """Parse the request's PDF and split it into sections
+
+        Sections keep their text in memory, so the document can be closed
+        (on the PDF executor) as soon as they are extracted.
+        """
+        document = self.system.parse_pdf(params["source"], name=params.get("name"))
+        try:
+            return document, self.system.extract_sections(document)
+        except Exception:
+            document.close()
+            raise
+
+    def _match(self, sections: List[Dict], persona: str, top_k: int) -> List[Dict]:
+        """Match sections with an index of their own, leaving the retriever's
+        current corpus alone so requests can be matched concurrently"""
+        if not sections:
+            return []
+        index = self.system.build_section_index(sections)
+        return self.system.match_sections_to_personas(sections, [persona], top_k=top_k,
+                                                      index=index)[0]
+
+    @staticmethod
+    def _section_record(section: Section, include_content: bool) -> Dict:
+        """JSON-ready view of a (matched) section"""
+        fields = section.to_dict(include_content)
+        return {key: fields[key] for key in ("heading", "level", "page", "id", "score", "content")
+                if key in fields}
+
+    async def health(self) -> Dict:
+        """GET /health"""
+        health = {
+            "status": "ok",
+            "uptime_seconds": time.time() - self.started,
+            "requests": self.requests,
+            "failed": self.failed,
+            "in_flight": self.in_flight
+        }
+        if self.system.summary_batcher is not None:
+            health["summary_batching"] = self.system.summary_batcher.stats()
+        return health
+
+    async def headings(self, params: Dict) -> Dict:
+        """POST /headings: process_pdf output, without the text unless ?content=1"""
+        def run():
+            with self.system.parse_pdf(params["source"], name=params.get("name")) as document:
+                result = self.system.process_pdf(document)
+                result = {key: value for key, value in result.items()
+                          if key != "content" or params["content"]}
+                result["pdf"] = document.pdf_path
+                result["page_count"] = document.page_count
+                return result
+        return await self._run_pdf(run)
+
+    async def sections(self, params: Dict) -> Dict:
+        """POST /sections: sections, without their text unless ?content=1"""
+        document, sections = await self._run_pdf(self._parse_sections, params)
+        await self._run_pdf(document.close)
+        return {
+            "pdf": document.pdf_path,
+            "sections": [self._section_record(s, params["content"]) for s in sections]
+        }
+
+    async def match(self, params: Dict) -> Dict:
+        """POST /match: the top_k sections for ?persona=..."""
+        persona = params["persona"]
+        document, sections = await self._run_pdf(self._parse_sections, params)
+        await self._run_pdf(document.close)
+        matched = await self._run_model(self._match, sections, persona, params["top_k"])
+        return {
+            "pdf": document.pdf_path,
+            "persona": persona,
+            "matched_sections": [self._section_record(s, params["content"]) for s in matched]
+        }
+
+    async def insights(self, params: Dict) -> Dict:
+        """POST /insights: matched sections and their persona summaries"""
+        persona = params["persona"]
+        document, sections = await self._run_pdf(self._parse_sections, params)
+        await self._run_pdf(document.close)
+        matched = await self._run_model(self._match, sections, persona, params["top_k"])
+        insights = await self._run_model(self.system.generate_insights, matched, persona)
+        return {
+            "pdf": document.pdf_path,
+            "persona": persona,
+            "matched_sections": [self._section_record(s, False) for s in matched],
+            "insights": insights
+        }
+
+
+async def serve(service: InsightsService, host: str = "127.0.0.1", port: int = 8000,
+                unix_socket: Optional[str] = None):
+    """Run the service until cancelled"""
+    if unix_socket:
+        server = await service.start_unix(unix_socket)
+        print(f"Serving on unix:{unix_socket}")
+    else:
+        server = await service.start(host, port)
+        print(f"Serving on http://{host}:{port}")
+
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+def main():
+    """Serve SmartPDFInsights over HTTP with the models loaded once"""
+    parser = argparse.ArgumentParser(description="SmartPDFInsights local inference service")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=8000, help="Port to listen on")
+    parser.add_argument("--unix_socket", type=str,
+                        help="Listen on this Unix domain socket instead of a TCP port")
+    parser.add_argument("--model_workers", type=int, default=1,
+                        help="Threads running retrieval and summarization; with summary "
+                             "batching, also the number of requests batched together")
+    parser.add_argument("--summary_batch_size", type=int, default=0,
+                        help="Batch the summaries of concurrent requests, up to this many "
+                             "per generate call (0 = off)")
+    parser.add_argument("--batch_window_ms", type=float, default=10,
+                        help="How long a summary waits for others to batch with")
+    parser.add_argument("--max_latency_ms", type=float, default=0,
+                        help="Per-summary latency cap that limits batching (0 = none)")
+    parser.add_argument("--max_upload_mb", type=int, default=100, help="Largest PDF accepted")
+    parser.add_argument("--allow_paths", type=str, metavar="DIR",
+                        help="Also accept JSON 'pdf' paths, restricted to PDFs under this "
+                             "directory (off by default: PDFs must be uploaded)")
+    parser.add_argument("--allowed_origins", type=str, nargs="*", default=[],
+                        help="Browser origins allowed to call the service, e.g. "
+                             "http://localhost:3000 (default: none)")
+    parser.add_argument("--model_path", type=str, help="Path to custom models")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Processes for page extraction and OCR within a document")
+    parser.add_argument("--ocr_batch_size", type=int, default=1,
+                        help="Scanned pages recognised per tesseract process")
+    parser.add_argument("--cache_dir", type=str,
+                        help="Directory for caching results across requests and restarts")
+
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    system = create_system(model_path=args.model_path, cache_dir=args.cache_dir,
+                           ocr_batch_size=args.ocr_batch_size, workers=args.workers)
+    print(f"Models loaded in {time.perf_counter() - start:.2f}s")
+    if args.summary_batch_size > 0:
+        system.summary_batcher = SummaryBatcher(system.summarizer,
+                                                max_batch_size=args.summary_batch_size,
+                                                batch_window=args.batch_window_ms / 1000,
+                                                max_latency=args.max_latency_ms / 1000 or None)
+
+    service = InsightsService(system, model_workers=args.model_workers,
+                              max_upload_bytes=args.max_upload_mb * 1024 * 1024,
+                              pdf_root=args.allow_paths, allowed_origins=args.allowed_origins)
+    try:
+        asyncio.run(serve(service, host=args.host, port=args.port, unix_socket=args.unix_socket))
+    except KeyboardInterrupt:
+        print("Service stopped")
+    finally:
+        if system.summary_batcher is not None:
+            system.summary_batcher.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+import os
+import json
+import zlib
+import hashlib
+import shlex
+import subprocess
+import tempfile
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional
+
+import fitz  # PyMuPDF
+import numpy as np
+import cv2
+import pytesseract
+
+from disk_cache import DiskCache
+
+# Page segmentation mode 3: fully automatic page segmentation
+DEFAULT_OCR_CONFIG = r'--oem 3 --psm 3'
+
+# Pages are rendered at 2x (144 DPI) unless that would exceed the pixel budget
+DEFAULT_OCR_DPI = 144
+MAX_OCR_PIXELS = 24_000_000
+
+# Columns of tesseract's TSV output, as returned by pytesseract's Output.DICT
+TSV_INT_COLUMNS = ('level', 'page_num', 'block_num', 'par_num', 'line_num', 'word_num',
+                   'left', 'top', 'width', 'height')
+
+
+class OCRCache:
+    """On-disk cache of OCR results keyed by rendered page content
+
+    The key is a hash of the preprocessed page raster together with the
+    tesseract configuration string, so repeated runs over the same scans (with
+    other personas, evaluate(), the demo, ...) skip tesseract entirely, while a
+    different config or render resolution never reuses stale results.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 512 * 1024 * 1024):
+        """Open (or create) the OCR cache
+
+        Args:
+            cache_dir: Directory holding the cached OCR results
+            max_bytes: Size limit enforced by least-recently-used eviction
+        """
+        self.store = DiskCache(cache_dir, max_bytes=max_bytes)
+
+    @staticmethod
+    def key(image: np.ndarray, config: str) -> str:
+        """Content hash of a preprocessed page image and OCR config"""
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(config.encode('utf-8'))
+        digest.update(np.asarray(image.shape, dtype=np.int64).tobytes())
+        digest.update(np.ascontiguousarray(image).data)
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[dict]:
+        """Return cached OCR data, or None on a miss or unreadable entry"""
+        data = self.store.get(key)
+        if data is None:
+            return None
+        try:
+            return json.loads(zlib.decompress(data))
+        except (zlib.error, ValueError):
+            self.store.delete(key)  # Corrupt entry, recompute it
+            return None
+
+    def set(self, key: str, ocr_data: dict):
+        """Store the OCR data of a page"""
+        self.store.set(key, zlib.compress(json.dumps(ocr_data).encode('utf-8')))
+
+
+class OCREngine:
+    """Worker-pool OCR engine for scanned PDF pages
+
+    Pages are rendered and preprocessed on the calling thread (PyMuPDF is not
+    thread-safe) and handed to a pool of OCR workers. Each worker blocks on its
+    own tesseract subprocess, so up to max_workers pages are recognised at once
+    while the next pages are being rendered. Results are streamed back in page
+    order, and every page runs under its own timeout so that a single bad page
+    cannot stall the whole document.
+
+    With batch_size > 1 each worker recognises a batch of pages in a single
+    tesseract invocation (an image list file), so process startup and
+    traineddata loading are paid once per batch instead of once per page.
+
+    An optional OCRCache short-circuits pages whose rendered raster has been
+    recognised before with the same configuration.
+    """
+
+    def __init__(self, max_workers: int = 1, page_timeout: float = 120,
+                 config: str = DEFAULT_OCR_CONFIG, dpi: int = DEFAULT_OCR_DPI,
+                 max_pixels: int = MAX_OCR_PIXELS, batch_size: int = 1,
+                 cache: Optional[OCRCache] = None):
+        """Initialize the OCR engine
+
+        Args:
+            max_workers: Maximum number of pages OCR'd concurrently
+                (0 or None uses every CPU)
+            page_timeout: Seconds before tesseract is stopped for a page
+                (0 disables the timeout)
+            config: Tesseract configuration string
+            dpi: Resolution pages are rendered at for OCR
+            max_pixels: Upper bound on rendered pixels per page; oversized
+                pages (posters, drawings) are rendered at a lower DPI
+            batch_size: Number of pages recognised per tesseract process
+            cache: Optional OCRCache consulted before running tesseract
+        """
+        self.max_workers = max_workers if max_workers and max_workers > 0 else (os.cpu_count() or 1)
+        self.page_timeout = page_timeout
+        self.config = config
+        self.dpi = dpi
+        self.max_pixels = max_pixels
+        self.batch_size = max(1, batch_size)
+        self.cache = cache
+
+    def _tesseract_env(self) -> Optional[dict]:
+        """Environment for tesseract processes started by ocr_images
+
+        Concurrent pages already use every worker, so each tesseract process
+        is stopped from spawning its own OpenMP threads on top of that. The
+        limit is passed to the child only; the caller's environment is left
+        untouched.
+        """
+        if self.max_workers > 1:
+            return {**os.environ, "OMP_THREAD_LIMIT": "1"}
+        return None
+
+    def render_page(self, page):
+        """Render a page directly to an 8-bit grayscale pixmap
+
+        Args:
+            page: The fitz page object
+
+        Returns:
+            Grayscale fitz.Pixmap without alpha channel
+        """
+        zoom = self.dpi / 72.0
+        # Scale down pages whose raster would exceed the pixel budget
+        pixels = page.rect.width * page.rect.height * zoom * zoom
+        if pixels > self.max_pixels:
+            zoom *= (self.max_pixels / pixels) ** 0.5
+        return page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY, alpha=False)
+
+    @staticmethod
+    def pixmap_array(pix) -> np.ndarray:
+        """View the samples of a grayscale pixmap as a (height, width) array
+
+        The array shares memory with the pixmap, so the pixmap must stay alive
+        for as long as the array is used.
+        """
+        samples = pix.samples_mv if hasattr(pix, "samples_mv") else pix.samples
+        rows = np.frombuffer(samples, dtype=np.uint8).reshape(pix.height, pix.stride)
+        return rows[:, :pix.width]
+
+    def preprocess_page(self, page) -> np.ndarray:
+        """Render a page and enhance it for OCR
+
+        Args:
+            page: The fitz page object
+
+        Returns:
+            Binarised grayscale image as a NumPy array
+        """
+        pix = self.render_page(page)
+
+        # Enhance image for better OCR; the threshold output is the only copy
+        return cv2.adaptiveThreshold(
+            self.pixmap_array(pix), 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2
+        )
+
+    def ocr_image(self, image: np.ndarray) -> dict:
+        """Run tesseract with layout analysis on a preprocessed page image
+
+        Returns:
+            Per-word OCR data in pytesseract's Output.DICT format
+        """
+        return pytesseract.image_to_data(
+            image, config=self.config, output_type=pytesseract.Output.DICT,
+            timeout=self.page_timeout
+        )
+
+    def ocr_images(self, images) -> list:
+        """Recognise several page images with a single tesseract process
+
+        Args:
+            images: Preprocessed page images
+
+        Returns:
+            Per-word OCR data for every image, in the same format as ocr_image
+        """
+        with tempfile.TemporaryDirectory(prefix="ocr_batch_") as tmp_dir:
+            image_paths = []
+            for i, image in enumerate(images):
+                # Uncompressed PGM keeps the write cheap; leptonica reads it natively
+                path = os.path.join(tmp_dir, f"page_{i}.pgm")
+                cv2.imwrite(path, image)
+                image_paths.append(path)
+
+            list_path = os.path.join(tmp_dir, "pages.txt")
+            with open(list_path, 'w') as f:
+                f.write("\n".join(image_paths) + "\n")
+
+            command = [pytesseract.pytesseract.tesseract_cmd, list_path, "stdout",
+                       *shlex.split(self.config), "tsv"]
+            timeout = self.page_timeout * len(images) if self.page_timeout else None
+            completed = subprocess.run(command, capture_output=True, timeout=timeout, check=True,
+                                       env=self._tesseract_env())
+
+        return self._parse_tsv(completed.stdout.decode('utf-8', errors='replace'), len(images))
+
+    @staticmethod
+    def _parse_tsv(tsv: str, image_count: int) -> list:
+        """Split tesseract TSV output for an image list into per-image dicts"""
+        columns = TSV_INT_COLUMNS + ('conf', 'text')
+        results = [{column: [] for column in columns} for _ in range(image_count)]
+
+        lines = tsv.splitlines()
+        for line in lines[1:]:  # Skip the header row
+            fields = line.split('\t')
+            if len(fields) < len(columns) - 1:
+                continue
+            # Tesseract numbers the images of a list from 1
+            image_index = int(fields[1]) - 1
+            if not 0 <= image_index < image_count:
+                continue
+            data = results[image_index]
+            for column, value in zip(TSV_INT_COLUMNS, fields):
+                data[column].append(int(value))
+            data['page_num'][-1] = 1  # Same as a single-image run
+            data['conf'].append(float(fields[10]))
+            data['text'].append(fields[11] if len(fields) > 11 else "")
+
+        return results
+
+    @classmethod
+    def _finished_pages(cls, partial_tsv: Optional[bytes], image_count: int) -> list:
+        """OCR data of the pages a timed-out batch completed, None for the others
+
+        Tesseract recognises the images of a list in order, so every image
+        before the last one with output was finished. The last one may have
+        been cut short and is dropped with the images after it.
+        """
+        tsv = (partial_tsv or b"").decode('utf-8', errors='replace')
+        tsv = tsv[:tsv.rfind("\n") + 1]  # A line cut off by the kill is incomplete
+        results = cls._parse_tsv(tsv, image_count)
+        seen = [i for i, data in enumerate(results) if data['level']]
+        finished = seen[-1] if seen else 0
+        return [data if i < finished else None for i, data in enumerate(results)]
+
+    def _ocr_page(self, page_num: int, image: np.ndarray):
+        """OCR a single page, reporting failures instead of raising them"""
+        try:
+            return self.ocr_image(image)
+        except RuntimeError as e:
+            # pytesseract raises RuntimeError when the page timeout expires
+            print(f"OCR failed on page {page_num + 1}: {e}")
+        except pytesseract.TesseractError as e:
+            print(f"OCR failed on page {page_num + 1}: {e}")
+        return None
+
+    def _ocr_pages(self, page_nums, images, cache_keys=None) -> list:
+        """OCR a batch of pages, falling back to one page at a time on failure"""
+        # pytesseract cannot pass an environment to tesseract, so single pages
+        # only go through it when no thread limit is needed
+        if len(images) == 1 and self.max_workers == 1:
+            results = [self._ocr_page(page_nums[0], images[0])]
+        else:
+            try:
+                results = self.ocr_images(images)
+            except subprocess.TimeoutExpired as e:
+                # The batch has used up the time of all its pages, so nothing
+                # is retried: pages tesseract finished are kept, the rest fail
+                print(f"OCR timed out on pages {page_nums[0] + 1}-{page_nums[-1] + 1}")
+                results = self._finished_pages(e.stdout, len(images))
+            except (OSError, subprocess.SubprocessError, ValueError) as e:
+                # Retry page by page so a single bad page only loses itself
+                print(f"Batched OCR failed on pages {page_nums[0] + 1}-{page_nums[-1] + 1}: {e}")
+                results = [self._ocr_page(page_num, image) for page_num, image in zip(page_nums, images)]
+
+        if cache_keys is not None:
+            for key, ocr_data in zip(cache_keys, results):
+                if ocr_data is not None:  # Failures are retried on the next run
+                    self.cache.set(key, ocr_data)
+        return results
+
+    def iter_pages(self, doc, page_numbers=None):
+        """OCR pages concurrently and yield their results in page order
+
+        Args:
+            doc: The fitz document object
+            page_numbers: Optional 0-based page indices (defaults to every page)
+
+        Yields:
+            Tuples of (page_num, ocr_data); ocr_data is None when the page
+            failed or timed out
+        """
+        if page_numbers is None:
+            page_numbers = range(len(doc))
+
+        # Bound the number of rendered batches waiting for a worker, so memory
+        # stays flat however long the document is
+        max_pending = 2 * self.max_workers
+        pending = deque()
+        batch, images, cache_keys = [], [], []
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            def submit_batch():
+                keys = list(cache_keys) if self.cache is not None else None
+                pending.append((list(batch), pool.submit(self._ocr_pages, list(batch), list(images), keys)))
+                batch.clear()
+                images.clear()
+                cache_keys.clear()
+
+            for page_num in page_numbers:
+                image = self.preprocess_page(doc[page_num])
+
+                cached = None
+                if self.cache is not None:
+                    key = self.cache.key(image, self.config)
+                    cached = self.cache.get(key)
+
+                if cached is not None:
+                    # Keep results in page order: send any open batch off first
+                    if batch:
+                        submit_batch()
+                    done = Future()
+                    done.set_result([cached])
+                    pending.append(([page_num], done))
+                else:
+                    batch.append(page_num)
+                    images.append(image)
+                    if self.cache is not None:
+                        cache_keys.append(key)
+                    if len(batch) >= self.batch_size:
+                        submit_batch()
+
+                while len(pending) >= max_pending:
+                    yield from self._collect(*pending.popleft())
+
+            if batch:
+                submit_batch()
+            while pending:
+                yield from self._collect(*pending.popleft())
+
+    @staticmethod
+    def _collect(batch, future):
+        """Pair the results of a finished batch with its page numbers"""
+        yield from zip(batch, future.result())
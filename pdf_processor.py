@@ -1,28 +1,359 @@
+import io
+import os
+import mmap
+import hashlib
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import count, repeat
+
 import fitz  # PyMuPDF
 import numpy as np
-import cv2
-from PIL import Image
-import pytesseract
+
+from ocr_engine import OCREngine
+
+# Line prefixes that mark a heading, and prefixes that rule one out
+HEADING_PREFIXES = ("Chapter", "Section", "Part")
+NON_HEADING_PREFIXES = ("http", "www", "Figure", "Table")
+
+# A page is sent to OCR when images cover at least this fraction of it and
+# its text layer has fewer than this many non-whitespace characters
+MIN_SCANNED_IMAGE_COVERAGE = 0.5
+MIN_TEXT_LAYER_CHARS = 20
+
+# Images smaller than this many pixels are never treated as page scans, and
+# document-level scanned detection looks at most at this many pages
+MIN_SCANNED_IMAGE_PIXELS = 64 * 64
+SCANNED_SAMPLE_PAGES = 50
+
+# Bump whenever heading, text or section extraction changes its output, so
+# persisted parse results from older versions are no longer reused
+EXTRACTOR_VERSION = "1"
+
+# Columnar layout of the span features used for heading detection
+SPAN_DTYPE = np.dtype([
+    ("page", np.int32),    # 0-based page index
+    ("line", np.int32),    # Index into SpanFeatures.line_texts
+    ("size", np.float64),  # Font size
+    ("flags", np.int32),   # PyMuPDF font flags
+    ("length", np.int32),  # Number of characters in the span
+    ("x0", np.float32),
+    ("y0", np.float32),
+    ("x1", np.float32),
+    ("y1", np.float32),
+])
+
+
+class SpanFeatures:
+    """Compact columnar store of text span features
+    
+    Spans live in a single structured NumPy array (one row per span, see
+    SPAN_DTYPE) grouped line by line; the text of each line is kept once in
+    line_texts and referenced by the span's line index.
+    """
+    
+    def __init__(self, spans=None, line_texts=None):
+        self.spans = spans if spans is not None else np.empty(0, dtype=SPAN_DTYPE)
+        self.line_texts = line_texts if line_texts is not None else []
+    
+    @classmethod
+    def from_page(cls, page, page_num, textpage=None):
+        """Collect span features from a single page
+        
+        Args:
+            page: The fitz page object
+            page_num: 0-based index of the page
+            textpage: Optional TextPage to reuse instead of parsing the page again
+            
+        Returns:
+            SpanFeatures for the page
+        """
+        rows = []
+        line_texts = []
+        
+        # Image blocks are not needed, so skip decoding their contents
+        if textpage is not None:
+            text_dict = page.get_text("dict", textpage=textpage)
+        else:
+            text_dict = page.get_text("dict", flags=fitz.TEXTFLAGS_DICT & ~fitz.TEXT_PRESERVE_IMAGES)
+        for block in text_dict["blocks"]:
+            for line in block.get("lines", ()):
+                if not line["spans"]:
+                    continue
+                line_index = len(line_texts)
+                line_texts.append("".join(span["text"] for span in line["spans"]))
+                for span in line["spans"]:
+                    x0, y0, x1, y1 = span["bbox"]
+                    rows.append((page_num, line_index, span["size"], span["flags"],
+                                 len(span["text"]), x0, y0, x1, y1))
+        
+        return cls(np.array(rows, dtype=SPAN_DTYPE), line_texts)
+    
+    @classmethod
+    def concatenate(cls, parts):
+        """Merge per-page features, in the given order, into one store"""
+        arrays = []
+        line_texts = []
+        for part in parts:
+            spans = part.spans.copy()
+            spans["line"] += len(line_texts)
+            arrays.append(spans)
+            line_texts.extend(part.line_texts)
+        
+        if not arrays:
+            return cls()
+        return cls(np.concatenate(arrays), line_texts)
+    
+    def page(self, page_num, new_page_num=None):
+        """Features of a single page, optionally renumbered as another page
+        
+        Args:
+            page_num: 0-based index of the page in these features
+            new_page_num: Page index given to the returned spans (defaults
+                to page_num)
+            
+        Returns:
+            SpanFeatures holding only that page, with line indices from 0
+        """
+        # Spans are stored in page order, so a page is a contiguous slice
+        pages = self.spans["page"]
+        lo, hi = np.searchsorted(pages, page_num, 'left'), np.searchsorted(pages, page_num, 'right')
+        if lo == hi:
+            return SpanFeatures()
+        
+        spans = self.spans[lo:hi].copy()
+        first_line, last_line = spans["line"][0], spans["line"][-1]
+        spans["line"] -= first_line
+        spans["page"] = page_num if new_page_num is None else new_page_num
+        return SpanFeatures(spans, self.line_texts[first_line:last_line + 1])
+    
+    def __len__(self):
+        return len(self.spans)
+
+
+def read_pdf_source(source):
+    """Normalize a PDF source into a file path or an in-memory buffer
+    
+    Args:
+        source: Path, bytes-like object (bytes, bytearray, memoryview),
+            mmap, or binary file-like object
+        
+    Returns:
+        The path as a string, or a bytes-like object holding the PDF. mmaps
+        and BytesIO objects are wrapped in a memoryview instead of copied
+    """
+    if isinstance(source, (str, os.PathLike)):
+        return os.fspath(source)
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return source
+    if isinstance(source, mmap.mmap):
+        return memoryview(source)
+    if isinstance(source, io.BytesIO):
+        return source.getbuffer()
+    if hasattr(source, "read"):
+        return source.read()
+    raise TypeError(f"Unsupported PDF source: {type(source).__name__}")
+
+
+def open_document(source):
+    """Open a PDF from a path or from memory
+    
+    Args:
+        source: Anything accepted by read_pdf_source, or an open fitz document
+        
+    Returns:
+        fitz document object
+    """
+    if isinstance(source, fitz.Document):
+        return source
+    source = read_pdf_source(source)
+    if isinstance(source, str):
+        return fitz.open(source)
+    try:
+        return fitz.open(stream=source, filetype="pdf")
+    except (TypeError, ValueError):
+        # Older PyMuPDF releases only accept bytes streams
+        return fitz.open(stream=bytes(source), filetype="pdf")
+
+
+# File opened by each page-extraction worker process, and the extraction
+# call it was opened for
+_worker_doc = None
+_worker_call = None
+
+
+def _pool_context():
+    """Start method of the page-extraction pool
+    
+    The processor runs in processes that already have torch, pipeline or
+    service threads, and forking those can deadlock the child, so workers
+    are started from a clean process instead.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+def _extract_page_range(call, source, start, stop, text, layout):
+    """Process-pool worker extracting pages [start, stop) of a document
+    
+    PyMuPDF is not thread-safe, so every worker holds its own document handle.
+    A file is opened once per worker and extraction call, and reused for the
+    other ranges of that call; an in-memory document travels with its task.
+    """
+    global _worker_doc, _worker_call
+    if not isinstance(source, str):
+        doc = open_document(source)
+        try:
+            return PDFProcessor.extract_page_range(doc, start, stop, text, layout)
+        finally:
+            doc.close()
+    
+    if _worker_call != call:
+        if _worker_doc is not None:
+            _worker_doc.close()
+            _worker_doc = None
+        _worker_doc = open_document(source)
+        _worker_call = call
+    return PDFProcessor.extract_page_range(_worker_doc, start, stop, text, layout)
+
 
 class PDFProcessor:
-    def __init__(self):
-        pass
+    def __init__(self, workers=1, min_pages_per_worker=16, ocr_engine=None):
+        """Initialize the PDF processor
+        
+        Args:
+            workers: Number of worker processes used for page extraction.
+                1 keeps extraction in-process; 0 or None uses every CPU
+            min_pages_per_worker: Smallest page range handed to a worker, so
+                short documents are not split across processes
+            ocr_engine: Optional OCREngine for scanned pages; by default one
+                running up to `workers` pages concurrently is created
+        """
+        self.workers = workers if workers and workers > 0 else (os.cpu_count() or 1)
+        self.min_pages_per_worker = min_pages_per_worker
+        self.ocr_engine = ocr_engine if ocr_engine is not None else OCREngine(max_workers=self.workers)
+        
+        # Page-extraction pool, started on first use and kept until close()
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._calls = count()
+    
+    def _worker_pool(self):
+        """The page-extraction process pool, started on first use"""
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=_pool_context())
+            return self._pool
+    
+    def close(self):
+        """Shut down the page-extraction worker processes, if they were started"""
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
     
     def extract_headings(self, pdf_path):
-        """Enhanced heading extraction using multiple features"""
-        doc = fitz.open(pdf_path)
+        """Enhanced heading extraction using multiple features
+        
+        Args:
+            pdf_path: Path to the PDF file, the PDF in memory (bytes, mmap or
+                file-like object), an already opened fitz document, or a
+                ParsedDocument whose cached span features should be reused
+        """
+        document = pdf_path if isinstance(pdf_path, ParsedDocument) else None
+        if document is not None:
+            doc = document.doc
+        else:
+            doc = open_document(pdf_path)
         
         # First try to extract the built-in outline/table of contents
         outline = self.extract_pdf_outline(doc)
         if outline and len(outline) > 0:
             return outline
         
-        # If no built-in outline, use heuristic methods
-        # Check if it's a scanned PDF
-        if self.is_scanned_pdf(doc):
+        # If no built-in outline, use heuristic methods. Font heuristics cover
+        # pages with a text layer, and only image-only pages are sent to OCR
+        features = page_texts = None
+        if document is not None:
+            # Span features come from the same pass that fills the page texts
+            features = document.span_features
+            page_texts = document.page_texts
+        
+        ocr_pages = self.find_image_only_pages(doc, page_texts)
+        if len(ocr_pages) == len(doc):
             return self.extract_headings_from_scanned_pdf(doc)
-        else:
-            return self.extract_headings_improved(doc)
+        
+        headings = self.extract_headings_improved(doc, features)
+        if ocr_pages:
+            headings += self.extract_headings_from_scanned_pdf(doc, ocr_pages)
+            headings.sort(key=lambda h: h["page"])  # Stable, keeps in-page order
+        return headings
+    
+    def iter_page_headings(self, doc):
+        """Stream headings page by page with memory bounded by a single page
+        
+        Gives the same headings as extract_headings, but never holds more
+        than one page's text or span features. Font heuristics need document
+        statistics, so a first pass only gathers the mean and the distinct
+        font sizes (and finds image-only pages); the second pass classifies
+        each page as it goes. OCR of image-only pages runs ahead in the
+        OCR engine's worker pool.
+        
+        Args:
+            doc: The fitz document object
+            
+        Yields:
+            Tuples of (page_num, page_text, headings on that page)
+        """
+        outline = self.extract_pdf_outline(doc)
+        if outline:
+            outline_pages = {}
+            for heading in outline:
+                page_num = min(max(heading["page"] - 1, 0), len(doc) - 1)
+                outline_pages.setdefault(page_num, []).append(heading)
+            for page_num in range(len(doc)):
+                yield page_num, doc[page_num].get_text(), outline_pages.get(page_num, [])
+            return
+        
+        # First pass: font statistics and pages without a usable text layer
+        size_sum = 0.0
+        size_count = 0
+        distinct_sizes = set()
+        ocr_pages = []
+        small_xrefs = set()
+        for page_num in range(len(doc)):
+            page = doc[page_num]
+            textpage = page.get_textpage(flags=fitz.TEXTFLAGS_TEXT)
+            sizes = SpanFeatures.from_page(page, page_num, textpage=textpage).spans["size"]
+            size_sum += float(sizes.sum())
+            size_count += len(sizes)
+            distinct_sizes.update(np.unique(sizes).tolist())
+            
+            if (self._image_coverage(page, small_xrefs) >= MIN_SCANNED_IMAGE_COVERAGE and
+                    len(page.get_text(textpage=textpage).strip()) < MIN_TEXT_LAYER_CHARS):
+                ocr_pages.append(page_num)
+        
+        mean_size = size_sum / size_count if size_count else None
+        distinct_sizes = np.array(sorted(distinct_sizes), dtype=np.float64)
+        ocr_results = self.ocr_engine.iter_pages(doc, ocr_pages) if ocr_pages else iter(())
+        ocr_pages = set(ocr_pages)
+        
+        # Second pass: classify and yield one page at a time
+        for page_num in range(len(doc)):
+            page = doc[page_num]
+            textpage = page.get_textpage(flags=fitz.TEXTFLAGS_TEXT)
+            page_text = page.get_text(textpage=textpage)
+            
+            if page_num in ocr_pages:
+                # OCR results arrive in page order, so this is the current page
+                _, ocr_data = next(ocr_results)
+                page_headings = self.classify_ocr_headings(ocr_data, page_num) if ocr_data else []
+            else:
+                features = SpanFeatures.from_page(page, page_num, textpage=textpage)
+                page_headings = self.classify_headings(features, mean_size, distinct_sizes)
+            
+            yield page_num, page_text, page_headings
     
     def extract_pdf_outline(self, doc):
         """Extract the built-in outline/table of contents from the PDF
@@ -56,150 +387,680 @@ class PDFProcessor:
             print(f"Error extracting PDF outline: {e}")
             return []
     
-    def extract_headings_improved(self, doc):
-        """Extract headings using font attributes and positional information"""
-        headings = []
+    def extract_headings_improved(self, doc, features=None):
+        """Extract headings using font attributes and positional information
         
-        # Track document statistics for adaptive thresholding
-        font_sizes = []
-        font_weights = []
+        Args:
+            doc: The fitz document object
+            features: Optional SpanFeatures already collected for the document
+        """
+        # Single pass over the pages, collecting span features column-wise
+        if features is None:
+            features = self.extract_span_features(doc)
         
-        # First pass: collect statistics
-        for page_num in range(len(doc)):
-            page = doc[page_num]
-            blocks = page.get_text("dict")["blocks"]
-            
-            for block in blocks:
-                if "lines" in block:
-                    for line in block["lines"]:
-                        for span in line["spans"]:
-                            font_sizes.append(span["size"])
-                            font_weights.append(span["flags"] & 2)  # Check bold flag
-        
-        # Calculate adaptive thresholds
-        if font_sizes:
-            mean_size = sum(font_sizes) / len(font_sizes)
-            size_threshold = mean_size * 1.2  # 20% larger than average
-        else:
-            size_threshold = 12  # Default fallback
+        # Thresholds, levels and heading flags are then computed in one step
+        return self.classify_headings(features)
+    
+    def extract_span_features(self, doc):
+        """Collect span features for every page of the document
         
-        # Second pass: extract headings using multiple features
-        for page_num in range(len(doc)):
-            page = doc[page_num]
-            blocks = page.get_text("dict")["blocks"]
-            
-            for block in blocks:
-                if "lines" in block:
-                    for line in block["lines"]:
-                        line_text = ""
-                        is_heading = False
-                        line_size = 0
-                        is_bold = False
-                        
-                        # Analyze spans in the line
-                        for span in line["spans"]:
-                            line_text += span["text"]
-                            line_size = max(line_size, span["size"])
-                            if span["flags"] & 2:  # Check bold flag
-                                is_bold = True
-                        
-                        # Apply multiple criteria for heading detection
-                        if (line_size > size_threshold or 
-                            (is_bold and line_size > mean_size) or
-                            (len(line_text.strip()) < 100 and line_text.strip().endswith(":")) or
-                            any(line_text.strip().startswith(p) for p in ["Chapter", "Section", "Part"])):
-                            
-                            # Additional validation: avoid false positives
-                            if not any(line_text.strip().startswith(p) for p in ["http", "www", "Figure", "Table"]):
-                                headings.append({
-                                    "text": line_text.strip(),
-                                    "page": page_num + 1,
-                                    "size": line_size,
-                                    "bold": is_bold,
-                                    "level": self.determine_heading_level(line_size, is_bold, font_sizes)
-                                })
+        Args:
+            doc: The fitz document object
+            
+        Returns:
+            SpanFeatures covering all pages in page order
+        """
+        return self.extract_pages(doc, text=False, layout=True)[1]
+    
+    def extract_pages(self, doc, text=True, layout=False, source=None):
+        """Extract page texts and/or span features in a single pass per page
         
-        return headings
+        Page ranges are spread over the processor's worker pool when it was
+        created with more than one worker and the document is long enough;
+        results are merged back in page order either way.
+        
+        Args:
+            doc: The fitz document object
+            text: Whether to extract the plain text of every page
+            layout: Whether to collect span features for heading detection
+            source: Path or in-memory buffer the workers open the document
+                from (defaults to the file doc was opened from)
+            
+        Returns:
+            Tuple of (page_texts or None, SpanFeatures or None)
+        """
+        if source is None:
+            source = doc.name
+        ranges = self._page_ranges(doc, source)
+        if len(ranges) <= 1:
+            return self.extract_page_range(doc, 0, len(doc), text, layout)
+        
+        # Workers open a file once per call and then extract several ranges;
+        # in-memory documents are sent with every range as bytes
+        if not isinstance(source, str):
+            source = bytes(source)
+        starts, stops = zip(*ranges)
+        pool = self._worker_pool()
+        try:
+            results = list(pool.map(
+                _extract_page_range, repeat(next(self._calls)), repeat(source), starts, stops,
+                repeat(text), repeat(layout)
+            ))
+        except BrokenProcessPool:
+            self.close()  # The next call starts a fresh pool
+            raise
+        
+        page_texts = [t for chunk_texts, _ in results for t in chunk_texts] if text else None
+        features = SpanFeatures.concatenate([f for _, f in results]) if layout else None
+        return page_texts, features
     
-    def determine_heading_level(self, size, is_bold, font_sizes):
-        """Determine heading level based on font size and style"""
-        # Sort font sizes in descending order
-        sorted_sizes = sorted(set(font_sizes), reverse=True)
-        
-        # Determine level based on font size ranking
-        if size in sorted_sizes:
-            level = sorted_sizes.index(size) + 1
-            # Adjust level if bold (might be one level higher in hierarchy)
-            if is_bold and level > 1:
-                level -= 1
-            return min(level, 6)  # Cap at h6
-        return 6  # Default to lowest heading level
-    
-    def is_scanned_pdf(self, doc):
-        """Detect if PDF is likely scanned by checking image to text ratio"""
-        image_area = 0
-        page_area = 0
+    def _page_ranges(self, doc, source):
+        """Split the document into contiguous page ranges for the worker pool"""
+        page_count = len(doc)
+        # Workers re-open the document from its source, which locked documents
+        # (and in-memory ones opened without their buffer) cannot do
+        if self.workers <= 1 or not source or doc.needs_pass:
+            return [(0, page_count)]
         
-        for page_num in range(len(doc)):
-            page = doc[page_num]
-            page_area += page.rect.width * page.rect.height
+        # A few ranges per worker keeps the pool busy when pages vary in cost;
+        # in-memory documents get one range per worker, as every range
+        # carries a copy of the buffer
+        ranges_per_worker = 4 if isinstance(source, str) else 1
+        range_size = max(self.min_pages_per_worker, -(-page_count // (self.workers * ranges_per_worker)))
+        return [(start, min(start + range_size, page_count))
+                for start in range(0, page_count, range_size)]
+    
+    def update_pages(self, doc, fingerprints, previous_fingerprints, previous_texts,
+                     previous_features=None):
+        """Extract only the pages that changed since a previous version
+        
+        Pages are matched to the previous version by fingerprint rather than
+        by position, so inserted or removed pages do not invalidate the pages
+        after them.
+        
+        Args:
+            doc: The fitz document object of the new version
+            fingerprints: Page fingerprints of doc (see page_fingerprints)
+            previous_fingerprints: Page fingerprints of the previous version
+            previous_texts: Page texts of the previous version
+            previous_features: Optional SpanFeatures of the previous version;
+                when given, span features are returned for the new version too
             
-            for img in page.get_images(full=True):
-                xref = img[0]
-                image = doc.extract_image(xref)
-                image_area += image["width"] * image["height"]
+        Returns:
+            Tuple of (page_texts, SpanFeatures or None, changed page numbers)
+        """
+        previous_pages = {}
+        for page_num, fingerprint in enumerate(previous_fingerprints):
+            previous_pages.setdefault(fingerprint, page_num)
         
-        # If images cover more than 80% of the document, likely scanned
-        return image_area / page_area > 0.8 if page_area else False
+        layout = previous_features is not None
+        page_texts = []
+        parts = [] if layout else None
+        changed_pages = []
+        for page_num, fingerprint in enumerate(fingerprints):
+            previous = previous_pages.get(fingerprint)
+            if previous is None:
+                texts, features = self.extract_page_range(doc, page_num, page_num + 1, True, layout)
+                page_texts.append(texts[0])
+                changed_pages.append(page_num)
+            else:
+                page_texts.append(previous_texts[previous])
+                features = previous_features.page(previous, page_num) if layout else None
+            if layout:
+                parts.append(features)
+        
+        return page_texts, (SpanFeatures.concatenate(parts) if layout else None), changed_pages
     
-    def extract_headings_from_scanned_pdf(self, doc):
-        """Extract headings from scanned PDF using OCR"""
+    def page_fingerprints(self, doc):
+        """Content fingerprint of every page, to detect pages changed between versions
+        
+        A fingerprint covers the page geometry, its content stream, the fonts
+        it uses, and the raw streams of its images and form XObjects. Object
+        numbers are left out, so rewriting the file does not alter unchanged
+        pages.
+        
+        Args:
+            doc: The fitz document object
+            
+        Returns:
+            List of hex digests, one per page
+        """
+        stream_digests = {}  # Shared images are hashed once per document
+        
+        def stream_digest(xref):
+            if xref not in stream_digests:
+                stream_digests[xref] = hashlib.blake2b(doc.xref_stream_raw(xref) or b"", digest_size=16).digest()
+            return stream_digests[xref]
+        
+        fingerprints = []
+        for page in doc:
+            digest = hashlib.blake2b(digest_size=16)
+            digest.update(repr((tuple(page.rect), page.rotation)).encode('utf-8'))
+            digest.update(page.read_contents())
+            # Fonts are listed in object order, which a rewrite may shuffle
+            digest.update(repr(sorted(font[1:6] for font in page.get_fonts())).encode('utf-8'))
+            for image in page.get_images(full=True):
+                digest.update(stream_digest(image[0]))
+                if image[1]:  # Soft mask
+                    digest.update(stream_digest(image[1]))
+            for xobject in page.get_xobjects():
+                digest.update(stream_digest(xobject[0]))
+            fingerprints.append(digest.hexdigest())
+        return fingerprints
+    
+    @staticmethod
+    def extract_page_range(doc, start, stop, text=True, layout=False):
+        """Extract page texts and/or span features for pages [start, stop)
+        
+        A single TextPage is built per page and shared by the plain text and
+        the span features, so each page is only parsed once.
+        
+        Returns:
+            Tuple of (page_texts or None, SpanFeatures or None)
+        """
+        page_texts = [] if text else None
+        parts = [] if layout else None
+        for page_num in range(start, stop):
+            page = doc[page_num]
+            textpage = page.get_textpage(flags=fitz.TEXTFLAGS_TEXT)
+            if text:
+                page_texts.append(page.get_text(textpage=textpage))
+            if layout:
+                parts.append(SpanFeatures.from_page(page, page_num, textpage=textpage))
+        
+        return page_texts, (SpanFeatures.concatenate(parts) if layout else None)
+    
+    def classify_headings(self, features, mean_size=None, distinct_sizes=None):
+        """Classify lines as headings from their span features
+        
+        Args:
+            features: SpanFeatures collected by extract_span_features
+            mean_size: Mean font size of the document; computed from features
+                when omitted (pass it when features cover only part of it)
+            distinct_sizes: Sorted array of distinct document font sizes,
+                computed from features when omitted
+            
+        Returns:
+            List of heading dictionaries in document order
+        """
+        spans = features.spans
+        if len(spans) == 0:
+            return []
+        
+        # Adaptive thresholds from document statistics
+        sizes = spans["size"]
+        if mean_size is None:
+            mean_size = sizes.mean()
+        size_threshold = mean_size * 1.2  # 20% larger than average
+        
+        # Spans are stored line by line, so each line is a contiguous run
+        line_starts = np.flatnonzero(np.r_[True, spans["line"][1:] != spans["line"][:-1]])
+        line_size = np.maximum.reduceat(sizes, line_starts)
+        line_bold = np.logical_or.reduceat((spans["flags"] & 2) != 0, line_starts)  # Check bold flag
+        line_page = spans["page"][line_starts]
+        
+        # Level from the rank of the line size among distinct document sizes
+        # (largest size is level 1, bold lines move one level up, capped at h6)
+        if distinct_sizes is None:
+            distinct_sizes = np.unique(sizes)
+        levels = len(distinct_sizes) - np.searchsorted(distinct_sizes, line_size)
+        levels = np.where(line_bold & (levels > 1), levels - 1, levels)
+        levels = np.minimum(levels, 6)
+        
+        # Text-pattern criteria are evaluated once per line
+        texts = [text.strip() for text in features.line_texts]
+        has_pattern = np.fromiter(
+            ((len(text) < 100 and text.endswith(":")) or text.startswith(HEADING_PREFIXES)
+             for text in texts),
+            dtype=bool, count=len(texts)
+        )
+        
+        # Apply multiple criteria for heading detection
+        is_heading = (
+            (line_size > size_threshold) |
+            (line_bold & (line_size > mean_size)) |
+            has_pattern
+        )
+        
         headings = []
+        for i in np.flatnonzero(is_heading):
+            # Additional validation: avoid false positives
+            if texts[i].startswith(NON_HEADING_PREFIXES):
+                continue
+            headings.append({
+                "text": texts[i],
+                "page": int(line_page[i]) + 1,
+                "size": float(line_size[i]),
+                "bold": bool(line_bold[i]),
+                "level": int(levels[i])
+            })
         
+        return headings
+    
+    def find_image_only_pages(self, doc, page_texts=None):
+        """Find pages without a usable text layer, which need OCR
+        
+        A page needs OCR when images cover most of it and it carries (almost)
+        no extractable text, so born-digital pages and scans that already
+        have a text layer are left to the font heuristics.
+        
+        Args:
+            doc: The fitz document object
+            page_texts: Optional plain text of every page, if already extracted
+            
+        Returns:
+            Sorted list of 0-based page indices
+        """
+        ocr_pages = []
+        small_xrefs = set()
         for page_num in range(len(doc)):
             page = doc[page_num]
-            pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))  # Higher resolution for OCR
-            img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
             
-            # Convert to numpy array for OpenCV processing
-            img_np = np.array(img)
+            # Image placement is cheap to check, so it rules pages out first
+            if self._image_coverage(page, small_xrefs) < MIN_SCANNED_IMAGE_COVERAGE:
+                continue
             
-            # Enhance image for better OCR
-            img_gray = cv2.cvtColor(img_np, cv2.COLOR_RGB2GRAY)
-            img_gray = cv2.adaptiveThreshold(
-                img_gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2
-            )
+            if page_texts is not None:
+                text = page_texts[page_num]
+            elif page.get_fonts():
+                text = page.get_text()
+            else:
+                text = ""  # No fonts, so no text layer at all
             
-            # OCR with layout analysis
-            custom_config = r'--oem 3 --psm 3'  # Page segmentation mode 3: fully automatic page segmentation
-            ocr_data = pytesseract.image_to_data(img_gray, config=custom_config, output_type=pytesseract.Output.DICT)
+            if len(text.strip()) < MIN_TEXT_LAYER_CHARS:
+                ocr_pages.append(page_num)
+        
+        return ocr_pages
+    
+    def _image_coverage(self, page, small_xrefs=None):
+        """Fraction of the page area covered by placed images (capped at 1)
+        
+        Args:
+            page: The fitz page object
+            small_xrefs: Optional set of image xrefs already known to be too
+                small to matter, shared across pages and extended in place
+        """
+        page_rect = page.rect
+        page_area = page_rect.width * page_rect.height
+        if not page_area:
+            return 0.0
+        if small_xrefs is None:
+            small_xrefs = set()
+        
+        covered = 0.0
+        for item in page.get_images(full=True):
+            xref, width, height = item[0], item[2], item[3]
+            if xref in small_xrefs:
+                continue
+            # Pixel dimensions come from the image dictionary, so icons and
+            # logos are skipped without looking at their placement
+            if width * height < MIN_SCANNED_IMAGE_PIXELS:
+                small_xrefs.add(xref)
+                continue
+            
+            # Placement rectangle from the content stream; the image is not decoded
+            bbox = page.get_image_bbox(item) & page_rect
+            if not bbox.is_empty:
+                covered += bbox.width * bbox.height
+        
+        return min(covered / page_area, 1.0)
+    
+    def is_scanned_pdf(self, doc, max_sample_pages=SCANNED_SAMPLE_PAGES):
+        """Detect if PDF is likely scanned by checking image to page area ratio
+        
+        Only image metadata and placement rectangles are read, never the image
+        streams. Very long documents are judged on an evenly spaced sample of
+        pages, and the scan stops as soon as the remaining pages can no longer
+        change the answer.
+        
+        Args:
+            doc: The fitz document object
+            max_sample_pages: Maximum number of pages inspected
+        """
+        page_count = len(doc)
+        if page_count > max_sample_pages:
+            page_numbers = np.unique(np.linspace(0, page_count - 1, max_sample_pages).astype(int))
+        else:
+            page_numbers = range(page_count)
+        
+        pages = [doc[int(page_num)] for page_num in page_numbers]
+        page_areas = [page.rect.width * page.rect.height for page in pages]
+        total_area = sum(page_areas)
+        if not total_area:
+            return False
+        
+        # If images cover more than 80% of the document, likely scanned
+        threshold = 0.8 * total_area
+        image_area = 0.0
+        remaining_area = total_area
+        small_xrefs = set()
+        for page, page_area in zip(pages, page_areas):
+            image_area += self._image_coverage(page, small_xrefs) * page_area
+            remaining_area -= page_area
+            
+            if image_area > threshold:
+                return True  # Already above the threshold
+            if image_area + remaining_area <= threshold:
+                return False  # Cannot reach it even if every other page is an image
+        
+        return image_area > threshold
+    
+    def extract_headings_from_scanned_pdf(self, doc, page_numbers=None):
+        """Extract headings from scanned PDF using OCR
+        
+        Args:
+            doc: The fitz document object
+            page_numbers: Optional 0-based indices of the pages to OCR (all by default)
+        """
+        headings = []
+        
+        # Pages are OCR'd concurrently by the engine and streamed back in order
+        for page_num, ocr_data in self.ocr_engine.iter_pages(doc, page_numbers):
+            if ocr_data is None:
+                continue  # Page failed or timed out
             
             # Process OCR results to identify potential headings
-            for i in range(len(ocr_data['text'])):
-                text = ocr_data['text'][i].strip()
-                if text and ocr_data['conf'][i] > 70:  # Confidence threshold
-                    # Heading heuristics for OCR: shorter lines with larger font
-                    if (len(text) < 100 and ocr_data['height'][i] > 1.3 * np.mean(ocr_data['height'])):
-                        headings.append({
-                            "text": text,
-                            "page": page_num + 1,
-                            "confidence": ocr_data['conf'][i],
-                            "level": self.estimate_heading_level_from_ocr(ocr_data, i)
-                        })
+            headings.extend(self.classify_ocr_headings(ocr_data, page_num))
         
         return headings
     
-    def estimate_heading_level_from_ocr(self, ocr_data, index):
-        """Estimate heading level from OCR data"""
-        # Get height of current text element
-        height = ocr_data['height'][index]
+    def classify_ocr_headings(self, ocr_data, page_num):
+        """Identify heading lines in the OCR output of a single page
+        
+        The per-word OCR data is converted to arrays once; confident words are
+        grouped into lines by block/paragraph/line number, and the height
+        threshold and level ranking are applied to whole lines.
+        
+        Args:
+            ocr_data: Per-word OCR data in pytesseract's Output.DICT format
+            page_num: 0-based index of the page
+            
+        Returns:
+            List of heading dictionaries in reading order
+        """
+        heights = np.asarray(ocr_data['height'], dtype=float)
+        if len(heights) == 0:
+            return []
+        conf = np.asarray(ocr_data['conf'], dtype=float)
+        texts = [str(text).strip() for text in ocr_data['text']]
+        
+        # Confidence threshold, on non-empty words only
+        has_text = np.fromiter((bool(text) for text in texts), dtype=bool, count=len(texts))
+        words = np.flatnonzero(has_text & (conf > 70))
+        if len(words) == 0:
+            return []
+        
+        # Words arrive in reading order, so each line is a contiguous run
+        line_keys = np.stack([
+            np.asarray(ocr_data[key])[words] for key in ('block_num', 'par_num', 'line_num')
+        ])
+        line_starts = np.flatnonzero(np.r_[True, (line_keys[:, 1:] != line_keys[:, :-1]).any(axis=0)])
+        word_counts = np.diff(np.r_[line_starts, len(words)])
+        line_heights = np.add.reduceat(heights[words], line_starts) / word_counts
+        line_conf = np.add.reduceat(conf[words], line_starts) / word_counts
+        
+        # Heading heuristics for OCR: shorter lines with larger font
+        height_threshold = 1.3 * heights.mean()
+        candidates = np.flatnonzero(line_heights > height_threshold)
+        
+        # Level from the rank of the line height among all element heights
+        sorted_heights = np.sort(heights[heights > 0])
+        taller_counts = len(sorted_heights) - np.searchsorted(sorted_heights, line_heights, side='right')
+        levels = np.minimum(taller_counts + 1, 6)  # Cap at h6
+        
+        headings = []
+        for line in candidates:
+            start = line_starts[line]
+            text = " ".join(texts[i] for i in words[start:start + word_counts[line]])
+            if len(text) >= 100:
+                continue
+            headings.append({
+                "text": text,
+                "page": page_num + 1,
+                "confidence": float(line_conf[line]),
+                "level": int(levels[line])
+            })
+        
+        return headings
+
+
+class ParsedDocument:
+    """Parse-once session over a single PDF
+    
+    The file is opened a single time and headings, page texts, metadata and
+    properties are parsed lazily on first access, then reused by every
+    SmartPDFInsights method that receives this session. With a DocumentCache
+    the results also outlive the session, so a file is parsed once across runs,
+    and a new version of a file only has its changed pages extracted again.
+    
+    Once the full text is built, the pages live in a single buffer (content)
+    indexed by character offsets (page_offsets) instead of separate strings.
+    """
+    
+    def __init__(self, pdf_path, processor=None, cache=None, name=None):
+        """Prepare the session without parsing anything yet
+        
+        Args:
+            pdf_path: Path to the PDF file, or the PDF in memory (bytes,
+                bytearray, memoryview, mmap or binary file-like object); an
+                in-memory PDF is opened straight from its buffer
+            processor: Optional PDFProcessor used for heading extraction
+            cache: Optional DocumentCache; a document parsed before is restored
+                from it and the file itself is only opened if still needed
+            name: Display name of an in-memory PDF (defaults to the file-like
+                object's name, or "<memory>")
+        """
+        if name is None and not isinstance(pdf_path, (str, os.PathLike)):
+            name = getattr(pdf_path, "name", None)
+            name = name if isinstance(name, str) else "<memory>"
+        
+        self.source = read_pdf_source(pdf_path)
+        self.in_memory = not isinstance(self.source, str)
+        self.pdf_path = name if self.in_memory else self.source
+        self.processor = processor if processor is not None else PDFProcessor()
+        self.cache = cache
+        self._doc = None
+        
+        self._headings = None
+        self._page_texts = None
+        self._span_features = None
+        self._content = None
+        self._page_offsets = None
+        self._properties = None
+        self._fingerprints = None
+        self._previous_state = None
+        
+        # 0-based pages extracted again because they differ from the previous
+        # version of the file (None unless the session updated a previous version)
+        self.changed_pages = None
+        
+        # Derived results stored by SmartPDFInsights and persisted in the cache
+        self.structure = None
+        self.section_spans = None
+        self._unsaved = False
+        
+        self._cache_key = None
+        self._cached_state = None
+        if cache is not None:
+            self._cache_key = cache.key(self.source)
+            self._cached_state = cache.load(self._cache_key)
+            if self._cached_state is not None:
+                self._restore(self._cached_state)
+            elif not self.in_memory:
+                # Pages unchanged since the last version of this file are reused
+                self._previous_state = cache.previous(self.source)
+    
+    @property
+    def cache_key(self):
+        """Document cache key (hash of the PDF bytes), or None without a cache"""
+        return self._cache_key
+    
+    @property
+    def doc(self):
+        """The fitz document, opened on first use"""
+        if self._doc is None:
+            self._doc = open_document(self.source)
+        return self._doc
+    
+    @property
+    def page_count(self):
+        """Number of pages in the document"""
+        if self._properties is not None:
+            return self._properties["page_count"]
+        return len(self.doc)
+    
+    @property
+    def headings(self):
+        """Headings from the built-in outline, or from heuristics/OCR if none"""
+        if self._headings is None:
+            self._headings = self.processor.extract_headings(self)
+        return self._headings
+    
+    @property
+    def page_texts(self):
+        """Plain text of every page, in page order"""
+        if self._content is not None:
+            # Pages are sliced back out of the shared buffer on demand
+            return [self.page_text(page_num) for page_num in range(len(self._page_offsets) - 1)]
+        if self._page_texts is None and self._previous_state is not None:
+            self._update_previous()
+        if self._page_texts is None:
+            self._page_texts, _ = self.processor.extract_pages(self.doc, source=self.source)
+        return self._page_texts
+    
+    def page_text(self, page_num):
+        """Plain text of a single page (0-based index)"""
+        if self._content is None:
+            return self.page_texts[page_num]
+        # Each page is followed by a two-character blank-line separator
+        return self._content[self._page_offsets[page_num]:self._page_offsets[page_num + 1] - 2]
+    
+    @property
+    def span_features(self):
+        """Span features of every page, collected together with the page texts"""
+        if self._span_features is None and self._previous_state is not None:
+            self._update_previous()
+        if self._span_features is None:
+            need_text = self._page_texts is None and self._content is None
+            page_texts, self._span_features = self.processor.extract_pages(
+                self.doc, text=need_text, layout=True, source=self.source
+            )
+            if need_text:
+                self._page_texts = page_texts
+        return self._span_features
+    
+    @property
+    def content(self):
+        """Full document text with pages separated by blank lines"""
+        if self._content is None:
+            page_texts = self.page_texts
+            offsets = np.zeros(len(page_texts) + 1, dtype=np.int64)
+            if page_texts:  # A document without pages has only the end offset
+                np.cumsum([len(text) + 2 for text in page_texts], out=offsets[1:])
+            
+            self._content = "".join(text + "\n\n" for text in page_texts)
+            self._page_offsets = offsets
+            self._page_texts = None  # The buffer now holds the only copy
+        return self._content
+    
+    @property
+    def page_offsets(self):
+        """Character offset of every page start in content, plus the end offset"""
+        if self._page_offsets is None:
+            self.content
+        return self._page_offsets
+    
+    @property
+    def metadata(self):
+        """Document metadata dictionary (title, author, ...)"""
+        return self.properties["metadata"]
+    
+    @property
+    def properties(self):
+        """Document-level properties reported alongside the extraction results"""
+        if self._properties is None:
+            self._properties = {
+                "page_count": len(self.doc),
+                "metadata": self.doc.metadata,
+                "is_encrypted": self.doc.is_encrypted,
+                "permissions": self.doc.permissions
+            }
+        return self._properties
+    
+    @property
+    def page_fingerprints(self):
+        """Content fingerprint of every page (see PDFProcessor.page_fingerprints)"""
+        if self._fingerprints is None:
+            self._fingerprints = self.processor.page_fingerprints(self.doc)
+        return self._fingerprints
+    
+    def _update_previous(self):
+        """Fill page texts (and span features) from the previous version of the file"""
+        previous = self._previous_state
+        self._previous_state = None
+        if not previous.get("fingerprints"):
+            return
         
-        # Get all heights and sort them
-        all_heights = [h for h in ocr_data['height'] if h > 0]
-        all_heights.sort(reverse=True)
+        offsets = previous["page_offsets"]
+        previous_texts = [previous["content"][offsets[i]:offsets[i + 1] - 2] for i in range(len(offsets) - 1)]
+        self._page_texts, self._span_features, self.changed_pages = self.processor.update_pages(
+            self.doc, self.page_fingerprints, previous["fingerprints"], previous_texts,
+            previous.get("span_features")
+        )
+    
+    def _restore(self, state):
+        """Adopt parse results loaded from the document cache"""
+        self._headings = state["headings"]
+        self._properties = state["properties"]
+        self._content = state["content"]
+        self._page_offsets = state["page_offsets"]
+        self._fingerprints = state.get("fingerprints")
+        self._span_features = state.get("span_features")
+        self.structure = state.get("structure")
+        self.section_spans = state.get("sections")
+    
+    def mark_unsaved(self):
+        """Record derived results that save() (or close()) should persist"""
+        self._unsaved = True
+    
+    def save(self):
+        """Persist the parse results in the document cache, if there is one
         
-        # Determine level based on height ranking
-        if height in all_heights:
-            level = all_heights.index(height) + 1
-            return min(level, 6)  # Cap at h6
-        return 6  # Default to lowest heading level
\ No newline at end of file
+        Nothing is written when the cache already holds everything parsed so
+        far, so repeated runs over a cached document do not rewrite it.
+        """
+        self._unsaved = False
+        if self.cache is None:
+            return
+        state = {
+            "headings": self.headings,
+            "structure": self.structure,
+            "properties": self.properties,
+            "sections": self.section_spans,
+            "content": self.content,
+            "page_offsets": self.page_offsets,
+            # Fingerprints only serve later versions of a file at the same path
+            "fingerprints": None if self.in_memory else self.page_fingerprints,
+            # Span features are only kept when heading heuristics needed them
+            "span_features": self._span_features
+        }
+        cached = self._cached_state
+        if cached is not None and all(cached.get(name) is not None or state[name] is None
+                                      for name in ("structure", "sections")):
+            return
+        self.cache.save(self._cache_key, state, pdf_path=None if self.in_memory else self.source)
+        self._cached_state = state
+    
+    def close(self):
+        """Persist results marked unsaved and release the document handle"""
+        if self._unsaved:
+            self.save()
+        if self._doc is not None:
+            self._doc.close()
+            self._doc = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,392 @@
+import json
+import time
+import queue
+import argparse
+import threading
+from typing import Any, Callable, Dict, Iterable, Iterator, List
+
+from smart_pdf_insights import SmartPDFInsights
+from batch_runner import find_pdfs, create_system
+
+# Marks the end of a stage's input
+_DONE = object()
+
+
+class _Item:
+    """Envelope carrying one input through the pipeline"""
+
+    __slots__ = ("index", "value", "error")
+
+    def __init__(self, index: int, value: Any):
+        self.index = index
+        self.value = value
+        self.error = None  # (stage name, message) once a stage failed
+
+
+class Stage:
+    """A named pipeline step with its own number of worker threads"""
+
+    def __init__(self, name: str, func: Callable[[Any], Any], concurrency: int = 1):
+        """Define a stage
+
+        Args:
+            name: Stage name used in metrics
+            func: Function applied to every item; its return value is passed
+                to the next stage
+            concurrency: Number of threads running func concurrently
+        """
+        self.name = name
+        self.func = func
+        self.concurrency = max(1, concurrency)
+
+
+class StageMetrics:
+    """Counters and input-queue depth samples of one stage"""
+
+    def __init__(self, name: str, concurrency: int, queue_size: int):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.items = 0
+        self.errors = 0
+        self.busy_seconds = 0.0     # Time spent inside the stage function
+        self.blocked_seconds = 0.0  # Time waiting for room in the next queue
+        self.depth_samples = 0
+        self.depth_total = 0
+        self.max_depth = 0
+        self.running = concurrency  # Workers that have not seen the end of input
+        self.lock = threading.Lock()
+
+    def record(self, busy: float, blocked: float, failed: bool):
+        """Account for one processed item"""
+        with self.lock:
+            self.items += 1
+            self.errors += failed
+            self.busy_seconds += busy
+            self.blocked_seconds += blocked
+
+    def sample(self, depth: int):
+        """Record the current depth of the stage's input queue"""
+        self.depth_samples += 1
+        self.depth_total += depth
+        self.max_depth = max(self.max_depth, depth)
+
+    def as_dict(self, wall_seconds: float) -> Dict:
+        """Metrics as a dictionary, with utilization relative to wall_seconds"""
+        capacity = wall_seconds * self.concurrency
+        return {
+            "stage": self.name,
+            "concurrency": self.concurrency,
+            "items": self.items,
+            "errors": self.errors,
+            "busy_seconds": self.busy_seconds,
+            "blocked_seconds": self.blocked_seconds,
+            "utilization": self.busy_seconds / capacity if capacity > 0 else 0.0,
+            "mean_queue_depth": self.depth_total / self.depth_samples if self.depth_samples else 0.0,
+            "max_queue_depth": self.max_depth,
+            "queue_size": self.queue_size
+        }
+
+
+class PipelineExecutor:
+    """Run items through a chain of stages connected by bounded queues
+
+    Every stage has its own input queue and pool of worker threads, so
+    different items are in different stages at the same time: while one
+    document is being summarized the next can already be parsed and indexed.
+    Queues are bounded, so a slow stage applies backpressure instead of
+    letting finished work pile up in memory. A monitor thread samples every
+    queue's depth; the stage whose workers stay busy while its input queue
+    stays full is the bottleneck.
+
+    PyTorch releases the GIL during inference, so stage threads overlap real
+    work. Stage functions must be safe to call from several threads when the
+    stage concurrency is above one.
+    """
+
+    def __init__(self, stages: List[Stage], queue_size: int = 4, sample_interval: float = 0.05):
+        """Initialize the executor
+
+        Args:
+            stages: Stages in pipeline order
+            queue_size: Capacity of the queue in front of every stage
+            sample_interval: Seconds between queue-depth samples
+        """
+        self.stages = stages
+        self.queue_size = max(1, queue_size)
+        self.sample_interval = sample_interval
+        self.metrics = []
+        self.wall_seconds = 0.0
+
+    def run(self, items: Iterable[Any]) -> Iterator[Dict]:
+        """Run every item through all stages
+
+        Args:
+            items: Pipeline inputs; consumed lazily as the first queue drains
+
+        Yields:
+            Dictionaries with the input's position ("index") and either the
+            last stage's result ("result") or the first failure ("error" and
+            the failing "stage"), in completion order; if the input iterable
+            raises, its error ends the run as a failure of stage "input"
+        """
+        self.metrics = [StageMetrics(stage.name, stage.concurrency, self.queue_size)
+                        for stage in self.stages]
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        output = queue.Queue()
+        stop = threading.Event()
+        start = time.perf_counter()
+
+        threads = [threading.Thread(target=self._feed, args=(items, queues[0]), daemon=True)]
+        for position, stage in enumerate(self.stages):
+            next_queue = queues[position + 1] if position + 1 < len(self.stages) else output
+            for _ in range(stage.concurrency):
+                threads.append(threading.Thread(
+                    target=self._work, daemon=True,
+                    args=(stage, self.metrics[position], queues[position], next_queue)
+                ))
+        threads.append(threading.Thread(target=self._monitor, args=(queues, stop), daemon=True))
+
+        for thread in threads:
+            thread.start()
+
+        try:
+            while True:
+                item = output.get()
+                if item is _DONE:
+                    break
+                if item.error is not None:
+                    stage_name, message = item.error
+                    yield {"index": item.index, "error": message, "stage": stage_name}
+                else:
+                    yield {"index": item.index, "result": item.value}
+        finally:
+            stop.set()
+            self.wall_seconds = time.perf_counter() - start
+
+    @staticmethod
+    def _feed(items: Iterable[Any], first_queue: queue.Queue):
+        """Put the inputs on the first queue, then mark its end
+
+        An input iterable that raises ends the input early: the error is
+        passed through the stages as a failed item of the "input" stage, and
+        the end marker is always posted so that run() finishes.
+        """
+        index = 0
+        try:
+            for value in items:
+                first_queue.put(_Item(index, value))
+                index += 1
+        except Exception as e:
+            item = _Item(index, None)
+            item.error = ("input", str(e))
+            first_queue.put(item)
+        finally:
+            first_queue.put(_DONE)
+
+    @staticmethod
+    def _work(stage: Stage, metrics: StageMetrics, in_queue: queue.Queue, out_queue: queue.Queue):
+        """Worker thread: apply a stage to items until its input ends"""
+        while True:
+            item = in_queue.get()
+            if item is _DONE:
+                # Hand the marker to the next sibling; the last worker to stop
+                # marks the end of the next stage's input
+                in_queue.put(_DONE)
+                with metrics.lock:
+                    metrics.running -= 1
+                    last = metrics.running == 0
+                if last:
+                    out_queue.put(_DONE)
+                return
+
+            busy = 0.0
+            failed = False
+            if item.error is None:  # Failed items only pass through
+                began = time.perf_counter()
+                try:
+                    item.value = stage.func(item.value)
+                except Exception as e:
+                    item.error = (stage.name, str(e))
+                    item.value = None
+                    failed = True
+                busy = time.perf_counter() - began
+
+            began = time.perf_counter()
+            out_queue.put(item)
+            metrics.record(busy, time.perf_counter() - began, failed)
+
+    def _monitor(self, queues: List[queue.Queue], stop: threading.Event):
+        """Sample the depth of every stage's input queue until the run ends"""
+        while not stop.wait(self.sample_interval):
+            for metrics, stage_queue in zip(self.metrics, queues):
+                metrics.sample(stage_queue.qsize())
+
+    def report(self) -> Dict:
+        """Per-stage metrics of the last run, and the stage limiting throughput
+
+        Returns:
+            Dictionary with the wall time, item count, the bottleneck stage
+            (highest utilization, then deepest input queue) and per-stage metrics
+        """
+        stages = [metrics.as_dict(self.wall_seconds) for metrics in self.metrics]
+        bottleneck = None
+        if stages:
+            bottleneck = max(stages, key=lambda stage: (stage["utilization"], stage["mean_queue_depth"]))["stage"]
+        return {
+            "wall_seconds": self.wall_seconds,
+            "items": stages[-1]["items"] if stages else 0,
+            "bottleneck": bottleneck,
+            "stages": stages
+        }
+
+
+class InsightsPipeline:
+    """SmartPDFInsights as an extract -> index -> retrieve -> summarize pipeline
+
+    Each input is a PDF path, answered for the same list of personas. The
+    stages only pass per-document objects (sections, a CorpusIndex, matches)
+    to each other, so several documents can be in flight at once without
+    sharing retriever state.
+
+    PyMuPDF is not thread-safe, so the extract stage always runs a single
+    thread; give the system's PDFProcessor more workers (processes) to
+    parallelise parsing within a document.
+    """
+
+    def __init__(self, system: SmartPDFInsights, personas: List[str], top_k: int = 5,
+                 index_workers: int = 1, retrieve_workers: int = 1, summarize_workers: int = 1,
+                 summary_batch_size: int = 8, queue_size: int = 4):
+        """Initialize the pipeline
+
+        Args:
+            system: SmartPDFInsights instance shared by all stages
+            personas: Personas every document is answered for
+            top_k: Number of sections matched per persona
+            index_workers: Threads building section indexes (embedding)
+            retrieve_workers: Threads scoring personas against indexes
+            summarize_workers: Threads generating summaries
+            summary_batch_size: Number of summaries generated per model call
+            queue_size: Capacity of the queue in front of every stage
+        """
+        self.system = system
+        self.personas = personas
+        self.top_k = top_k
+        self.summary_batch_size = summary_batch_size
+        self.executor = PipelineExecutor([
+            Stage("extract", self._extract, 1),
+            Stage("index", self._index, index_workers),
+            Stage("retrieve", self._retrieve, retrieve_workers),
+            Stage("summarize", self._summarize, summarize_workers)
+        ], queue_size=queue_size)
+
+    def _extract(self, pdf_path: str) -> Dict:
+        with self.system.parse_pdf(pdf_path) as document:
+            sections = self.system.extract_sections(document)
+        return {"pdf": pdf_path, "sections": sections}
+
+    def _index(self, job: Dict) -> Dict:
+        job["index"] = self.system.build_section_index(job["sections"])
+        return job
+
+    def _retrieve(self, job: Dict) -> Dict:
+        job["matched"] = self.system.match_sections_to_personas(
+            job["sections"], self.personas, top_k=self.top_k, index=job.pop("index")
+        )
+        return job
+
+    def _summarize(self, job: Dict) -> Dict:
+        insights = self.system.generate_insights_batch(
+            list(zip(job["matched"], self.personas)), batch_size=self.summary_batch_size
+        )
+        return {
+            "pdf": job["pdf"],
+            "results": [{
+                "persona": persona,
+                "matched_sections": [{
+                    "heading": s["heading"],
+                    "page": s["page"],
+                    "score": s.get("score", 0.0)
+                } for s in matched_sections],
+                "insights": persona_insights
+            } for persona, matched_sections, persona_insights in zip(self.personas, job["matched"], insights)]
+        }
+
+    def run(self, pdf_paths: Iterable[str]) -> Iterator[Dict]:
+        """Answer every PDF for all personas, yielding results as documents finish
+
+        Yields:
+            {"pdf", "results": [{persona, matched_sections, insights}, ...]},
+            or {"pdf", "error", "stage"} for documents that failed
+        """
+        pdf_paths = list(pdf_paths)
+        for outcome in self.executor.run(pdf_paths):
+            if "error" in outcome:
+                yield {"pdf": pdf_paths[outcome["index"]], "error": outcome["error"], "stage": outcome["stage"]}
+            else:
+                yield outcome["result"]
+
+    def report(self) -> Dict:
+        """Stage metrics of the last run (see PipelineExecutor.report)"""
+        return self.executor.report()
+
+
+def main():
+    """Run SmartPDFInsights over many PDFs as a staged pipeline"""
+    parser = argparse.ArgumentParser(description="SmartPDFInsights pipelined batch processing")
+    parser.add_argument("--input", type=str, required=True,
+                        help="Directory (searched recursively) or glob pattern of PDF files")
+    parser.add_argument("--personas", type=str, nargs="+", default=["general reader"],
+                        help="Personas every document is answered for")
+    parser.add_argument("--output", type=str, default="pipeline_results.jsonl",
+                        help="JSONL file receiving one result per document")
+    parser.add_argument("--top_k", type=int, default=5, help="Sections matched per persona")
+    parser.add_argument("--extract_workers", type=int, default=1,
+                        help="Processes for page extraction within a document (0 = all CPUs)")
+    parser.add_argument("--index_workers", type=int, default=1, help="Threads for the index stage")
+    parser.add_argument("--retrieve_workers", type=int, default=1, help="Threads for the retrieve stage")
+    parser.add_argument("--summarize_workers", type=int, default=1, help="Threads for the summarize stage")
+    parser.add_argument("--summary_batch_size", type=int, default=8, help="Summaries generated per model call")
+    parser.add_argument("--queue_size", type=int, default=4, help="Capacity of the queue before each stage")
+    parser.add_argument("--model_path", type=str, help="Path to custom models")
+    parser.add_argument("--cache_dir", type=str, help="Directory for caching results across runs")
+    parser.add_argument("--metrics", type=str, help="Optional JSON file for the stage metrics")
+
+    args = parser.parse_args()
+
+    pdf_paths = find_pdfs(args.input)
+    if not pdf_paths:
+        print(f"Error: no PDF files found for '{args.input}'")
+        return
+
+    system = create_system(model_path=args.model_path, cache_dir=args.cache_dir, workers=args.extract_workers)
+    pipeline = InsightsPipeline(
+        system, args.personas, top_k=args.top_k, index_workers=args.index_workers,
+        retrieve_workers=args.retrieve_workers, summarize_workers=args.summarize_workers,
+        summary_batch_size=args.summary_batch_size, queue_size=args.queue_size
+    )
+
+    print(f"Processing {len(pdf_paths)} PDFs for {len(args.personas)} persona(s)")
+    with open(args.output, 'w') as f:
+        for result in pipeline.run(pdf_paths):
+            if "error" in result:
+                print(f"Failed to process {result['pdf']} ({result['stage']} stage): {result['error']}")
+            f.write(json.dumps(result) + "\n")
+            f.flush()
+
+    report = pipeline.report()
+    print(f"\nPipeline Results ({report['wall_seconds']:.2f}s, bottleneck: {report['bottleneck']}):")
+    for stage in report["stages"]:
+        print(f"  {stage['stage']:<10} x{stage['concurrency']}: {stage['items']} items, "
+              f"utilization {stage['utilization']:.0%}, "
+              f"queue depth mean {stage['mean_queue_depth']:.1f} / max {stage['max_queue_depth']} "
+              f"(of {stage['queue_size']}), blocked {stage['blocked_seconds']:.2f}s")
+    if args.metrics:
+        with open(args.metrics, 'w') as f:
+            json.dump(report, f, indent=2)
+    print(f"Results saved to {args.output}")
+    system.close()
+
+
+if __name__ == "__main__":
+    main()
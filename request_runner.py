@@ -0,0 +1,203 @@
+import json
+import time
+import argparse
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from smart_pdf_insights import SmartPDFInsights
+from batch_runner import create_system
+
+
+def read_requests(lines: Iterable[str]) -> Iterator[Dict]:
+    """Parse a JSONL stream of {pdf, persona, top_k} requests
+
+    Blank lines are skipped. Every request is tagged with its 1-based line
+    number; lines that are not valid requests are yielded with an "error".
+
+    Args:
+        lines: Lines of the request file
+
+    Yields:
+        Request dictionaries
+    """
+    for line_num, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            yield {"line": line_num, "error": f"Invalid JSON: {e}"}
+            continue
+        if not isinstance(request, dict) or not request.get("pdf") or not isinstance(request["pdf"], str):
+            yield {"line": line_num, "error": "Request must be an object with a 'pdf' field"}
+            continue
+
+        request.setdefault("persona", "general reader")
+        if not isinstance(request["persona"], str) or not request["persona"].strip():
+            yield {"line": line_num, "error": "'persona' must be a non-empty string"}
+            continue
+
+        top_k = request.get("top_k", 5)
+        # Integral floats (5.0) and digit strings ("5") are accepted as before
+        if isinstance(top_k, float) and top_k.is_integer():
+            top_k = int(top_k)
+        elif isinstance(top_k, str) and top_k.strip().isdigit():
+            top_k = int(top_k)
+        if isinstance(top_k, bool) or not isinstance(top_k, int) or top_k < 1:
+            yield {"line": line_num, "error": "'top_k' must be a positive integer"}
+            continue
+
+        request["line"] = line_num
+        request["top_k"] = top_k
+        yield request
+
+
+class RequestRunner:
+    """Answer (document, persona) requests grouped by document
+
+    Requests are grouped by PDF so that every document is parsed, split into
+    sections and indexed once per window of requests. All personas asked of
+    a document are scored in a single retrieval pass, and the summaries of
+    all its requests are generated together in padded batches, with repeated
+    (section, persona) pairs summarized once.
+
+    Requests are read in windows of a bounded size: each window is answered
+    before the next one is read, so results stream out while the input is
+    still being read, and memory stays bounded however long the input is.
+    A PDF whose requests fall in several windows is processed once per
+    window (a document cache makes the repeats cheap).
+    """
+
+    def __init__(self, system: SmartPDFInsights, summary_batch_size: int = 8, window: int = 256):
+        """Initialize the runner
+
+        Args:
+            system: SmartPDFInsights instance whose models serve every request
+            summary_batch_size: Number of summaries generated per model call
+            window: Requests read and grouped before they are answered
+                (0 reads the whole input first)
+        """
+        self.system = system
+        self.summary_batch_size = summary_batch_size
+        self.window = window
+
+    def run(self, requests: Iterable[Dict]) -> Iterator[Dict]:
+        """Answer requests, yielding results document by document
+
+        Args:
+            requests: Requests from read_requests
+
+        Yields:
+            One result per request; invalid requests are yielded as soon as
+            they are read, and results of a document as soon as that document
+            is done, in request order
+        """
+        groups = {}
+        grouped = 0
+        for request in requests:
+            if "error" in request:
+                yield request
+                continue
+            groups.setdefault(request["pdf"], []).append(request)
+            grouped += 1
+            if self.window and grouped >= self.window:
+                yield from self._run_groups(groups)
+                groups = {}
+                grouped = 0
+
+        yield from self._run_groups(groups)
+
+    def _run_groups(self, groups: Dict[str, List[Dict]]) -> Iterator[Dict]:
+        """Answer a window of requests grouped by PDF"""
+        for pdf_path, pdf_requests in groups.items():
+            yield from self.run_document(pdf_path, pdf_requests)
+
+    def run_document(self, pdf_path: str, requests: List[Dict]) -> List[Dict]:
+        """Answer all requests for a single PDF
+
+        Args:
+            pdf_path: Path to the PDF file
+            requests: Requests for that PDF
+
+        Returns:
+            One result per request, in request order
+        """
+        try:
+            with self.system.parse_pdf(pdf_path) as document:
+                sections = self.system.extract_sections(document)
+
+                # Score every distinct persona once, at the largest top_k asked
+                personas = list(dict.fromkeys(request["persona"] for request in requests))
+                max_top_k = max(request["top_k"] for request in requests)
+                matched = dict(zip(personas, self.system.match_sections_to_personas(
+                    sections, personas, top_k=max_top_k
+                )))
+
+                matches = [(matched[request["persona"]][:request["top_k"]], request["persona"])
+                           for request in requests]
+                insights = self.system.generate_insights_batch(matches, batch_size=self.summary_batch_size)
+        except Exception as e:
+            print(f"Failed to process {pdf_path}: {e}")
+            return [self._result(request, error=str(e)) for request in requests]
+
+        return [self._result(request, matched_sections, request_insights)
+                for request, (matched_sections, _), request_insights in zip(requests, matches, insights)]
+
+    @staticmethod
+    def _result(request: Dict, matched_sections: Optional[List[Dict]] = None,
+                insights: Optional[List[Dict]] = None, error: Optional[str] = None) -> Dict:
+        """Build the output record of a request"""
+        result = dict(request)
+        if error is not None:
+            result["error"] = error
+            return result
+
+        result["matched_sections"] = [{
+            "heading": s["heading"],
+            "page": s["page"],
+            "score": s.get("score", 0.0)
+        } for s in matched_sections]
+        result["insights"] = insights
+        return result
+
+
+def main():
+    """Run a JSONL file of {pdf, persona, top_k} requests"""
+    parser = argparse.ArgumentParser(description="SmartPDFInsights JSONL request runner")
+    parser.add_argument("--requests", type=str, required=True,
+                        help="JSONL file with one {pdf, persona, top_k} request per line")
+    parser.add_argument("--output", type=str, default="results.jsonl",
+                        help="JSONL file receiving one result per request")
+    parser.add_argument("--summary_batch_size", type=int, default=8,
+                        help="Summaries generated per model call")
+    parser.add_argument("--window", type=int, default=256,
+                        help="Requests grouped by PDF before they are answered "
+                             "(0 = read the whole file first)")
+    parser.add_argument("--model_path", type=str, help="Path to custom models")
+    parser.add_argument("--ocr_batch_size", type=int, default=1,
+                        help="Scanned pages recognised per tesseract process")
+    parser.add_argument("--cache_dir", type=str,
+                        help="Directory for caching results across runs")
+
+    args = parser.parse_args()
+
+    system = create_system(model_path=args.model_path, cache_dir=args.cache_dir,
+                           ocr_batch_size=args.ocr_batch_size)
+    runner = RequestRunner(system, summary_batch_size=args.summary_batch_size, window=args.window)
+
+    start = time.perf_counter()
+    count = failed = 0
+    with open(args.requests, 'r') as requests_file, open(args.output, 'w') as output_file:
+        for result in runner.run(read_requests(requests_file)):
+            # Results are streamed out as soon as their document is done
+            output_file.write(json.dumps(result) + "\n")
+            output_file.flush()
+            count += 1
+            failed += "error" in result
+
+    elapsed = time.perf_counter() - start
+    print(f"Answered {count} requests ({failed} failed) in {elapsed:.2f}s")
+    print(f"Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -26,6 +26,10 @@ setup(
     entry_points={
         "console_scripts": [
             "smart-pdf-insights=smart_pdf_insights:main",
+            "smart-pdf-insights-batch=batch_runner:main",
+            "smart-pdf-insights-requests=request_runner:main",
+            "smart-pdf-insights-pipeline=pipeline_executor:main",
+            "smart-pdf-insights-service=insights_service:main",
         ],
     },
 )
\ No newline at end of file
@@ -1,39 +1,126 @@
 import os
+import mmap
 import argparse
 import json
-from typing import List, Dict, Optional, Union, Tuple
+from contextlib import contextmanager
+from typing import BinaryIO, List, Dict, Iterator, Optional, Union, Tuple
 
-from pdf_processor import PDFProcessor
-from hybrid_retriever import HybridRetriever, AdapterFineTuner
+from pdf_processor import PDFProcessor, ParsedDocument, open_document
+from ocr_engine import OCREngine, OCRCache
+from document_cache import DocumentCache, ArtifactCache
+from hybrid_retriever import HybridRetriever, AdapterFineTuner, CorpusIndex
 from context_aware_summarizer import ContextAwareSummarizer, EvaluationMetrics
+from vector_store import VectorStore
+
+# A PDF given by path or held in memory (e.g. an upload)
+PDFSource = Union[str, bytes, bytearray, memoryview, mmap.mmap, BinaryIO]
+
+
+class Section(dict):
+    """Section dictionary whose content is a lazily sliced span of the document
+    
+    A section only stores (start, end) character offsets into the full-text
+    buffer of its ParsedDocument, so sections never duplicate document text.
+    section["content"] is materialised from the span on access and is not
+    kept in the dictionary: json.dumps(), dict() and ** only see the stored
+    fields. Use to_dict() wherever a section leaves the process.
+    """
+    
+    def __init__(self, buffer: str, start: int, end: int, prefix: str = "", **fields):
+        """Create a section over buffer[start:end]
+        
+        Args:
+            buffer: Full document text shared by all sections
+            start: Offset of the section start (its heading) in buffer
+            end: Offset of the section end in buffer
+            prefix: Text placed before the span, for headings missing from the text
+            **fields: Regular section fields (heading, level, page, id, ...)
+        """
+        super().__init__(**fields)
+        self.buffer = buffer
+        self.start = start
+        self.end = end
+        self.prefix = prefix
+    
+    @property
+    def span(self) -> Tuple[int, int]:
+        """(start, end) offsets of the section in the document buffer"""
+        return self.start, self.end
+    
+    def __missing__(self, key):
+        if key == "content":
+            return (self.prefix + self.buffer[self.start:self.end]).strip()
+        raise KeyError(key)
+    
+    def __contains__(self, key):
+        return key == "content" or super().__contains__(key)
+    
+    def get(self, key, default=None):
+        if key == "content" and not super().__contains__(key):
+            return self["content"]
+        return super().get(key, default)
+    
+    def copy(self) -> "Section":
+        return Section(self.buffer, self.start, self.end, self.prefix, **self)
+    
+    def to_dict(self, include_content: bool = True) -> Dict:
+        """Plain dictionary of the section fields, with the content materialised
+        
+        Args:
+            include_content: Whether to include the section text
+        """
+        fields = dict(self)
+        if include_content:
+            fields["content"] = self["content"]
+        return fields
+
 
 class SmartPDFInsights:
     """Main class for the SmartPDFInsights system integrating all components"""
     
-    def __init__(self, model_path: Optional[str] = None):
+    def __init__(self, model_path: Optional[str] = None, workers: int = 1,
+                 ocr_engine: Optional[OCREngine] = None,
+                 document_cache: Optional[DocumentCache] = None,
+                 artifact_cache: Optional[ArtifactCache] = None):
         """Initialize the SmartPDFInsights system
         
         Args:
             model_path: Optional path to pre-trained models
+            workers: Number of processes used for page extraction (0 = all CPUs)
+            ocr_engine: Optional OCR engine for scanned pages
+            document_cache: Optional cache of parse results shared across runs
+            artifact_cache: Optional cache of section embeddings and summaries
+                keyed by section content, shared across runs and document versions
         """
         # Initialize components
-        self.pdf_processor = PDFProcessor()
+        self.pdf_processor = PDFProcessor(workers=workers, ocr_engine=ocr_engine)
+        self.document_cache = document_cache
+        self.artifact_cache = artifact_cache
         
         # Check if fine-tuned model exists
         fine_tuned_model_path = './fine_tuned_models/retriever'
         if os.path.exists(fine_tuned_model_path):
             print(f"Using fine-tuned retriever model from {fine_tuned_model_path}")
-            self.retriever = HybridRetriever(model_name=fine_tuned_model_path, sparse_weight=0.3)
+            self.retriever = HybridRetriever(model_name=fine_tuned_model_path, sparse_weight=0.3,
+                                             embedding_cache=artifact_cache)
         else:
             # Use smaller models for CPU efficiency
             print("Using default retriever model")
-            self.retriever = HybridRetriever(model_name='all-MiniLM-L6-v2', sparse_weight=0.3)
+            self.retriever = HybridRetriever(model_name='all-MiniLM-L6-v2', sparse_weight=0.3,
+                                             embedding_cache=artifact_cache)
         self.summarizer = ContextAwareSummarizer(model_name='facebook/bart-base')
         
+        # Optional SummaryBatcher merging the summaries of concurrent callers
+        self.summary_batcher = None
+        
         # Load custom models if provided
         if model_path and os.path.exists(model_path):
             self._load_custom_models(model_path)
     
+    def close(self):
+        """Shut down the page-extraction worker processes of the PDF processor"""
+        self.pdf_processor.close()
+    
     def _load_custom_models(self, model_path: str):
         """Load custom fine-tuned models if available
         
@@ -45,58 +132,81 @@ class SmartPDFInsights:
         if os.path.exists(retriever_path):
             try:
                 self.retriever.model = self.retriever.model.load(retriever_path)
+                self.retriever.model_name = retriever_path  # Keeps cached embeddings per model
                 print(f"Loaded custom retriever model from {retriever_path}")
             except Exception as e:
                 print(f"Failed to load custom retriever model: {e}")
     
-    def process_pdf(self, pdf_path: str) -> Dict:
-        """Process a PDF document to extract headings and structure
+    def parse_pdf(self, pdf_path: PDFSource, name: Optional[str] = None) -> ParsedDocument:
+        """Open a PDF once so that it can be shared by all other methods
         
         Args:
-            pdf_path: Path to the PDF file
+            pdf_path: Path to the PDF file, or the PDF in memory (bytes, mmap
+                or binary file-like object), opened from memory without a
+                temporary file
+            name: Optional display name of an in-memory PDF
             
         Returns:
-            Dictionary with extracted headings and document structure
+            ParsedDocument session that parses its contents lazily, once
+            (or restores them from the document cache)
         """
-        # Extract headings with improved method
-        headings = self.pdf_processor.extract_headings(pdf_path)
-        
-        # Extract PDF content and properties
-        import fitz
-        doc = fitz.open(pdf_path)
-        content = ""
-        properties = {
-            "page_count": len(doc),
-            "metadata": doc.metadata,
-            "is_encrypted": doc.is_encrypted,
-            "permissions": doc.permissions
-        }
+        return ParsedDocument(pdf_path, processor=self.pdf_processor, cache=self.document_cache,
+                              name=name)
+    
+    @contextmanager
+    def _document_session(self, document: Union[PDFSource, ParsedDocument]) -> Iterator[ParsedDocument]:
+        """Use a caller's session as is, or parse a path in a session of our own
         
-        # Extract text from each page
-        for page in doc:
-            content += page.get_text() + "\n\n"
+        A session opened here is closed (saving anything marked unsaved) when
+        the block ends, so path-based calls do not leave the file open.
+        """
+        if isinstance(document, ParsedDocument):
+            yield document
+            return
+        with self.parse_pdf(document) as session:
+            yield session
+    
+    def process_pdf(self, document: Union[PDFSource, ParsedDocument]) -> Dict:
+        """Process a PDF document to extract headings and structure
         
-        # Check if headings were extracted from the built-in outline
-        # (headings from built-in outline will have 'level' as 'H1', 'H2', etc.)
-        if headings and all(isinstance(h.get('level'), str) and h.get('level', '').startswith('H') for h in headings):
-            # Return the exact outline from the PDF with content and properties
+        Args:
+            document: PDF path or in-memory PDF, or a ParsedDocument from parse_pdf
+            
+        Returns:
+            Dictionary with extracted headings and document structure
+        """
+        with self._document_session(document) as document:
+            # Headings, content and properties are parsed once per document
+            headings = document.headings
+            content = document.content
+            properties = document.properties
+            
+            # Check if headings were extracted from the built-in outline
+            # (headings from built-in outline will have 'level' as 'H1', 'H2', etc.)
+            if headings and all(isinstance(h.get('level'), str) and h.get('level', '').startswith('H') for h in headings):
+                # Return the exact outline from the PDF with content and properties
+                return {
+                    "title": os.path.basename(document.pdf_path),
+                    "outline": headings,
+                    "content": content,
+                    "properties": properties
+                }
+            
+            # For headings extracted using heuristic methods, organize into a hierarchical structure
+            if document.structure is None:
+                document.structure = self._organize_headings(headings)
+                # Saved once, together with the sections, or when the session
+                # is closed
+                document.mark_unsaved()
+            document_structure = document.structure
+            
+            # Return in the structured format with content and properties
             return {
-                "title": os.path.basename(pdf_path),
-                "outline": headings,
+                "headings": headings,
+                "structure": document_structure,
                 "content": content,
                 "properties": properties
             }
-        
-        # For headings extracted using heuristic methods, organize into a hierarchical structure
-        document_structure = self._organize_headings(headings)
-        
-        # Return in the structured format with content and properties
-        return {
-            "headings": headings,
-            "structure": document_structure,
-            "content": content,
-            "properties": properties
-        }
     
     def _organize_headings(self, headings: List[Dict]) -> List[Dict]:
         """Organize headings into a hierarchical structure
@@ -133,77 +243,152 @@ class SmartPDFInsights:
         
         return root
     
-    def extract_sections(self, pdf_path: str) -> List[Dict]:
+    def extract_sections(self, document: Union[PDFSource, ParsedDocument]) -> List[Dict]:
         """Extract sections from PDF based on heading structure
         
         Args:
-            pdf_path: Path to the PDF file
+            document: PDF path or in-memory PDF, or a ParsedDocument from parse_pdf
             
         Returns:
             List of sections with text content
         """
-        # First extract headings
-        result = self.process_pdf(pdf_path)
-        
-        # Handle both outline format and headings format
-        if "outline" in result:
-            headings = result["outline"]
-        else:
-            headings = result["headings"]
-        
-        # Open PDF for text extraction
-        import fitz  # PyMuPDF
-        doc = fitz.open(pdf_path)
-        
-        # Extract text from each page
-        page_texts = [page.get_text() for page in doc]
-        
-        # Sort headings by page and position
-        sorted_headings = sorted(headings, key=lambda h: (h.get("page", 0), h.get("y", 0)))
-        
-        # Extract sections between headings
-        sections = []
-        for i in range(len(sorted_headings)):
-            current = sorted_headings[i]
+        with self._document_session(document) as document:
+            content = document.content
             
-            # Determine section end (next heading or end of document)
-            if i < len(sorted_headings) - 1:
-                next_heading = sorted_headings[i + 1]
-                end_page = next_heading["page"] - 1
-                end_pos = 0
-            else:
-                end_page = len(page_texts) - 1
-                end_pos = len(page_texts[-1])
+            if document.section_spans is not None:
+                # Section boundaries were located before (possibly in an earlier run)
+                return [Section(content, start, end, prefix, **fields)
+                        for start, end, prefix, fields in document.section_spans]
+            
+            # Outline and heuristic headings share the same list on the session
+            headings = document.headings
+            page_offsets = document.page_offsets
+            last_page = len(page_offsets) - 2
             
-            # Extract text between current heading and next heading
-            section_text = ""
+            # Sort headings by page and position
+            sorted_headings = sorted(headings, key=lambda h: (h.get("page", 0), h.get("y", 0)))
             
-            # Add current heading text
-            section_text += current["text"] + "\n\n"
+            # Locate every heading in the full-text buffer. Each section starts no
+            # earlier than the end of the previous heading's text, so headings
+            # sharing a page get disjoint spans whether or not they were found
+            starts = []
+            found = []
+            prev_start, prev_length = 0, 0
+            for heading in sorted_headings:
+                page = min(max(heading.get("page", 1) - 1, 0), last_page)  # Convert to 0-indexed
+                page_start = max(int(page_offsets[page]), prev_start + prev_length)
+                page_end = int(page_offsets[page + 1])
             
-            # Add content after heading on the same page
-            current_page = current["page"] - 1  # Convert to 0-indexed
-            if current_page <= end_page:
-                page_text = page_texts[current_page]
-                # Find position of heading in page text
-                heading_pos = page_text.find(current["text"])
+                heading_pos = content.find(heading["text"], page_start, page_end) if heading["text"] else -1
                 if heading_pos >= 0:
-                    section_text += page_text[heading_pos + len(current["text"]):] + "\n"
-            
-            # Add content from subsequent pages
-            for p in range(current_page + 1, end_page + 1):
-                if p < len(page_texts):
-                    section_text += page_texts[p] + "\n"
-            
-            sections.append({
-                "heading": current["text"],
-                "level": current.get("level", 6),
-                "page": current["page"],
-                "content": section_text.strip(),
-                "id": f"section_{i}"
-            })
+                    prev_start, prev_length = heading_pos, len(heading["text"])
+                else:
+                    # The heading only leads its section as a prefix, so it takes
+                    # up no text in the buffer
+                    prev_start, prev_length = page_start, 0
+                starts.append(prev_start)
+                found.append(heading_pos >= 0)
+            
+            # Each section runs from its heading to the next heading (or the end)
+            ends = starts[1:] + [len(content)]
+            
+            sections = []
+            for i, heading in enumerate(sorted_headings):
+                sections.append(Section(
+                    content, starts[i], max(ends[i], starts[i]),
+                    # Headings that could not be found in the text still lead their section
+                    prefix="" if found[i] else heading["text"] + "\n\n",
+                    heading=heading["text"],
+                    level=heading.get("level", 6),
+                    page=heading["page"],
+                    id=f"section_{i}"
+                ))
+            
+            document.section_spans = [[section.start, section.end, section.prefix, dict(section)]
+                                      for section in sections]
+            document.save()
+            return sections
+    
+    def stream_pdf(self, pdf_path: PDFSource, include_text: bool = True) -> Iterator[Dict]:
+        """Stream pages, headings and sections of a PDF one at a time
+        
+        Unlike process_pdf and extract_sections, the full document text is
+        never assembled, and neither is the text of a section: the open
+        section's text on each page is yielded as a "content" event as soon
+        as the page is read. Peak memory is bounded by a single page however
+        many pages the document or its sections have. Joining the content
+        events of a section and stripping the result gives the content of
+        the same section from extract_sections.
         
-        return sections
+        Args:
+            pdf_path: Path to the PDF file, or the PDF in memory
+            include_text: Whether page events carry the page text
+            
+        Yields:
+            Event dictionaries whose "type" is "page", "heading", "content"
+            (a chunk of the open section's text, with the section "id") or
+            "section" (emitted when a section is closed, without its text)
+        """
+        doc = open_document(pdf_path)
+        
+        try:
+            section = None
+            section_count = 0
+            for page_num, page_text, page_headings in self.pdf_processor.iter_page_headings(doc):
+                page_event = {"type": "page", "page": page_num + 1}
+                if include_text:
+                    page_event["text"] = page_text
+                yield page_event
+                
+                # Offset where the open section's text on this page starts, and
+                # where the search for the next heading starts
+                segment_start = 0
+                cursor = 0
+                for heading in sorted(page_headings, key=lambda h: h.get("y", 0)):
+                    heading_pos = page_text.find(heading["text"], cursor) if heading["text"] else -1
+                    start = heading_pos if heading_pos >= 0 else cursor
+                    
+                    # A new heading closes the previous section
+                    if section is not None:
+                        if start > segment_start:
+                            yield self._streamed_content(section, page_num, page_text[segment_start:start])
+                        yield self._streamed_section(section)
+                    
+                    section = {"heading": heading, "id": f"section_{section_count}"}
+                    section_count += 1
+                    segment_start = start
+                    if heading_pos >= 0:
+                        cursor = heading_pos + len(heading["text"])
+                    
+                    yield {"type": "heading", **heading}
+                    if heading_pos < 0:
+                        # Headings that could not be found in the text still lead their section
+                        yield self._streamed_content(section, page_num, heading["text"] + "\n\n")
+                
+                if section is not None:
+                    yield self._streamed_content(section, page_num, page_text[segment_start:] + "\n\n")
+            
+            if section is not None:
+                yield self._streamed_section(section)
+        finally:
+            doc.close()
+    
+    @staticmethod
+    def _streamed_content(section: Dict, page_num: int, text: str) -> Dict:
+        """Content event for a chunk of the open section's text"""
+        return {"type": "content", "id": section["id"], "page": page_num + 1, "text": text}
+    
+    @staticmethod
+    def _streamed_section(section: Dict) -> Dict:
+        """Section event closing a section opened by stream_pdf"""
+        heading = section["heading"]
+        return {
+            "type": "section",
+            "heading": heading["text"],
+            "level": heading.get("level", 6),
+            "page": heading["page"],
+            "id": section["id"]
+        }
     
     def match_sections_to_persona(self, sections: List[Dict], persona: str, top_k: int = 5) -> List[Dict]:
         """Match sections to a persona using hybrid retrieval
@@ -216,6 +401,134 @@ class SmartPDFInsights:
         Returns:
             List of top sections relevant to the persona
         """
+        # Index the corpus
+        self._index_sections(sections)
+        
+        # Retrieve top sections for the persona
+        results = self.retriever.retrieve(persona, top_k=top_k, expand=True)
+        return self._matched_sections(sections, results)
+    
+    def match_sections_to_personas(self, sections: List[Dict], personas: List[str], top_k: int = 5,
+                                   index: Optional[CorpusIndex] = None) -> List[List[Dict]]:
+        """Match sections to several personas, indexing the sections once
+        
+        Args:
+            sections: List of extracted sections
+            personas: Descriptions of the target personas
+            top_k: Number of top sections to return per persona
+            index: Optional index of the sections from build_section_index
+            
+        Returns:
+            One list of top sections per persona, as in match_sections_to_persona
+        """
+        if index is None:
+            self._index_sections(sections)
+        
+        # Every persona is scored in a single retrieval pass
+        batch_results = self.retriever.retrieve_batch(personas, top_k=top_k, expand=True, index=index)
+        return [self._matched_sections(sections, results) for results in batch_results]
+    
+    def build_section_index(self, sections: List[Dict]) -> CorpusIndex:
+        """Index sections without touching the retriever's current corpus
+        
+        The returned index can be searched while other documents are being
+        indexed or matched, e.g. by concurrent pipeline stages.
+        
+        Args:
+            sections: List of extracted sections
+            
+        Returns:
+            CorpusIndex for match_sections_to_personas
+        """
+        return self.retriever.build_index(*self._section_corpus(sections))
+    
+    def open_library(self, path: str, readonly: bool = False) -> VectorStore:
+        """Open (or create) a persistent store of section embeddings
+        
+        Args:
+            path: Directory of the store
+            readonly: Open for searching only, e.g. from worker processes
+            
+        Returns:
+            VectorStore for add_to_library and search_library
+        """
+        dim = self.retriever.model.get_sentence_embedding_dimension()
+        return VectorStore(path, dim=None if readonly else dim,
+                           model_name=self.retriever.model_name, readonly=readonly)
+    
+    def add_to_library(self, store: VectorStore,
+                       document: Union[PDFSource, ParsedDocument]) -> int:
+        """Append the section embeddings of a document to a library store
+        
+        Rows are keyed by the document's content hash and section id, so
+        adding the same document twice (by path or in memory) does not
+        duplicate it, while different in-memory PDFs never collide. Adding a
+        new version of a file deletes the rows of its older versions at the
+        same path.
+        
+        Args:
+            store: Store from open_library
+            document: PDF path or in-memory PDF, or a ParsedDocument from parse_pdf
+            
+        Returns:
+            Number of sections added
+        """
+        with self._document_session(document) as document:
+            sections = self.extract_sections(document)
+            key = document.cache_key or DocumentCache.key(document.source)
+            
+            if not document.in_memory:
+                records = store.records
+                store.delete([row for row in store.rows_with("pdf", document.pdf_path)
+                              if records[row]["metadata"].get("key") != key])
+            
+            existing = store.ids
+            new_sections = [section for section in sections if f"{key}#{section['id']}" not in existing]
+            if not new_sections:
+                return 0
+            
+            embeddings = self.retriever.encode([section["content"] for section in new_sections])
+            store.append(
+                [f"{key}#{section['id']}" for section in new_sections],
+                embeddings,
+                [{
+                    "pdf": document.pdf_path,
+                    "key": key,
+                    "heading": section["heading"],
+                    "level": section.get("level", 6),
+                    "page": section["page"]
+                } for section in new_sections]
+            )
+            return len(new_sections)
+    
+    def search_library(self, store: VectorStore, personas: List[str], top_k: int = 5,
+                       ann_index=None, nprobe: Optional[int] = None) -> List[List[Dict]]:
+        """Find the sections most relevant to each persona across a library
+        
+        Args:
+            store: Store from open_library
+            personas: Descriptions of the target personas
+            top_k: Number of sections returned per persona
+            ann_index: Optional IVFIndex over the store (see ann_index.py) for
+                approximate search of large libraries
+            nprobe: Lists scanned per persona by ann_index
+            
+        Returns:
+            One list per persona of {"id", "pdf", "key", "heading", "level",
+            "page", "score"} dictionaries, best first
+        """
+        return [[dict(result["metadata"], id=result["id"], score=result["score"])
+                 for result in results]
+                for results in self.retriever.search_store(personas, store, top_k=top_k,
+                                                           ann_index=ann_index, nprobe=nprobe)]
+    
+    def _index_sections(self, sections: List[Dict]):
+        """Index section texts and metadata in the retriever"""
+        self.retriever.index_corpus(*self._section_corpus(sections))
+    
+    @staticmethod
+    def _section_corpus(sections: List[Dict]) -> Tuple[List[str], List[Dict]]:
+        """Section texts and retrieval metadata"""
         # Extract section texts and metadata
         texts = [section["content"] for section in sections]
         metadata = [{
@@ -224,14 +537,10 @@ class SmartPDFInsights:
             "page": section["page"],
             "id": section.get("id", f"section_{i}")
         } for i, section in enumerate(sections)]
-        
-        # Index the corpus
-        self.retriever.index_corpus(texts, metadata)
-        
-        # Retrieve top sections for the persona
-        results = self.retriever.retrieve(persona, top_k=top_k, expand=True)
-        
-        # Combine results with original sections
+        return texts, metadata
+    
+    def _matched_sections(self, sections: List[Dict], results: List[Dict]) -> List[Dict]:
+        """Combine retrieval results with the sections they refer to"""
         matched_sections = []
         for result in results:
             section_id = result["metadata"]["id"]
@@ -258,11 +567,37 @@ class SmartPDFInsights:
         """
         insights = []
         
-        for section in sections:
-            # Use two-stage summarization for better quality
-            summary = self.summarizer.generate_two_stage_summary(
-                section["content"], persona, max_length=150
-            )
+        # With a summary batcher, queue every summary up front so that they
+        # are generated together with those of concurrent callers
+        pending = {}
+        if self.summary_batcher is not None:
+            for i, section in enumerate(sections):
+                if self.artifact_cache is None or self.artifact_cache.get_summary(
+                        self.summarizer.model_name, section["content"], persona, 150) is None:
+                    pending[i] = self.summary_batcher.submit(section["content"], persona, max_length=150)
+        
+        for i, section in enumerate(sections):
+            # Sections unchanged since an earlier run reuse their summary
+            summary = None
+            generated = i in pending
+            if generated:
+                summary = pending[i].result()
+            elif self.artifact_cache is not None:
+                summary = self.artifact_cache.get_summary(
+                    self.summarizer.model_name, section["content"], persona, 150
+                )
+            
+            if summary is None:
+                # Use two-stage summarization for better quality
+                summary = self.summarizer.generate_two_stage_summary(
+                    section["content"], persona, max_length=150
+                )
+                generated = True
+            
+            if generated and self.artifact_cache is not None:
+                self.artifact_cache.set_summary(
+                    self.summarizer.model_name, section["content"], persona, 150, summary
+                )
             
             insights.append({
                 "heading": section["heading"],
@@ -273,11 +608,119 @@ class SmartPDFInsights:
         
         return insights
     
-    def evaluate(self, pdf_path: str, ground_truth_file: str) -> Dict:
+    def generate_insights_batch(self, matches: List[Tuple[List[Dict], str]],
+                                batch_size: int = 8) -> List[List[Dict]]:
+        """Generate insights for several personas, summarizing in padded batches
+        
+        Identical (section, persona) pairs are summarized once, and summaries
+        already in the artifact cache are not generated again.
+        
+        Args:
+            matches: (matched sections, persona) pairs, e.g. one per request
+            batch_size: Number of summaries generated per model call
+            
+        Returns:
+            One list of insights per pair, as in generate_insights
+        """
+        # Collect the distinct summaries that still need generating
+        summaries = {}
+        pending = []
+        for sections, persona in matches:
+            for section in sections:
+                key = (section["content"], persona)
+                if key in summaries:
+                    continue
+                summaries[key] = None
+                if self.artifact_cache is not None:
+                    summaries[key] = self.artifact_cache.get_summary(
+                        self.summarizer.model_name, section["content"], persona, 150
+                    )
+                if summaries[key] is None:
+                    pending.append(key)
+        
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start:start + batch_size]
+            generated = self.summarizer.generate_two_stage_summary_batch(
+                [text for text, _ in batch], [persona for _, persona in batch], max_length=150
+            )
+            for (text, persona), summary in zip(batch, generated):
+                summaries[(text, persona)] = summary
+                if self.artifact_cache is not None:
+                    self.artifact_cache.set_summary(self.summarizer.model_name, text, persona, 150, summary)
+        
+        return [[{
+            "heading": section["heading"],
+            "page": section["page"],
+            "summary": summaries[(section["content"], persona)],
+            "relevance_score": section.get("score", 0.0)
+        } for section in sections] for sections, persona in matches]
+    
+    def analyze(self, document: Union[PDFSource, ParsedDocument], persona: str, top_k: int = 5,
+                include_content: bool = True, verbose: bool = False) -> Union[Dict, List[Dict]]:
+        """Run the full pipeline on a PDF: headings, sections, persona matching and insights
+        
+        Args:
+            document: PDF path or in-memory PDF, or a ParsedDocument from parse_pdf
+            persona: Target persona for insights
+            top_k: Number of sections matched to the persona
+            include_content: Whether to include the full document text
+            verbose: Whether to print progress messages
+            
+        Returns:
+            Results in the output file format: a one-element list with the
+            exact outline for PDFs that have one, otherwise a dictionary with
+            headings, structure, matched sections, insights and properties
+        """
+        with self._document_session(document) as document:
+            result = self.process_pdf(document)
+            
+            # Extract sections
+            if verbose:
+                print("Extracting sections...")
+            sections = self.extract_sections(document)
+            
+            # Match sections to persona
+            if verbose:
+                print(f"Matching sections to persona: {persona}")
+            matched_sections = self.match_sections_to_persona(sections, persona, top_k=top_k)
+            
+            # Generate insights
+            if verbose:
+                print("Generating insights...")
+            insights = self.generate_insights(matched_sections, persona)
+            
+            if not include_content:
+                result = {key: value for key, value in result.items() if key != "content"}
+            
+            if "outline" in result:
+                # If result contains the exact outline from PDF, use that format
+                # Wrap the result in an array to match the requested format
+                return [result]
+            
+            # Use the standard format with headings, structure, matched sections, insights, content and properties
+            output = {
+                "pdf": document.pdf_path,
+                "persona": persona,
+                "headings": result["headings"],
+                "structure": result["structure"],
+                "content": result.get("content"),
+                "properties": result["properties"],
+                "matched_sections": [{
+                    "heading": s["heading"],
+                    "page": s["page"],
+                    "score": s.get("score", 0.0)
+                } for s in matched_sections],
+                "insights": insights
+            }
+            if not include_content:
+                del output["content"]
+            return output
+    
+    def evaluate(self, document: Union[PDFSource, ParsedDocument], ground_truth_file: str) -> Dict:
         """Evaluate system performance against ground truth
         
         Args:
-            pdf_path: Path to the PDF file
+            document: PDF path or in-memory PDF, or a ParsedDocument from parse_pdf
             ground_truth_file: Path to ground truth JSON file
             
         Returns:
@@ -287,35 +730,35 @@ class SmartPDFInsights:
         with open(ground_truth_file, 'r') as f:
             ground_truth = json.load(f)
         
-        # Process PDF
-        result = self.process_pdf(pdf_path)
-        headings = result["headings"]
-        
-        # Extract sections
-        sections = self.extract_sections(pdf_path)
-        
-        # Evaluate heading extraction
-        heading_metrics = EvaluationMetrics.evaluate_heading_extraction(
-            headings, ground_truth.get("headings", [])
-        )
-        
-        # Evaluate section matching for each persona
-        persona_metrics = {}
-        for persona, gt_sections in ground_truth.get("personas", {}).items():
-            # Match sections to persona
-            matched_sections = self.match_sections_to_persona(sections, persona)
+        # Reuse the parsed session for headings and sections
+        with self._document_session(document) as document:
+            headings = document.headings
+            
+            # Extract sections
+            sections = self.extract_sections(document)
             
-            # Evaluate relevance ranking
-            relevance_metrics = EvaluationMetrics.evaluate_relevance_ranking(
-                matched_sections, gt_sections
+            # Evaluate heading extraction
+            heading_metrics = EvaluationMetrics.evaluate_heading_extraction(
+                headings, ground_truth.get("headings", [])
             )
             
-            persona_metrics[persona] = relevance_metrics
-        
-        return {
-            "heading_extraction": heading_metrics,
-            "persona_matching": persona_metrics
-        }
+            # Evaluate section matching for each persona
+            persona_metrics = {}
+            for persona, gt_sections in ground_truth.get("personas", {}).items():
+                # Match sections to persona
+                matched_sections = self.match_sections_to_persona(sections, persona)
+            
+                # Evaluate relevance ranking
+                relevance_metrics = EvaluationMetrics.evaluate_relevance_ranking(
+                    matched_sections, gt_sections
+                )
+            
+                persona_metrics[persona] = relevance_metrics
+            
+            return {
+                "heading_extraction": heading_metrics,
+                "persona_matching": persona_metrics
+            }
 
 
 def main():
@@ -328,50 +771,46 @@ def main():
                         help="Output file for results")
     parser.add_argument("--evaluate", type=str, help="Path to ground truth file for evaluation")
     parser.add_argument("--model_path", type=str, help="Path to custom models")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Worker processes for page extraction and OCR (0 = all CPUs)")
+    parser.add_argument("--ocr_batch_size", type=int, default=1,
+                        help="Scanned pages recognised per tesseract process")
+    parser.add_argument("--cache_dir", type=str,
+                        help="Directory for caching results across runs (parsed documents, OCR output, "
+                             "section embeddings and summaries)")
+    parser.add_argument("--no_content", action="store_true",
+                        help="Leave the full document text out of the output")
+    parser.add_argument("--stream", action="store_true",
+                        help="Write pages, headings and sections as JSON lines with bounded "
+                             "memory, skipping persona matching and insights")
     
     args = parser.parse_args()
     
     # Initialize system
-    system = SmartPDFInsights(model_path=args.model_path)
-    
-    # Process PDF
-    print(f"Processing PDF: {args.pdf}")
-    result = system.process_pdf(args.pdf)
+    ocr_cache = OCRCache(os.path.join(args.cache_dir, "ocr")) if args.cache_dir else None
+    document_cache = DocumentCache(os.path.join(args.cache_dir, "documents")) if args.cache_dir else None
+    artifact_cache = ArtifactCache(os.path.join(args.cache_dir, "artifacts")) if args.cache_dir else None
+    ocr_engine = OCREngine(max_workers=args.workers, batch_size=args.ocr_batch_size,
+                           cache=ocr_cache)
+    system = SmartPDFInsights(model_path=args.model_path, workers=args.workers,
+                              ocr_engine=ocr_engine, document_cache=document_cache,
+                              artifact_cache=artifact_cache)
     
-    # Extract sections
-    print("Extracting sections...")
-    sections = system.extract_sections(args.pdf)
+    if args.stream:
+        # Pages, headings and sections are written as soon as they are found
+        print(f"Streaming PDF: {args.pdf}")
+        with open(args.output, 'w') as f:
+            for event in system.stream_pdf(args.pdf, include_text=not args.no_content):
+                f.write(json.dumps(event) + "\n")
+        print(f"Results saved to {args.output}")
+        return
     
-    # Match sections to persona
-    print(f"Matching sections to persona: {args.persona}")
-    matched_sections = system.match_sections_to_persona(sections, args.persona)
-    
-    # Generate insights
-    print("Generating insights...")
-    insights = system.generate_insights(matched_sections, args.persona)
+    # Process PDF (opened and parsed once for the whole run)
+    print(f"Processing PDF: {args.pdf}")
+    document = system.parse_pdf(args.pdf)
+    output = system.analyze(document, args.persona, include_content=not args.no_content, verbose=True)
     
     # Save results
-    if "outline" in result:
-        # If result contains the exact outline from PDF, use that format
-        # Wrap the result in an array to match the requested format
-        output = [result]
-    else:
-        # Use the standard format with headings, structure, matched sections, insights, content and properties
-        output = {
-            "pdf": args.pdf,
-            "persona": args.persona,
-            "headings": result["headings"],
-            "structure": result["structure"],
-            "content": result["content"],
-            "properties": result["properties"],
-            "matched_sections": [{
-                "heading": s["heading"],
-                "page": s["page"],
-                "score": s.get("score", 0.0)
-            } for s in matched_sections],
-            "insights": insights
-        }
-    
     with open(args.output, 'w') as f:
         json.dump(output, f, indent=2)
     
@@ -380,7 +819,7 @@ def main():
     # Run evaluation if ground truth provided
     if args.evaluate:
         print(f"Evaluating against ground truth: {args.evaluate}")
-        metrics = system.evaluate(args.pdf, args.evaluate)
+        metrics = system.evaluate(document, args.evaluate)
         
         # Print evaluation results
         print("\nEvaluation Results:")
@@ -394,6 +833,9 @@ def main():
             print(f"  {persona}:")
             for metric, value in results.items():
                 print(f"    {metric}: {value:.4f}")
+    
+    document.close()
+    system.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,128 @@
+import numpy as np
+import pytest
+
+from ann_index import IVFIndex, benchmark_recall, _assign, _kmeans
+from vector_store import VectorStore
+
+
+def clustered(n, dim=32, n_centers=40, seed=0):
+    """Synthetic embeddings drawn around a few cluster centres"""
+    rng = np.random.RandomState(seed)
+    centers = rng.randn(n_centers, dim)
+    labels = rng.randint(0, n_centers, n)
+    return (centers[labels] + 0.5 * rng.randn(n, dim)).astype(np.float32)
+
+
+@pytest.fixture(scope="module")
+def data():
+    return clustered(6000), clustered(50, seed=1)
+
+
+@pytest.fixture(scope="module")
+def ivf(data):
+    vectors, _ = data
+    index = IVFIndex(32, n_lists=64, nprobe=8)
+    index.train(vectors, n_iter=10)
+    index.add(vectors)
+    return index
+
+
+def test_recall_improves_with_nprobe(ivf, data):
+    vectors, queries = data
+    report = benchmark_recall(ivf, vectors, queries, top_k=10, nprobes=(1, 8, 64))
+    recalls = [entry["recall"] for entry in report]
+    assert recalls == sorted(recalls)
+    assert recalls[1] >= 0.8
+    # Scanning every list is exact search
+    assert recalls[2] == pytest.approx(1.0)
+
+
+def test_pq_recall_with_rerank(data):
+    vectors, queries = data
+    index = IVFIndex(32, n_lists=32, nprobe=8, pq_m=8)
+    index.train(vectors, n_iter=10)
+    index.add(vectors[:4000])
+    index.add(vectors[4000:])
+    plain, reranked = (benchmark_recall(index, vectors, queries, top_k=10, nprobes=(32,), rerank=rerank)[0]
+                       for rerank in (False, True))
+    assert reranked["recall"] >= 0.9
+    assert reranked["recall"] >= plain["recall"]
+
+
+def test_search_pads_and_uses_given_ids(data):
+    vectors, queries = data
+    index = IVFIndex(32, n_lists=4)
+    index.train(vectors[:500])
+    assert index.search(queries[:2], top_k=3)[1].tolist() == [[-1] * 3] * 2
+
+    index.add(vectors[:5], ids=np.arange(100, 105))
+    scores, ids = index.search(queries[:1], top_k=8, nprobe=4)
+    assert sorted(ids[0, :5].tolist()) == list(range(100, 105))
+    assert ids[0, 5:].tolist() == [-1] * 3
+    assert np.all(np.isneginf(scores[0, 5:]))
+
+
+def test_save_load_round_trip(ivf, data, tmp_path):
+    _, queries = data
+    path = str(tmp_path / "index.npz")
+    ivf.save(path)
+    loaded = IVFIndex.load(path)
+    assert (loaded.n_lists, loaded.nprobe, loaded.ntotal) == (ivf.n_lists, ivf.nprobe, ivf.ntotal)
+    expected_scores, expected_ids = ivf.search(queries, top_k=10)
+    scores, ids = loaded.search(queries, top_k=10)
+    np.testing.assert_array_equal(ids, expected_ids)
+    np.testing.assert_allclose(scores, expected_scores)
+
+
+def test_kmeans_centroids_are_cluster_means():
+    points = clustered(2000, dim=8, n_centers=10, seed=2)
+    centroids = _kmeans(points, 10, 30, np.random.RandomState(1), spherical=False)
+    # At convergence every centroid is the mean of the points assigned to it
+    labels = _assign(points, centroids, False)
+    for label in np.unique(labels):
+        np.testing.assert_allclose(centroids[label], points[labels == label].mean(axis=0), atol=1e-4)
+
+
+def test_add_from_store_resumes_after_indexed_rows(data, tmp_path):
+    vectors, queries = data
+    store = VectorStore(str(tmp_path / "store"), dim=32)
+    store.append([f"row{i}" for i in range(1000)], vectors[:1000])
+    index = IVFIndex(32, n_lists=16)
+    index.train(vectors[:1000])
+    assert index.add_from_store(store, block_rows=300) == 1000
+    assert index.add_from_store(store) == 0
+
+    store.append([f"row{i}" for i in range(1000, 1500)], vectors[1000:1500])
+    path = str(tmp_path / "index.npz")
+    index.save(path)
+    loaded = IVFIndex.load(path)
+    assert loaded.store_rows == 1000
+    assert loaded.add_from_store(store) == 500
+    assert (loaded.ntotal, loaded.store_rows) == (1500, 1500)
+
+    # Every store row is indexed once, under its own row number
+    ids = np.sort(np.concatenate([inv.ids[:inv.size] for inv in loaded.lists]))
+    np.testing.assert_array_equal(ids, np.arange(1500))
+    _, found = loaded.search(vectors[1200:1201], top_k=1, nprobe=16)
+    assert found[0, 0] == 1200
+
+
+def test_add_from_store_refuses_foreign_ids(data, tmp_path):
+    vectors, _ = data
+    store = VectorStore(str(tmp_path / "store"), dim=32)
+    store.append([f"row{i}" for i in range(100)], vectors[:100])
+
+    index = IVFIndex(32, n_lists=4)
+    index.train(vectors[:500])
+    index.add(vectors[:10], ids=np.arange(5000, 5010))
+    with pytest.raises(ValueError):
+        index.add_from_store(store)
+
+    # An index that followed a larger store does not belong to this one
+    other = IVFIndex(32, n_lists=4)
+    other.train(vectors[:500])
+    bigger = VectorStore(str(tmp_path / "bigger"), dim=32)
+    bigger.append([f"row{i}" for i in range(200)], vectors[:200])
+    other.add_from_store(bigger)
+    with pytest.raises(ValueError):
+        other.add_from_store(store)
@@ -0,0 +1,124 @@
+import math
+import random
+
+import numpy as np
+import pytest
+
+from bm25_index import BM25Index, tokenize
+
+WORDS = ["apple", "banana", "cherry", "grape", "lemon", "mango", "melon", "olive",
+         "peach", "pear", "plum", "quince", "berry", "fig", "kiwi", "lime"]
+
+
+def make_corpus(n_docs, seed=0):
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 30))) for _ in range(n_docs)]
+
+
+def naive_scores(corpus, query, live=None, k1=1.2, b=0.75, ngram_range=(1, 1)):
+    """BM25 written out directly from the formula, one document at a time"""
+    live = set(range(len(corpus))) if live is None else set(live)
+    docs = {i: tokenize(text, ngram_range) for i, text in enumerate(corpus) if i in live}
+    lengths = {i: sum(1 for term in terms if " " not in term) or len(terms) for i, terms in docs.items()}
+    avg_length = sum(lengths.values()) / len(docs)
+
+    scores = np.zeros(len(corpus))
+    for term in set(tokenize(query, ngram_range)):
+        query_count = tokenize(query, ngram_range).count(term)
+        df = sum(1 for terms in docs.values() if term in terms)
+        if df == 0:
+            continue
+        idf = math.log(1 + (len(docs) - df + 0.5) / (df + 0.5))
+        for i, terms in docs.items():
+            tf = terms.count(term)
+            if tf:
+                norm = k1 * (1 - b + b * lengths[i] / avg_length)
+                scores[i] += query_count * idf * tf * (k1 + 1) / (tf + norm)
+    return scores
+
+
+QUERIES = ["apple", "banana cherry", "plum plum fig", "kiwi lime lemon mango", "durian"]
+
+
+@pytest.mark.parametrize("ngram_range", [(1, 1), (1, 2)])
+def test_scores_match_naive_formula(ngram_range):
+    corpus = make_corpus(60)
+    index = BM25Index(ngram_range=ngram_range)
+    index.add(corpus)
+
+    for query in QUERIES:
+        expected = naive_scores(corpus, query, ngram_range=ngram_range)
+        np.testing.assert_allclose(index.scores(query), expected, rtol=1e-5, atol=1e-6)
+
+    batch = index.score_batch(QUERIES)
+    np.testing.assert_allclose(batch, np.stack([index.scores(query) for query in QUERIES]))
+
+
+def test_search_returns_best_scores_in_order():
+    corpus = make_corpus(200, seed=1)
+    index = BM25Index()
+    index.add(corpus)
+
+    for query in QUERIES[:-1]:
+        scores = index.scores(query)
+        results = index.search(query, top_k=10)
+        assert [score for _, score in results] == pytest.approx(sorted(scores, reverse=True)[:10])
+        for doc_id, score in results:
+            assert scores[doc_id] == pytest.approx(score)
+    assert index.search("durian") == []
+
+
+def test_delete_and_compact():
+    corpus = make_corpus(80, seed=2)
+    index = BM25Index()
+    index.add(corpus)
+    deleted = list(range(0, 80, 3))
+    index.delete(deleted)
+    index.delete(deleted[:5])  # Deleting twice changes nothing
+    live = [i for i in range(80) if i not in deleted]
+    assert len(index) == len(live)
+    assert index.n_docs == 80
+
+    for query in QUERIES:
+        expected = naive_scores(corpus, query, live=live)
+        np.testing.assert_allclose(index.scores(query), expected, rtol=1e-5, atol=1e-6)
+        assert all(doc_id not in deleted for doc_id, _ in index.search(query, top_k=80))
+
+    index.compact()
+    for query in QUERIES:
+        np.testing.assert_allclose(index.scores(query), naive_scores(corpus, query, live=live),
+                                   rtol=1e-5, atol=1e-6)
+
+    # Ids are never reused after a delete
+    added = index.add(["apple banana"])
+    assert list(added) == [80]
+    assert index.search("apple banana", top_k=1)[0][0] == 80
+
+
+def test_save_load_round_trip(tmp_path):
+    corpus = make_corpus(50, seed=3)
+    index = BM25Index(k1=1.5, b=0.6, ngram_range=(1, 2))
+    index.add(corpus)
+    index.delete([1, 7, 20])
+    path = str(tmp_path / "bm25.npz")
+    index.save(path)
+
+    loaded = BM25Index.load(path)
+    assert (loaded.k1, loaded.b, loaded.ngram_range) == (1.5, 0.6, (1, 2))
+    assert len(loaded) == len(index) and loaded.n_docs == index.n_docs
+    assert loaded.live_length == pytest.approx(index.live_length)
+    for query in QUERIES:
+        np.testing.assert_array_equal(loaded.scores(query), index.scores(query))
+
+    # A loaded index keeps growing like the original
+    loaded.add(["fig fig fig"])
+    index.add(["fig fig fig"])
+    np.testing.assert_allclose(loaded.scores("fig"), index.scores("fig"))
+
+
+def test_empty_index():
+    index = BM25Index()
+    assert len(index) == 0
+    assert index.scores("apple").shape == (0,)
+    assert index.score_batch(["apple", "pear"]).shape == (2, 0)
+    assert index.search("apple") == []
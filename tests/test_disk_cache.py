@@ -0,0 +1,45 @@
+import os
+
+from disk_cache import DiskCache
+
+
+def cache_size(cache):
+    return sum(size for _, size, _ in cache._entries())
+
+
+def test_rewriting_a_key_keeps_the_total_exact(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=1000)
+    for _ in range(50):
+        cache.set("aa11", b"x" * 300)
+    cache.set("bb22", b"y" * 200)
+    assert cache._total_bytes == cache_size(cache) == 500
+    # Rewrites never pushed the total over the limit, so nothing was evicted
+    assert cache.get("bb22") == b"y" * 200
+
+    cache.set("aa11", b"z" * 10)
+    assert cache._total_bytes == 210
+    cache.delete("aa11")
+    cache.delete("aa11")
+    assert cache._total_bytes == cache_size(cache) == 200
+
+
+def test_evicts_least_recently_used_entries(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=1300)
+    for i in range(4):
+        cache.set(f"k{i}", b"x" * 300)
+        # Distinct modification times order the entries by last use
+        os.utime(cache._path(f"k{i}"), (i, i))
+    cache.get("k0")
+    cache.set("k4", b"x" * 300)
+
+    # Trimmed to 90% of the limit, oldest first: k0 was read since, so it stays
+    remaining = {key for key in (f"k{i}" for i in range(5)) if cache.get(key) is not None}
+    assert remaining == {"k0", "k3", "k4"}
+    assert cache._total_bytes == cache_size(cache) == 900
+
+
+def test_total_is_rebuilt_from_disk(tmp_path):
+    cache = DiskCache(str(tmp_path))
+    cache.set("aa11", b"x" * 123)
+    cache.set("aa11", b"x" * 77)
+    assert DiskCache(str(tmp_path))._total_bytes == 77
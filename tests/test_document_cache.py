@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+from document_cache import DocumentCache, CACHE_FORMAT_VERSION, HEADER
+from pdf_processor import SPAN_DTYPE, SpanFeatures
+
+
+def make_state(with_spans=True):
+    spans = None
+    if with_spans:
+        spans = np.zeros(3, dtype=SPAN_DTYPE)
+        spans["page"] = [0, 0, 1]
+        spans["line"] = [0, 1, 2]
+        spans["size"] = [18.0, 11.0, 11.5]
+        spans["flags"] = [16, 0, 2]
+        spans["length"] = [12, 40, 7]
+        spans["x0"] = [72.0, 72.0, 90.5]
+        spans["y1"] = [100.25, 130.0, 700.0]
+    return {
+        "headings": [{"text": "Introduction", "level": 1, "page": 1}],
+        "structure": [{"text": "Introduction", "children": [], "page": 1}],
+        "properties": {"page_count": 2, "metadata": {"title": "Tést"}, "is_encrypted": False},
+        "sections": [[0, 20, "", {"heading": "Introduction", "level": 1, "page": 1, "id": "section_0"}]],
+        "content": "Introduction\nCafé ☕ text\n\nSecond page\n\n",
+        "page_offsets": np.array([0, 27, 40], dtype=np.int64),
+        "fingerprints": ["a" * 32, "b" * 32],
+        "span_features": SpanFeatures(spans, ["Introduction", "Café ☕ text", "Second"]) if with_spans else None
+    }
+
+
+@pytest.mark.parametrize("with_spans", [True, False])
+def test_encode_decode_round_trip(with_spans):
+    state = make_state(with_spans)
+    decoded = DocumentCache._decode(DocumentCache._encode(state))
+
+    for name in ("headings", "structure", "properties", "sections", "content", "fingerprints"):
+        assert decoded[name] == state[name]
+    assert decoded["page_offsets"].dtype == np.int64
+    np.testing.assert_array_equal(decoded["page_offsets"], state["page_offsets"])
+    if with_spans:
+        assert decoded["span_features"].line_texts == state["span_features"].line_texts
+        assert decoded["span_features"].spans.dtype == SPAN_DTYPE
+        np.testing.assert_array_equal(decoded["span_features"].spans, state["span_features"].spans)
+    else:
+        assert decoded["span_features"] is None
+
+
+def with_header(data, **fields):
+    """Entry with some header fields replaced"""
+    header = dict(zip(("magic", "version", "json_len", "text_len", "offsets_len", "spans_len", "digest"),
+                      HEADER.unpack_from(data)))
+    header.update(fields)
+    return HEADER.pack(*header.values()) + data[HEADER.size:]
+
+
+def test_rejects_other_versions_and_corrupt_entries():
+    data = DocumentCache._encode(make_state())
+    assert DocumentCache._decode(data) is not None
+
+    assert DocumentCache._decode(with_header(data, version=CACHE_FORMAT_VERSION - 1)) is None
+    assert DocumentCache._decode(with_header(data, version=CACHE_FORMAT_VERSION + 1)) is None
+    assert DocumentCache._decode(with_header(data, magic=b"XXXX")) is None
+    assert DocumentCache._decode(with_header(data, text_len=1)) is None
+    assert DocumentCache._decode(data[:HEADER.size - 1]) is None
+    # Any change to the body fails the digest
+    corrupt = bytearray(data)
+    corrupt[-1] ^= 0xFF
+    assert DocumentCache._decode(bytes(corrupt)) is None
+
+
+def test_invalid_entries_are_discarded(tmp_path):
+    cache = DocumentCache(str(tmp_path))
+    key = DocumentCache.key(b"%PDF-1.4 test")
+    cache.save(key, make_state())
+    assert cache.load(key)["content"] == make_state()["content"]
+
+    cache.store.set(key, with_header(cache.store.get(key), version=CACHE_FORMAT_VERSION + 1))
+    assert cache.load(key) is None
+    assert cache.store.get(key) is None
+
+
+def test_previous_follows_the_latest_version_of_a_path(tmp_path):
+    cache = DocumentCache(str(tmp_path / "cache"))
+    pdf_path = str(tmp_path / "doc.pdf")
+    for version in (b"%PDF-1.4 one", b"%PDF-1.4 two"):
+        state = make_state()
+        state["content"] = version.decode() + "\n\n"
+        state["page_offsets"] = np.array([0, len(state["content"])], dtype=np.int64)
+        cache.save(DocumentCache.key(version), state, pdf_path=pdf_path)
+    assert cache.previous(pdf_path)["content"] == "%PDF-1.4 two\n\n"
+    assert cache.previous(str(tmp_path / "other.pdf")) is None
@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+from ocr_engine import OCREngine
+from pdf_processor import PDFProcessor, SPAN_DTYPE, SpanFeatures
+
+BOLD = 2
+
+# (page, text, [(size, flags), ...]) per line; the distinct sizes are 10, 11,
+# 12, 14, 18 and 24, and the mean span size is 179 / 14 (about 12.79)
+LINES = [
+    (0, "Chapter One", [(24, 0)]),
+    (0, "Body text in three spans", [(10, 0), (10, 0), (10, 0)]),
+    (0, "Methods:", [(12, 0)]),
+    (0, "Results", [(14, BOLD)]),
+    (0, "Figure 1: caption", [(18, 0)]),
+    (1, "Overview", [(12, 0), (18, 0)]),
+    (1, "More body text", [(10, 0), (10, 0), (10, 0)]),
+    (1, "Summary", [(11, BOLD)]),
+    (1, "Section 4 notes", [(10, 0)])
+]
+
+
+def make_features():
+    rows = []
+    for line, (page, text, spans) in enumerate(LINES):
+        for size, flags in spans:
+            rows.append((page, line, size, flags, len(text), 72, 100 + 20 * line, 300, 112 + 20 * line))
+    return SpanFeatures(np.array(rows, dtype=SPAN_DTYPE), [text for _, text, _ in LINES])
+
+
+def test_classify_headings_levels():
+    headings = PDFProcessor().classify_headings(make_features())
+    assert [(h["text"], h["page"], h["level"], h["bold"], h["size"]) for h in headings] == [
+        ("Chapter One", 1, 1, False, 24.0),    # Largest size
+        ("Methods:", 1, 4, False, 12.0),       # Colon pattern, third smallest size
+        ("Results", 1, 2, True, 14.0),         # Bold and above the mean: rank 3, one up
+        ("Overview", 2, 2, False, 18.0),       # Line size is its largest span
+        ("Section 4 notes", 2, 6, False, 10.0)  # Prefix pattern, smallest size
+    ]
+
+
+def test_classify_headings_with_document_statistics():
+    # Statistics of a larger document shift the ranks and the size threshold
+    headings = PDFProcessor().classify_headings(
+        make_features(), mean_size=16.0, distinct_sizes=np.array([10, 11, 12, 14, 18, 24, 30], dtype=float)
+    )
+    assert [(h["text"], h["level"]) for h in headings] == [
+        ("Chapter One", 2), ("Methods:", 5), ("Section 4 notes", 6)
+    ]
+
+
+def test_classify_headings_without_spans():
+    assert PDFProcessor().classify_headings(SpanFeatures()) == []
+
+
+TSV_HEADER = "level\tpage_num\tblock_num\tpar_num\tline_num\tword_num\tleft\ttop\twidth\theight\tconf\ttext"
+
+# (level, block, paragraph, line, word, height, conf, text)
+TSV_ROWS = [
+    (4, 1, 1, 1, 0, 12, -1, ""),
+    (5, 1, 1, 1, 1, 40, 95, "Introduction"),
+    (5, 1, 1, 2, 1, 10, 90, "This"),
+    (5, 1, 1, 2, 2, 10, 90, "is"),
+    (5, 1, 1, 2, 3, 10, 90, "body"),
+    (5, 1, 1, 2, 4, 10, 90, "text"),
+    (5, 2, 1, 1, 1, 30, 92, "Key"),
+    (5, 2, 1, 1, 2, 26, 88, "Findings"),
+    (5, 2, 1, 2, 1, 50, 40, "smudge"),
+    (5, 3, 1, 1, 1, 10, 95, "Page")
+]
+
+
+def make_ocr_data():
+    lines = [TSV_HEADER]
+    for level, block, par, line, word, height, conf, text in TSV_ROWS:
+        lines.append("\t".join(map(str, (level, 1, block, par, line, word, 50, 50 * block, 100, height, conf, text))))
+    return OCREngine._parse_tsv("\n".join(lines) + "\n", 1)[0]
+
+
+def test_classify_ocr_headings_levels():
+    # Mean element height is 20.8, so lines taller than 27.04 are headings;
+    # the low-confidence word counts towards the statistics but is never a heading
+    headings = PDFProcessor().classify_ocr_headings(make_ocr_data(), 4)
+    assert headings == [
+        {"text": "Introduction", "page": 5, "confidence": 95.0, "level": 2},  # One taller element
+        {"text": "Key Findings", "page": 5, "confidence": 90.0, "level": 4}   # Mean height 28
+    ]
+
+
+@pytest.mark.parametrize("conf", [-1, 50])
+def test_classify_ocr_headings_without_confident_words(conf):
+    ocr_data = make_ocr_data()
+    ocr_data["conf"] = [conf] * len(ocr_data["conf"])
+    assert PDFProcessor().classify_ocr_headings(ocr_data, 0) == []
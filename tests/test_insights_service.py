@@ -0,0 +1,159 @@
+import os
+import json
+import asyncio
+import base64
+
+import fitz
+import pytest
+
+from pdf_processor import PDFProcessor
+from smart_pdf_insights import SmartPDFInsights
+from insights_service import InsightsService
+
+ORIGIN = "http://localhost:3000"
+
+
+class StubSystem(SmartPDFInsights):
+    """SmartPDFInsights with real PDF parsing and the model calls stubbed out"""
+
+    def __init__(self):
+        self.pdf_processor = PDFProcessor()
+        self.document_cache = None
+        self.artifact_cache = None
+        self.summary_batcher = None
+        self.personas = []
+
+    def build_section_index(self, sections):
+        return None
+
+    def match_sections_to_personas(self, sections, personas, top_k=5, index=None):
+        self.personas.extend(personas)
+        matched = []
+        for section in sections[:top_k]:
+            section = section.copy()
+            section["score"] = 1.0
+            matched.append(section)
+        return [matched for _ in personas]
+
+    def generate_insights(self, sections, persona):
+        return [{"heading": section["heading"], "summary": f"{persona}: {section['heading']}"}
+                for section in sections]
+
+
+def make_pdf(path=None):
+    doc = fitz.open()
+    for heading, body in (("Introduction", "Opening remarks."), ("Methods", "How it was done.")):
+        page = doc.new_page()
+        page.insert_text((72, 72), heading, fontsize=20)
+        page.insert_text((72, 110), body, fontsize=10)
+    data = doc.tobytes()
+    doc.close()
+    if path is not None:
+        with open(path, "wb") as f:
+            f.write(data)
+    return data
+
+
+@pytest.fixture
+def pdf_root(tmp_path):
+    root = tmp_path / "pdfs"
+    root.mkdir()
+    make_pdf(str(root / "doc.pdf"))
+    make_pdf(str(tmp_path / "secret.pdf"))
+    return root
+
+
+@pytest.fixture
+def service(pdf_root):
+    service = InsightsService(StubSystem(), pdf_root=str(pdf_root), allowed_origins=[ORIGIN])
+    yield service
+    service.close()
+
+
+def call(service, method, target, body=b"", headers=None):
+    headers = dict(headers or {})
+    if isinstance(body, dict):
+        body = json.dumps(body).encode("utf-8")
+        headers.setdefault("content-type", "application/json")
+    return asyncio.run(service.handle(method, target, headers, body))
+
+
+def test_routes_answer_uploads_and_paths(service):
+    status, payload = call(service, "GET", "/health")
+    assert status == 200 and payload["status"] == "ok"
+
+    status, payload = call(service, "POST", "/sections?content=1", make_pdf(),
+                           {"content-type": "application/pdf"})
+    assert status == 200
+    assert [s["heading"] for s in payload["sections"]] == ["Introduction", "Methods"]
+    assert all(s["content"] for s in payload["sections"])
+
+    status, payload = call(service, "POST", "/match",
+                           {"pdf": "doc.pdf", "persona": "analyst", "top_k": 1})
+    assert status == 200 and payload["persona"] == "analyst"
+    assert len(payload["matched_sections"]) == 1
+    assert service.system.personas == ["analyst"]
+
+    status, payload = call(service, "POST", "/insights",
+                           {"pdf_base64": base64.b64encode(make_pdf()).decode("ascii")})
+    assert status == 200 and payload["persona"] == "general reader"
+    assert payload["insights"][0]["summary"] == "general reader: Introduction"
+
+    status, payload = call(service, "POST", "/headings", {"pdf": "doc.pdf"})
+    assert status == 200 and payload["page_count"] == 2 and "content" not in payload
+
+
+def test_unknown_endpoint_and_wrong_method(service):
+    assert call(service, "GET", "/nope")[0] == 404
+    assert call(service, "GET", "/sections")[0] == 405
+    assert call(service, "POST", "/health")[0] == 405
+    assert call(service, "POST", "/sections", b"not a pdf", {"content-type": "application/pdf"})[0] == 400
+    assert call(service, "POST", "/sections", {})[0] == 400
+
+
+@pytest.mark.parametrize("path", ["../secret.pdf", "sub/../../secret.pdf", "link.pdf"])
+def test_paths_outside_the_root_are_refused(service, pdf_root, path):
+    os.symlink(pdf_root.parent / "secret.pdf", pdf_root / "link.pdf")
+    status, payload = call(service, "POST", "/sections", {"pdf": path})
+    assert status == 403, payload
+
+
+def test_absolute_paths_must_lie_under_the_root(service, pdf_root):
+    assert call(service, "POST", "/sections", {"pdf": str(pdf_root / "doc.pdf")})[0] == 200
+    assert call(service, "POST", "/sections", {"pdf": str(pdf_root.parent / "secret.pdf")})[0] == 403
+    assert call(service, "POST", "/sections", {"pdf": "missing.pdf"})[0] == 400
+
+
+def test_paths_are_disabled_without_a_root():
+    service = InsightsService(StubSystem())
+    try:
+        assert call(service, "POST", "/sections", {"pdf": "doc.pdf"})[0] == 403
+    finally:
+        service.close()
+
+
+def test_origins_outside_the_allow_list_are_refused(service):
+    assert call(service, "GET", "/health", headers={"origin": "http://evil.example"})[0] == 403
+    assert call(service, "OPTIONS", "/match", headers={"origin": "http://evil.example"})[0] == 403
+    assert call(service, "OPTIONS", "/match", headers={"origin": ORIGIN}) == (204, None)
+    assert call(service, "GET", "/health", headers={"origin": ORIGIN + "/"})[0] == 200
+    assert service._origin_allowed(ORIGIN) and not service._origin_allowed(None)
+
+
+@pytest.mark.parametrize("options", [
+    {"top_k": "many"}, {"top_k": 0}, {"top_k": -3}, {"top_k": True}, {"top_k": None},
+    {"top_k": [5]}, {"persona": 42}, {"persona": ""}, {"persona": ["analyst"]}
+])
+def test_bad_options_are_rejected(service, options):
+    status, payload = call(service, "POST", "/match", {"pdf": "doc.pdf", **options})
+    assert status == 400, payload
+    assert service.system.personas == []
+
+
+def test_query_string_options(service):
+    status, payload = call(service, "POST", "/match?persona=student&top_k=2", make_pdf(),
+                           {"content-type": "application/pdf"})
+    assert status == 200 and payload["persona"] == "student"
+    assert len(payload["matched_sections"]) == 2
+    assert call(service, "POST", "/match?top_k=x", make_pdf(),
+                {"content-type": "application/pdf"})[0] == 400
@@ -0,0 +1,70 @@
+import subprocess
+
+import numpy as np
+import pytest
+
+from ocr_engine import OCREngine
+
+HEADER = "level\tpage_num\tblock_num\tpar_num\tline_num\tword_num\tleft\ttop\twidth\theight\tconf\ttext\n"
+
+
+def tsv_rows(image, words):
+    """TSV rows of one image of an image list: its page row and its words"""
+    rows = [f"1\t{image}\t0\t0\t0\t0\t0\t0\t600\t800\t-1\t\n"]
+    rows += [f"5\t{image}\t1\t1\t1\t{i + 1}\t10\t10\t50\t12\t95.5\t{word}\n" for i, word in enumerate(words)]
+    return "".join(rows)
+
+
+def test_parse_tsv_splits_images():
+    tsv = HEADER + tsv_rows(1, ["Hello", "world"]) + tsv_rows(3, ["Third"]) + "5\t9\t1\n"
+    first, second, third = OCREngine._parse_tsv(tsv, 3)
+    assert first["text"] == ["", "Hello", "world"] and first["conf"] == [-1.0, 95.5, 95.5]
+    assert set(first["page_num"]) == {1}
+    assert second["text"] == []
+    assert third["text"] == ["", "Third"]
+
+
+class TimingOutEngine(OCREngine):
+    """OCREngine whose batched tesseract run times out after partial output"""
+
+    def __init__(self, partial_output, **kwargs):
+        super().__init__(max_workers=2, page_timeout=5, batch_size=4, **kwargs)
+        self.partial_output = partial_output
+        self.single_pages = []
+
+    def ocr_images(self, images):
+        raise subprocess.TimeoutExpired(["tesseract"], 20, output=self.partial_output)
+
+    def _ocr_page(self, page_num, image):
+        self.single_pages.append(page_num)
+        return {"text": [f"page {page_num}"]}
+
+
+@pytest.mark.parametrize("partial, finished", [
+    (None, 0),
+    (HEADER, 0),
+    (HEADER + tsv_rows(1, ["a"]), 0),
+    (HEADER + tsv_rows(1, ["a"]) + tsv_rows(2, ["b"]), 1),
+    # The kill cut the last line short
+    (HEADER + tsv_rows(1, ["a"]) + tsv_rows(2, ["b"]) + tsv_rows(3, ["c"])[:-12], 2)
+])
+def test_timed_out_batch_keeps_finished_pages_without_retrying(partial, finished):
+    engine = TimingOutEngine(partial.encode("utf-8") if partial is not None else None)
+    images = [np.zeros((4, 4), dtype=np.uint8)] * 4
+    results = engine._ocr_pages([10, 11, 12, 13], images)
+
+    assert engine.single_pages == []
+    assert [result is not None for result in results] == [i < finished for i in range(4)]
+    for i in range(finished):
+        assert results[i]["text"][-1] == "ab"[i]
+
+
+def test_other_batch_failures_are_retried_page_by_page():
+    class FailingEngine(TimingOutEngine):
+        def ocr_images(self, images):
+            raise subprocess.CalledProcessError(1, ["tesseract"])
+
+    engine = FailingEngine(None)
+    results = engine._ocr_pages([3, 4], [np.zeros((4, 4), dtype=np.uint8)] * 2)
+    assert engine.single_pages == [3, 4]
+    assert results == [{"text": ["page 3"]}, {"text": ["page 4"]}]
@@ -0,0 +1,77 @@
+import time
+import threading
+
+from pipeline_executor import PipelineExecutor, Stage
+
+
+def run_with_timeout(executor, items, timeout=10):
+    """Collect the outcomes of a run, failing instead of hanging"""
+    outcomes = []
+    thread = threading.Thread(target=lambda: outcomes.extend(executor.run(items)), daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "pipeline run did not finish"
+    return outcomes
+
+
+def test_every_item_passes_through_all_stages():
+    executor = PipelineExecutor([
+        Stage("double", lambda x: x * 2, 3),
+        Stage("label", lambda x: f"item-{x}", 2)
+    ], queue_size=2)
+    outcomes = run_with_timeout(executor, range(20))
+
+    assert sorted(outcome["index"] for outcome in outcomes) == list(range(20))
+    assert all(outcome["result"] == f"item-{outcome['index'] * 2}" for outcome in outcomes)
+    report = executor.report()
+    assert report["items"] == 20
+    assert [stage["items"] for stage in report["stages"]] == [20, 20]
+
+
+def test_single_worker_stages_keep_input_order():
+    executor = PipelineExecutor([Stage("a", lambda x: x + 1), Stage("b", lambda x: x * 10)])
+    outcomes = run_with_timeout(executor, range(15))
+    assert [outcome["index"] for outcome in outcomes] == list(range(15))
+    assert [outcome["result"] for outcome in outcomes] == [(i + 1) * 10 for i in range(15)]
+
+
+def test_stage_errors_skip_later_stages():
+    seen = []
+
+    def fail_on_odd(x):
+        if x % 2:
+            raise ValueError(f"odd {x}")
+        return x
+
+    executor = PipelineExecutor([
+        Stage("check", fail_on_odd, 2),
+        Stage("record", lambda x: seen.append(x) or x)
+    ])
+    outcomes = {outcome["index"]: outcome for outcome in run_with_timeout(executor, range(6))}
+
+    assert sorted(outcomes) == list(range(6))
+    for index, outcome in outcomes.items():
+        if index % 2:
+            assert outcome == {"index": index, "error": f"odd {index}", "stage": "check"}
+        else:
+            assert outcome == {"index": index, "result": index}
+    assert sorted(seen) == [0, 2, 4]
+    assert [stage["errors"] for stage in executor.report()["stages"]] == [3, 0]
+
+
+def test_failing_input_ends_the_run():
+    def items():
+        yield from range(3)
+        raise OSError("input went away")
+
+    executor = PipelineExecutor([Stage("slow", lambda x: time.sleep(0.01) or x, 2)])
+    outcomes = sorted(run_with_timeout(executor, items()), key=lambda outcome: outcome["index"])
+
+    assert [outcome.get("result") for outcome in outcomes[:3]] == [0, 1, 2]
+    assert outcomes[3] == {"index": 3, "error": "input went away", "stage": "input"}
+
+
+def test_empty_input():
+    executor = PipelineExecutor([Stage("a", lambda x: x, 2), Stage("b", lambda x: x)])
+    assert run_with_timeout(executor, []) == []
+    assert executor.report()["items"] == 0
@@ -0,0 +1,154 @@
+import json
+
+import pytest
+
+from request_runner import RequestRunner, read_requests
+
+REQUEST_LINES = [
+    '{"pdf": "a.pdf", "persona": "student", "top_k": 2}',
+    '',
+    '{"pdf": "b.pdf"}',
+    'not json',
+    '{"pdf": "a.pdf", "persona": 42}',
+    '{"pdf": "a.pdf", "persona": "   "}',
+    '{"pdf": "b.pdf", "persona": "analyst", "top_k": "3"}',
+    '{"pdf": "a.pdf", "top_k": 0}',
+    '{"pdf": "a.pdf", "top_k": true}',
+    '{"pdf": "a.pdf", "top_k": null}',
+    '{"pdf": "a.pdf", "top_k": 2.5}',
+    '{"pdf": "a.pdf", "persona": "student", "top_k": 1.0}',
+    '{"persona": "student"}',
+    '{"pdf": 7}',
+    '["a.pdf"]',
+    '{"pdf": "a.pdf", "persona": "researcher"}'
+]
+
+
+@pytest.fixture
+def request_file(tmp_path):
+    path = tmp_path / "requests.jsonl"
+    path.write_text("\n".join(REQUEST_LINES) + "\n")
+    return path
+
+
+def test_read_requests_validates_every_line(request_file):
+    with open(request_file) as f:
+        requests = list(read_requests(f))
+
+    valid = {request["line"]: request for request in requests if "error" not in request}
+    errors = {request["line"]: request["error"] for request in requests if "error" in request}
+
+    assert valid == {
+        1: {"line": 1, "pdf": "a.pdf", "persona": "student", "top_k": 2},
+        3: {"line": 3, "pdf": "b.pdf", "persona": "general reader", "top_k": 5},
+        7: {"line": 7, "pdf": "b.pdf", "persona": "analyst", "top_k": 3},
+        12: {"line": 12, "pdf": "a.pdf", "persona": "student", "top_k": 1},
+        16: {"line": 16, "pdf": "a.pdf", "persona": "researcher", "top_k": 5}
+    }
+    assert sorted(errors) == [4, 5, 6, 8, 9, 10, 11, 13, 14, 15]
+    assert errors[4].startswith("Invalid JSON")
+    assert "persona" in errors[5] and "persona" in errors[6]
+    assert all("top_k" in errors[line] for line in (8, 9, 10, 11))
+    assert all("pdf" in errors[line] for line in (13, 14, 15))
+
+
+class RecordingRunner(RequestRunner):
+    """RequestRunner answering documents without models, recording each call"""
+
+    def __init__(self, window=256):
+        super().__init__(system=None, window=window)
+        self.documents = []
+
+    def run_document(self, pdf_path, requests):
+        self.documents.append((pdf_path, [request["line"] for request in requests]))
+        return [self._result(request, [], []) for request in requests]
+
+
+def test_requests_are_grouped_by_pdf(request_file):
+    runner = RecordingRunner()
+    with open(request_file) as f:
+        results = list(runner.run(read_requests(f)))
+
+    assert runner.documents == [("a.pdf", [1, 12, 16]), ("b.pdf", [3, 7])]
+    assert sorted(result["line"] for result in results) == [1, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16]
+    assert sum("error" in result for result in results) == 10
+    # Bad lines are reported as soon as they are read, before any document runs
+    assert all("error" in result for result in results[:10])
+
+
+def test_windows_stream_results_before_the_input_ends():
+    read = []
+
+    def requests():
+        for line_num in range(1, 8):
+            read.append(line_num)
+            yield {"line": line_num, "pdf": f"{line_num % 2}.pdf", "persona": "p", "top_k": 1}
+
+    runner = RecordingRunner(window=3)
+    results = runner.run(requests())
+    first = next(results)
+    assert first["line"] == 1 and read == [1, 2, 3]
+
+    rest = list(results)
+    assert runner.documents == [("1.pdf", [1, 3]), ("0.pdf", [2]), ("0.pdf", [4, 6]), ("1.pdf", [5]),
+                                ("1.pdf", [7])]
+    assert sorted(result["line"] for result in [first] + rest) == list(range(1, 8))
+
+
+def test_window_zero_reads_everything_first():
+    runner = RecordingRunner(window=0)
+    requests = [{"line": i, "pdf": f"{i % 2}.pdf", "persona": "p", "top_k": 1} for i in range(1, 8)]
+    list(runner.run(requests))
+    assert runner.documents == [("1.pdf", [1, 3, 5, 7]), ("0.pdf", [2, 4, 6])]
+
+
+class StubSystem:
+    """Stands in for SmartPDFInsights: one section per letter, scored by persona"""
+
+    def __init__(self):
+        self.parsed = []
+        self.scored = []
+
+    def parse_pdf(self, pdf_path):
+        if pdf_path == "missing.pdf":
+            raise FileNotFoundError(pdf_path)
+        self.parsed.append(pdf_path)
+        return Session()
+
+    def extract_sections(self, document):
+        return [{"heading": letter, "page": 1, "content": letter} for letter in "abcdef"]
+
+    def match_sections_to_personas(self, sections, personas, top_k=5):
+        self.scored.append((list(personas), top_k))
+        return [[dict(section, score=1.0) for section in sections[:top_k]] for _ in personas]
+
+    def generate_insights_batch(self, matches, batch_size=8):
+        return [[{"persona": persona, "heading": s["heading"]} for s in sections]
+                for sections, persona in matches]
+
+
+class Session:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+def test_run_document_scores_each_persona_once():
+    system = StubSystem()
+    runner = RequestRunner(system)
+    requests = [
+        {"line": 1, "pdf": "a.pdf", "persona": "student", "top_k": 2},
+        {"line": 2, "pdf": "a.pdf", "persona": "analyst", "top_k": 4},
+        {"line": 3, "pdf": "a.pdf", "persona": "student", "top_k": 1},
+        {"line": 4, "pdf": "missing.pdf", "persona": "student", "top_k": 1}
+    ]
+    results = list(runner.run(requests))
+
+    assert system.parsed == ["a.pdf"]
+    assert system.scored == [(["student", "analyst"], 4)]
+    assert [len(result.get("matched_sections", [])) for result in results] == [2, 4, 1, 0]
+    assert results[1]["insights"][0] == {"persona": "analyst", "heading": "a"}
+    assert results[3]["error"] == "missing.pdf"
+    json.dumps(results)
@@ -0,0 +1,144 @@
+import json
+
+import fitz
+import pytest
+
+from document_cache import DocumentCache
+from pdf_processor import PDFProcessor
+from smart_pdf_insights import SmartPDFInsights
+
+# Page contents as (text, font size) lines; headings are set in a larger font
+PAGES = [
+    [("Introduction", 20), ("The opening paragraph sets the scene.", 10),
+     ("Background", 20), ("Earlier work is summarised here.", 10)],
+    [("It carries on over the page break.", 10), ("And keeps going a while.", 10)],
+    [("Methods", 20), ("Introduction", 10), ("The word above repeats a heading.", 10)],
+    [("Plain page without headings.", 10)],
+    [("Results", 20), ("Numbers, tables and discussion.", 10), ("Results", 10)]
+]
+
+
+class ParsingOnly(SmartPDFInsights):
+    """SmartPDFInsights with real PDF parsing and no models loaded"""
+
+    def __init__(self, document_cache=None):
+        self.pdf_processor = PDFProcessor()
+        self.document_cache = document_cache
+        self.artifact_cache = None
+        self.summary_batcher = None
+
+
+def make_pdf(toc=None):
+    doc = fitz.open()
+    for lines in PAGES:
+        page = doc.new_page()
+        y = 72
+        for text, size in lines:
+            page.insert_text((72, y), text, fontsize=size)
+            y += 2 * size
+    if toc:
+        doc.set_toc(toc)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def eager_sections(page_texts, headings):
+    """Section texts built page by page, without the shared text buffer
+
+    Each heading is searched on its own page after the previous heading;
+    a section runs from its heading to the next one, and headings missing
+    from the text lead their section as a prefix.
+    """
+    ordered = sorted(headings, key=lambda h: (h.get("page", 0), h.get("y", 0)))
+    last_page = len(page_texts) - 1
+
+    starts = []
+    after = (0, 0)  # (page, offset) just past the previous heading
+    for heading in ordered:
+        page = min(max(heading.get("page", 1) - 1, 0), last_page)
+        offset = after[1] if after[0] == page else 0
+        position = page_texts[page].find(heading["text"], offset) if heading["text"] else -1
+        if position >= 0:
+            starts.append((page, position, ""))
+            after = (page, position + len(heading["text"]))
+        else:
+            starts.append((page, offset, heading["text"] + "\n\n"))
+            after = (page, offset)
+
+    sections = []
+    for i, (page, offset, prefix) in enumerate(starts):
+        end_page, end_offset = (starts[i + 1][:2] if i + 1 < len(starts)
+                                else (last_page, len(page_texts[last_page])))
+        if end_page == page:
+            text = page_texts[page][offset:end_offset]
+        else:
+            text = page_texts[page][offset:] + "\n\n"
+            text += "".join(page_texts[p] + "\n\n" for p in range(page + 1, end_page))
+            text += page_texts[end_page][:end_offset]
+        sections.append((prefix + text).strip())
+    return sections
+
+
+def streamed_sections(system, data):
+    chunks = {}
+    order = []
+    for event in system.stream_pdf(data):
+        if event["type"] == "content":
+            chunks.setdefault(event["id"], []).append(event["text"])
+        elif event["type"] == "section":
+            order.append(event["id"])
+    return ["".join(chunks.get(section_id, [])).strip() for section_id in order]
+
+
+@pytest.mark.parametrize("toc", [
+    None,
+    # Outline entries: two on the first page, one missing from the text, one
+    # on a page whose text also repeats an earlier heading, and two with the
+    # same text on the last page
+    [[1, "Introduction", 1], [2, "Background", 1], [1, "Appendix Z", 2], [1, "Methods", 3],
+     [1, "Results", 5], [2, "Results", 5]]
+], ids=["heuristic", "outline"])
+def test_sections_match_eager_text(tmp_path, toc):
+    data = make_pdf(toc)
+    system = ParsingOnly(DocumentCache(str(tmp_path / "documents")))
+
+    with system.parse_pdf(data) as document:
+        sections = system.extract_sections(document)
+        headings = document.headings
+        page_texts = document.page_texts
+    expected = eager_sections(page_texts, headings)
+
+    assert [section["heading"] for section in sections] == [
+        h["text"] for h in sorted(headings, key=lambda h: (h.get("page", 0), h.get("y", 0)))
+    ]
+    assert len(sections) >= 4
+    assert [section["content"] for section in sections] == expected
+    assert [section.to_dict()["content"] for section in sections] == expected
+    assert all("content" not in section.to_dict(include_content=False) for section in sections)
+    # Content is never stored in the dictionary itself
+    assert all("content" not in json.loads(json.dumps(section)) for section in sections)
+
+    # Spans restored from the document cache give the same text
+    with system.parse_pdf(data) as cached:
+        assert cached.section_spans is not None
+        restored = system.extract_sections(cached)
+    assert [section["content"] for section in restored] == expected
+    assert [dict(section) for section in restored] == [dict(section) for section in sections]
+
+    # Streamed content chunks of each section join up to the same text
+    assert streamed_sections(system, data) == expected
+
+
+def test_missing_heading_leads_its_section():
+    data = make_pdf([[1, "Introduction", 1], [1, "Appendix Z", 2], [1, "Methods", 3]])
+    system = ParsingOnly()
+    sections = system.extract_sections(data)
+
+    appendix = sections[1]
+    assert appendix.prefix == "Appendix Z\n\n"
+    assert appendix["content"].startswith("Appendix Z\n\nIt carries on over the page break.")
+    # The missing heading starts at the top of its page and takes up no text,
+    # so the previous section ends exactly where it begins
+    assert sections[0].end == appendix.start
+    assert appendix.end == sections[2].start
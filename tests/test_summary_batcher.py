@@ -0,0 +1,106 @@
+import time
+import threading
+
+import pytest
+
+from context_aware_summarizer import SummaryBatcher
+
+
+class RecordingSummarizer:
+    """Stands in for ContextAwareSummarizer, recording every batch it is given"""
+
+    def __init__(self, seconds_per_item=0.0):
+        self.seconds_per_item = seconds_per_item
+        self.batches = []
+        self.lock = threading.Lock()
+
+    def generate_two_stage_summary_batch(self, texts, personas, max_length=150):
+        with self.lock:
+            self.batches.append((list(texts), max_length))
+        time.sleep(self.seconds_per_item * len(texts))
+        return [f"{persona}:{text}:{max_length}" for text, persona in zip(texts, personas)]
+
+    generate_summary_batch = generate_two_stage_summary_batch
+
+
+def test_each_caller_gets_its_own_summary():
+    summarizer = RecordingSummarizer()
+    with SummaryBatcher(summarizer, max_batch_size=4, batch_window=0.05) as batcher:
+        futures = [batcher.submit(f"text{i}", f"persona{i % 3}") for i in range(10)]
+        results = [future.result(timeout=5) for future in futures]
+    assert results == [f"persona{i % 3}:text{i}:150" for i in range(10)]
+    assert sorted(text for texts, _ in summarizer.batches for text in texts) == sorted(f"text{i}" for i in range(10))
+
+
+def test_batches_respect_max_batch_size_and_max_length():
+    summarizer = RecordingSummarizer()
+    with SummaryBatcher(summarizer, max_batch_size=3, batch_window=0.2) as batcher:
+        futures = [batcher.submit(f"text{i}", "p", max_length=100 if i % 2 else 150) for i in range(8)]
+        for future in futures:
+            future.result(timeout=5)
+    assert all(len(texts) <= 3 for texts, _ in summarizer.batches)
+    for texts, max_length in summarizer.batches:
+        assert all((int(text[4:]) % 2 == 1) == (max_length == 100) for text in texts)
+    # Requests queued within the window are batched rather than run one by one
+    assert len(summarizer.batches) < 8
+
+
+def test_concurrent_callers_are_batched():
+    summarizer = RecordingSummarizer(seconds_per_item=0.01)
+    with SummaryBatcher(summarizer, max_batch_size=8, batch_window=0.1) as batcher:
+        results = {}
+        barrier = threading.Barrier(6)
+
+        def call(i):
+            barrier.wait()
+            results[i] = batcher.summarize(f"text{i}", "p")
+
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=5)
+        stats = batcher.stats()
+    assert results == {i: f"p:text{i}:150" for i in range(6)}
+    assert stats["summaries"] == 6 and stats["mean_batch_size"] > 1
+
+
+def test_latency_cap_starts_batch_before_window_ends():
+    summarizer = RecordingSummarizer()
+    with SummaryBatcher(summarizer, max_batch_size=8, batch_window=5.0) as batcher:
+        start = time.monotonic()
+        assert batcher.summarize("capped", "p", max_latency=0.05) == "p:capped:150"
+        assert time.monotonic() - start < 1.0
+
+
+def test_latency_cap_limits_batch_size():
+    summarizer = RecordingSummarizer(seconds_per_item=0.05)
+    with SummaryBatcher(summarizer, max_batch_size=8, batch_window=0.05) as batcher:
+        batcher.summarize("warm-up", "p")  # Teaches the batcher the time per summary
+        futures = [batcher.submit(f"text{i}", "p", max_latency=0.3) for i in range(8)]
+        for future in futures:
+            future.result(timeout=5)
+    # About 0.05 s per summary leaves room for only a few summaries per capped batch
+    assert max(len(texts) for texts, _ in summarizer.batches[1:]) < 8
+
+
+def test_close_finishes_queued_requests_and_refuses_new_ones():
+    summarizer = RecordingSummarizer()
+    batcher = SummaryBatcher(summarizer, max_batch_size=8, batch_window=1.0)
+    futures = [batcher.submit(f"text{i}", "p") for i in range(3)]
+    batcher.close()
+    assert [future.result(timeout=0) for future in futures] == [f"p:text{i}:150" for i in range(3)]
+    with pytest.raises(RuntimeError):
+        batcher.submit("late", "p")
+
+
+def test_errors_reach_every_caller_of_the_batch():
+    class FailingSummarizer(RecordingSummarizer):
+        def generate_two_stage_summary_batch(self, texts, personas, max_length=150):
+            raise ValueError("model failed")
+
+    with SummaryBatcher(FailingSummarizer(), batch_window=0.05) as batcher:
+        futures = [batcher.submit(f"text{i}", "p") for i in range(3)]
+        for future in futures:
+            with pytest.raises(ValueError):
+                future.result(timeout=5)
@@ -0,0 +1,163 @@
+import os
+import json
+
+import numpy as np
+import pytest
+
+from vector_store import VectorStore, VECTORS_FILE, IDS_FILE, DELETED_FILE, META_FILE
+
+
+def random_vectors(n, dim=16, seed=0):
+    return np.random.RandomState(seed).randn(n, dim).astype(np.float32)
+
+
+def brute_force(vectors, queries, top_k, exclude=()):
+    vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    scores = queries @ vectors.T
+    scores[:, list(exclude)] = -np.inf
+    return [[(int(row), float(row_scores[row])) for row in np.argsort(-row_scores, kind='stable')[:top_k]
+             if row_scores[row] > -np.inf]
+            for row_scores in scores]
+
+
+def test_search_matches_brute_force(tmp_path):
+    vectors = random_vectors(500)
+    store = VectorStore(str(tmp_path / "store"), dim=16)
+    store.append([f"doc#{i}" for i in range(300)], vectors[:300])
+    store.append([f"doc#{i}" for i in range(300, 500)], vectors[300:])
+    queries = random_vectors(7, seed=1)
+
+    # Small blocks exercise the running top-k across blocks
+    results = store.search(queries, top_k=10, block_rows=64)
+    for got, expected in zip(results, brute_force(vectors, queries, 10)):
+        assert [row for row, _ in got] == [row for row, _ in expected]
+        np.testing.assert_allclose([score for _, score in got], [score for _, score in expected], rtol=1e-5)
+
+    # Asking for more rows than stored returns them all
+    assert len(store.search(queries[0], top_k=1000)[0]) == 500
+
+
+def test_rows_are_unit_length_and_records_kept(tmp_path):
+    store = VectorStore(str(tmp_path / "store"), dim=16, model_name="model")
+    store.append(["a", "b"], random_vectors(2) * 5, [{"pdf": "x.pdf"}, {"pdf": "y.pdf"}])
+    np.testing.assert_allclose(np.linalg.norm(store.vectors, axis=1), 1.0, rtol=1e-6)
+
+    reopened = VectorStore(str(tmp_path / "store"), readonly=True)
+    assert reopened.records == [{"id": "a", "metadata": {"pdf": "x.pdf"}},
+                                {"id": "b", "metadata": {"pdf": "y.pdf"}}]
+    assert isinstance(reopened.vectors, np.memmap)
+    with pytest.raises(ValueError):
+        VectorStore(str(tmp_path / "store"), model_name="other")
+    with pytest.raises(PermissionError):
+        reopened.append(["c"], random_vectors(1))
+
+
+def test_interrupted_append_is_ignored_and_truncated(tmp_path):
+    path = str(tmp_path / "store")
+    vectors = random_vectors(6)
+    store = VectorStore(path, dim=16)
+    store.append(["a", "b", "c"], vectors[:3])
+
+    # An append that wrote its rows but crashed before committing meta.json
+    with open(os.path.join(path, VECTORS_FILE), 'ab') as f:
+        f.write(vectors[3:5].tobytes() + b"\x00\x01")
+    with open(os.path.join(path, IDS_FILE), 'ab') as f:
+        f.write(json.dumps({"id": "lost", "metadata": {}}).encode('utf-8') + b"\n{\"id\": \"tru")
+
+    reader = VectorStore(path, readonly=True)
+    assert len(reader) == 3
+    assert [record["id"] for record in reader.records] == ["a", "b", "c"]
+
+    # The next writer drops the partial data before appending its own rows
+    writer = VectorStore(path)
+    writer.append(["d"], vectors[5:6])
+    assert os.path.getsize(os.path.join(path, VECTORS_FILE)) == 4 * 16 * 4
+    reader.refresh()
+    assert [record["id"] for record in reader.records] == ["a", "b", "c", "d"]
+    np.testing.assert_allclose(reader.vectors[3], vectors[5] / np.linalg.norm(vectors[5]), rtol=1e-6)
+
+
+def test_deleted_rows_are_skipped(tmp_path):
+    path = str(tmp_path / "store")
+    vectors = random_vectors(50)
+    store = VectorStore(path, dim=16)
+    store.append([f"row{i}" for i in range(50)], vectors,
+                 [{"pdf": "a.pdf" if i < 25 else "b.pdf"} for i in range(50)])
+    assert store.rows_with("pdf", "a.pdf") == list(range(25))
+
+    assert store.delete(range(10, 30)) == 20
+    assert store.delete([10, 11]) == 0
+    deleted = set(range(10, 30))
+    queries = random_vectors(5, seed=2)
+    for got, expected in zip(store.search(queries, top_k=50, block_rows=16),
+                             brute_force(vectors, queries, 50, exclude=deleted)):
+        assert [row for row, _ in got] == [row for row, _ in expected]
+    assert "row10" not in store.ids and store.ids["row30"] == 30
+    assert store.rows_with("pdf", "a.pdf") == list(range(10))
+
+    # Rows appended afterwards are indexed, and tombstones persist
+    store.append(["row10"], vectors[10:11], [{"pdf": "a.pdf"}])
+    assert store.ids["row10"] == 50
+    assert store.rows_with("pdf", "a.pdf") == list(range(10)) + [50]
+    reopened = VectorStore(path, readonly=True)
+    assert reopened.deleted == deleted
+    assert reopened.ids == store.ids
+
+
+def test_tombstones_are_appended_outside_meta(tmp_path):
+    path = str(tmp_path / "store")
+    store = VectorStore(path, dim=16)
+    store.append([f"row{i}" for i in range(20)], random_vectors(20), [{"n": i % 2} for i in range(20)])
+    reader = VectorStore(path, readonly=True)
+    assert reader.rows_with("n", 0) == list(range(0, 20, 2))
+
+    store.delete([3, 4])
+    store.delete([4, 7, 8])
+    with open(os.path.join(path, META_FILE)) as f:
+        meta = json.load(f)
+    assert "deleted" not in meta and meta["deleted_count"] == 4
+    assert os.path.getsize(os.path.join(path, DELETED_FILE)) == 4 * 8
+
+    # A delete that wrote its tombstones but crashed before committing meta.json
+    with open(os.path.join(path, DELETED_FILE), 'ab') as f:
+        f.write(np.array([9], dtype='<i8').tobytes() + b"\x00")
+
+    # Readers pick up the new tombstones and keep their indexes current
+    reader.refresh()
+    assert reader.deleted == {3, 4, 7, 8}
+    assert reader.rows_with("n", 0) == [0, 2, 6, 10, 12, 14, 16, 18]
+    assert "row7" not in reader.ids
+
+    store.delete([11])
+    assert os.path.getsize(os.path.join(path, DELETED_FILE)) == 5 * 8
+    store.append(["row20"], random_vectors(1, seed=3), [{"n": 0}])
+    reader.refresh()
+    assert reader.deleted == {3, 4, 7, 8, 11}
+    assert reader.rows_with("n", 0)[-1] == 20 and "row11" not in reader.ids
+
+
+def test_tombstones_kept_in_meta_are_migrated(tmp_path):
+    path = str(tmp_path / "store")
+    store = VectorStore(path, dim=16)
+    store.append([f"row{i}" for i in range(10)], random_vectors(10))
+
+    # A store written before tombstones had their own file
+    os.remove(os.path.join(path, DELETED_FILE))
+    with open(os.path.join(path, META_FILE)) as f:
+        meta = json.load(f)
+    del meta["deleted_count"]
+    meta["deleted"] = [2, 5]
+    with open(os.path.join(path, META_FILE), 'w') as f:
+        json.dump(meta, f)
+
+    reader = VectorStore(path, readonly=True)
+    assert reader.deleted == {2, 5}
+    writer = VectorStore(path)
+    assert writer.deleted == {2, 5}
+    assert writer.meta["deleted_count"] == 2 and "deleted" not in writer.meta
+
+    writer.delete([6])
+    reader.refresh()
+    assert reader.deleted == {2, 5, 6}
+    assert VectorStore(path, readonly=True).deleted == {2, 5, 6}
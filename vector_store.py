@@ -0,0 +1,372 @@
+import os
+import json
+import tempfile
+import threading
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+# Files of a store directory
+VECTORS_FILE = "vectors.f32"  # Raw little-endian float32 rows, count x dim
+IDS_FILE = "ids.jsonl"        # One {"id", "metadata"} record per row
+DELETED_FILE = "deleted.i64"  # Append-only little-endian int64 tombstoned rows
+META_FILE = "meta.json"       # Dimension, row count, file sizes and tombstone count
+
+STORE_FORMAT_VERSION = 1
+
+
+class VectorStore:
+    """Persistent, memory-mapped store of unit-length embeddings
+
+    Embeddings live in a flat float32 matrix on disk next to a JSONL sidecar
+    of row ids and metadata. Readers memory-map the matrix read-only, so any
+    number of worker processes share one copy through the OS page cache
+    instead of each holding the embeddings in RAM.
+
+    Rows are L2-normalized on append, so dot products are cosine
+    similarities. Appends write the new rows and sidecar records first and
+    then atomically replace meta.json, whose row count is what readers see:
+    a crashed append is invisible and is truncated by the next writer.
+    There should be a single writer at a time; readers pick up appended
+    rows with refresh().
+
+    Rows are never rewritten: delete() appends their numbers to a tombstone
+    file, committed by the tombstone count in meta.json the same way as
+    appended rows, and searches, ids and rows_with() skip tombstoned rows.
+    """
+
+    def __init__(self, path: str, dim: Optional[int] = None, model_name: Optional[str] = None,
+                 readonly: bool = False):
+        """Open (or create) a store directory
+
+        Args:
+            path: Directory holding the store
+            dim: Embedding dimension, required to create a new store
+            model_name: Model that produced the embeddings, recorded on
+                creation and checked when opening an existing store
+            readonly: Open for searching only
+        """
+        self.path = path
+        self.readonly = readonly
+        self._lock = threading.Lock()
+        self._vectors = None
+        self._records = None
+        self._ids = None
+        self._field_indexes = {}
+
+        meta_path = os.path.join(path, META_FILE)
+        if not os.path.exists(meta_path):
+            if readonly:
+                raise FileNotFoundError(f"No vector store at {path}")
+            if not dim:
+                raise ValueError("dim is required to create a vector store")
+            os.makedirs(path, exist_ok=True)
+            self.meta = {
+                "format": STORE_FORMAT_VERSION,
+                "dim": int(dim),
+                "model_name": model_name,
+                "count": 0,
+                "ids_bytes": 0,
+                "deleted_count": 0
+            }
+            open(os.path.join(path, VECTORS_FILE), 'ab').close()
+            open(os.path.join(path, IDS_FILE), 'ab').close()
+            open(os.path.join(path, DELETED_FILE), 'ab').close()
+            self._write_meta()
+        else:
+            self.meta = self._read_meta()
+            if self.meta.get("format") != STORE_FORMAT_VERSION:
+                raise ValueError(f"Unsupported vector store format in {path}")
+            if dim and dim != self.meta["dim"]:
+                raise ValueError(f"Vector store has dimension {self.meta['dim']}, not {dim}")
+            if model_name and self.meta.get("model_name") not in (None, model_name):
+                raise ValueError(f"Vector store holds embeddings of {self.meta['model_name']}, "
+                                 f"not {model_name}")
+        self._deleted = self._read_deleted(self.meta)
+        if "deleted" in self.meta and not readonly:
+            self._migrate_deleted()
+
+    @property
+    def dim(self) -> int:
+        return self.meta["dim"]
+
+    @property
+    def model_name(self) -> Optional[str]:
+        return self.meta.get("model_name")
+
+    def __len__(self):
+        """Number of rows, including deleted ones"""
+        return self.meta["count"]
+
+    @property
+    def deleted(self) -> Set[int]:
+        """Rows tombstoned by delete()"""
+        return self._deleted
+
+    def _read_meta(self) -> Dict:
+        with open(os.path.join(self.path, META_FILE), 'r') as f:
+            return json.load(f)
+
+    def _write_meta(self):
+        """Atomically replace meta.json, committing the rows it counts"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, prefix='.tmp_')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self.meta, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, os.path.join(self.path, META_FILE))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _read_deleted(self, meta: Dict, start: int = 0) -> Set[int]:
+        """Tombstoned rows committed by meta, from the start-th tombstone on"""
+        if "deleted" in meta:
+            # Stores written before the tombstone file kept the rows in meta.json
+            return set(meta["deleted"][start:])
+        count = meta.get("deleted_count", 0) - start
+        if count <= 0:
+            return set()
+        with open(os.path.join(self.path, DELETED_FILE), 'rb') as f:
+            f.seek(start * 8)
+            data = f.read(count * 8)
+        return set(np.frombuffer(data, dtype='<i8').tolist())
+
+    def _migrate_deleted(self):
+        """Move the tombstone list of an older store out of meta.json"""
+        rows = self.meta.pop("deleted")
+        with open(os.path.join(self.path, DELETED_FILE), 'wb') as f:
+            f.write(np.array(rows, dtype='<i8').tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        self.meta["deleted_count"] = len(rows)
+        self._write_meta()
+
+    def refresh(self):
+        """Pick up rows appended or deleted by another process since the store was opened
+
+        Only tombstones added since the last refresh are read.
+        """
+        with self._lock:
+            meta = self._read_meta()
+            deleted_count = self.meta.get("deleted_count", 0)
+            new_deleted = meta.get("deleted_count", 0) - deleted_count
+            if "deleted" in meta or "deleted" in self.meta or new_deleted < 0:
+                # Tombstones still kept in meta.json by an older writer
+                if meta.get("deleted") == self.meta.get("deleted") and meta["count"] == self.meta["count"]:
+                    return
+                self.meta = meta
+                self._deleted = self._read_deleted(meta)
+                self._reset()
+                return
+
+            if meta["count"] == self.meta["count"] and new_deleted == 0:
+                return
+            rows = self._read_deleted(meta, deleted_count)
+            if meta["count"] != self.meta["count"]:
+                self.meta = meta
+                self._deleted.update(rows)
+                self._reset()
+            else:
+                self.meta = meta
+                self._forget(rows - self._deleted)
+                self._deleted.update(rows)
+
+    def _reset(self):
+        """Drop the memory map, records and indexes so they are reloaded"""
+        self._vectors = None
+        self._records = None
+        self._ids = None
+        self._field_indexes = {}
+
+    def _forget(self, rows: Iterable[int]):
+        """Remove newly deleted rows from the id and field indexes"""
+        for row in rows:
+            if self._ids is not None:
+                row_id = self._records[row]["id"]
+                if self._ids.get(row_id) == row:
+                    del self._ids[row_id]
+            for field, index in self._field_indexes.items():
+                index.get(self._records[row]["metadata"].get(field), set()).discard(row)
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """Read-only memory-mapped (count, dim) matrix of unit-length rows"""
+        with self._lock:
+            if self._vectors is None:
+                count, dim = self.meta["count"], self.meta["dim"]
+                if count == 0:
+                    self._vectors = np.zeros((0, dim), dtype=np.float32)
+                else:
+                    self._vectors = np.memmap(os.path.join(self.path, VECTORS_FILE), dtype='<f4',
+                                              mode='r', shape=(count, dim))
+            return self._vectors
+
+    @property
+    def records(self) -> List[Dict]:
+        """{"id", "metadata"} record of every row, loaded on first use"""
+        with self._lock:
+            if self._records is None:
+                records = []
+                with open(os.path.join(self.path, IDS_FILE), 'rb') as f:
+                    data = f.read(self.meta["ids_bytes"])
+                for line in data.splitlines():
+                    records.append(json.loads(line))
+                self._records = records
+            return self._records
+
+    @property
+    def ids(self) -> Dict[str, int]:
+        """Row of every id that is not deleted, built once and kept up to date"""
+        records = self.records
+        with self._lock:
+            if self._ids is None:
+                self._ids = {record["id"]: row for row, record in enumerate(records)
+                             if row not in self._deleted}
+            return self._ids
+
+    def rows_with(self, field: str, value) -> List[int]:
+        """Rows not deleted whose metadata[field] equals value
+
+        An index of the (scalar) field's values is built on first use and
+        kept up to date by append() and delete().
+        """
+        records = self.records
+        with self._lock:
+            index = self._field_indexes.get(field)
+            if index is None:
+                index = self._field_indexes[field] = {}
+                for row, record in enumerate(records):
+                    if row not in self._deleted:
+                        index.setdefault(record["metadata"].get(field), set()).add(row)
+            return sorted(index.get(value, ()))
+
+    def append(self, ids: List[str], embeddings: np.ndarray,
+               metadata: Optional[List[Dict]] = None) -> range:
+        """Add embeddings to the end of the store
+
+        Args:
+            ids: Identifier of every row, e.g. "<pdf>#section_<n>"
+            embeddings: (len(ids), dim) embedding matrix; rows are normalized
+            metadata: Optional JSON-serializable metadata of every row
+
+        Returns:
+            Row numbers of the appended embeddings
+        """
+        if self.readonly:
+            raise PermissionError("Vector store is opened read-only")
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1)
+        if embeddings.shape[1] != self.dim:
+            raise ValueError(f"Expected embeddings of dimension {self.dim}, got {embeddings.shape[1]}")
+        metadata = metadata if metadata is not None else [{} for _ in ids]
+
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings = embeddings / np.maximum(norms, 1e-12)
+        lines = b"".join(json.dumps({"id": row_id, "metadata": row_metadata}).encode('utf-8') + b"\n"
+                         for row_id, row_metadata in zip(ids, metadata))
+
+        with self._lock:
+            start = self.meta["count"]
+            # Drop whatever an interrupted append left past the committed rows
+            with open(os.path.join(self.path, VECTORS_FILE), 'r+b') as f:
+                f.truncate(start * self.dim * 4)
+                f.seek(0, os.SEEK_END)
+                f.write(embeddings.astype('<f4').tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            with open(os.path.join(self.path, IDS_FILE), 'r+b') as f:
+                f.truncate(self.meta["ids_bytes"])
+                f.seek(0, os.SEEK_END)
+                f.write(lines)
+                f.flush()
+                os.fsync(f.fileno())
+
+            self.meta["count"] = start + len(ids)
+            self.meta["ids_bytes"] += len(lines)
+            self._write_meta()
+            self._vectors = None
+            if self._records is not None:
+                self._records.extend({"id": row_id, "metadata": row_metadata}
+                                     for row_id, row_metadata in zip(ids, metadata))
+            for row, (row_id, row_metadata) in enumerate(zip(ids, metadata), start):
+                if self._ids is not None:
+                    self._ids[row_id] = row
+                for field, index in self._field_indexes.items():
+                    index.setdefault(row_metadata.get(field), set()).add(row)
+        return range(start, start + len(ids))
+
+    def delete(self, rows: Iterable[int]) -> int:
+        """Tombstone rows so they are no longer found
+
+        Returns:
+            Number of rows newly deleted
+        """
+        if self.readonly:
+            raise PermissionError("Vector store is opened read-only")
+        rows = set(int(row) for row in rows)
+        with self._lock:
+            rows = sorted(row for row in rows if 0 <= row < self.meta["count"] and row not in self._deleted)
+            if not rows:
+                return 0
+            deleted_count = self.meta.get("deleted_count", 0)
+            # Drop whatever an interrupted delete left past the committed tombstones
+            with open(os.path.join(self.path, DELETED_FILE), 'ab') as f:
+                f.truncate(deleted_count * 8)
+                f.write(np.array(rows, dtype='<i8').tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            self.meta["deleted_count"] = deleted_count + len(rows)
+            self._write_meta()
+
+            self._forget(rows)
+            self._deleted.update(rows)
+        return len(rows)
+
+    def search(self, queries: np.ndarray, top_k: int = 10,
+               block_rows: int = 65536) -> List[List[Tuple[int, float]]]:
+        """Exact cosine search over every row that is not deleted
+
+        The matrix is scanned in blocks, so only one block of scores is held
+        in memory at a time however large the store is.
+
+        Args:
+            queries: (n, dim) query embeddings (or a single vector)
+            top_k: Number of rows returned per query
+            block_rows: Rows scored per block
+
+        Returns:
+            One list of (row, score) pairs per query, best first
+        """
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        vectors = self.vectors
+        count = len(vectors)
+        if count == 0 or top_k <= 0:
+            return [[] for _ in queries]
+
+        deleted = np.array(sorted(self._deleted), dtype=np.int64)
+        best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+        best_scores = np.zeros((len(queries), 0), dtype=np.float32)
+        for start in range(0, count, block_rows):
+            scores = queries @ np.asarray(vectors[start:start + block_rows]).T
+            rows = np.broadcast_to(np.arange(start, start + scores.shape[1]), scores.shape)
+            if len(deleted):
+                block_deleted = deleted[(deleted >= start) & (deleted < start + scores.shape[1])]
+                scores[:, block_deleted - start] = -np.inf
+
+            # Keep the running top_k of the blocks seen so far
+            scores = np.concatenate([best_scores, scores], axis=1)
+            rows = np.concatenate([best_rows, rows], axis=1)
+            if scores.shape[1] > top_k:
+                keep = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+                scores = np.take_along_axis(scores, keep, axis=1)
+                rows = np.take_along_axis(rows, keep, axis=1)
+            best_scores, best_rows = scores, rows
+
+        order = np.argsort(-best_scores, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        best_rows = np.take_along_axis(best_rows, order, axis=1)
+        return [[(int(row), float(score)) for row, score in zip(rows, scores) if score > -np.inf]
+                for rows, scores in zip(best_rows, best_scores)]